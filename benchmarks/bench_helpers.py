@@ -0,0 +1,112 @@
+import argparse
+import json
+import timeit
+import tracemalloc
+
+from picketapi.helpers import snake_to_camel_keys
+
+
+# the implementation before key conversions were memoized
+def legacy_snake_to_camel(name: str) -> str:
+    parts = name.split("_")
+    return "".join(word if idx == 0 else word.title() for idx, word in enumerate(parts))
+
+
+def legacy_snake_to_camel_keys(d: dict) -> dict:
+    return {
+        legacy_snake_to_camel(k): v
+        if type(v) is not dict
+        else legacy_snake_to_camel_keys(v)
+        for k, v in d.items()
+    }
+
+
+PAYLOADS = {
+    "validate": {"access_token": "xxx.yyy.zzz", "requirements": {}},
+    "validate_camel": {"accessToken": "xxx.yyy.zzz", "requirements": {}},
+    "auth_requirements": {
+        "chain": "ethereum",
+        "wallet_address": "0x1234567890",
+        "signature": "0xsignature",
+        "requirements": {
+            "contract_address": "0x0",
+            "min_token_balance": "1",
+            "token_ids": [str(idx) for idx in range(20)],
+        },
+        "context": {"user_agent": "benchmark", "ip_address": "127.0.0.1"},
+    },
+    "large_nested_dicts": {
+        f"requirement_{idx}": {
+            "contract_address": f"0x{idx:040x}",
+            "min_token_balance": "1",
+            "token_metadata": {"token_id": str(idx), "token_name": "name"},
+        }
+        for idx in range(100)
+    },
+    # the legacy implementation leaves the dicts in lists unconverted
+    "large_nested": {
+        "requirements": [
+            {
+                "contract_address": f"0x{idx:040x}",
+                "min_token_balance": "1",
+                "token_ids": [str(token_id) for token_id in range(5)],
+            }
+            for idx in range(100)
+        ],
+        "context": {f"context_key_{idx}": {"nested_value": idx} for idx in range(50)},
+    },
+}
+
+IMPLEMENTATIONS = {
+    "legacy": legacy_snake_to_camel_keys,
+    "current": snake_to_camel_keys,
+}
+
+
+def allocated_bytes(fn, payload, calls: int = 100) -> float:
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        results = [fn(payload) for _ in range(calls)]
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+    return (current - base) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark payload key conversion")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for name, payload in PAYLOADS.items():
+        for implementation, fn in IMPLEMENTATIONS.items():
+            best = min(
+                timeit.repeat(
+                    lambda: fn(payload), number=args.number, repeat=args.repeat
+                )
+            )
+            result = {
+                "payload": name,
+                "implementation": implementation,
+                "seconds_per_call": best / args.number,
+                "bytes_per_call": allocated_bytes(fn, payload),
+            }
+            results.append(result)
+            print(
+                f"{name:<18} {implementation:<8} "
+                f"{result['seconds_per_call'] * 1e6:>9.2f}us "
+                f"{result['bytes_per_call']:>10.0f}B"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import pickle
+import time
+
+from picketapi.types import AuthorizedUser, TokenOwnershipResponse
+
+
+def json_encode(obj) -> bytes:
+    return json.dumps(obj.to_dict(), separators=(",", ":")).encode("utf-8")
+
+
+def pickle_encode(obj) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# format -> (encode, decode)
+FORMATS = {
+    "json": (json_encode, lambda cls, data: cls.from_dict(json.loads(data))),
+    "pickle": (pickle_encode, lambda cls, data: pickle.loads(data)),
+    "binary": (lambda obj: obj.to_bytes(), lambda cls, data: cls.from_bytes(data)),
+}
+
+
+def token_balances(contracts: int, tokens: int) -> dict:
+    return {
+        f"0x{contract:040x}": {str(token): "1" for token in range(tokens)}
+        for contract in range(contracts)
+    }
+
+
+def responses(contracts: int, tokens: int) -> list:
+    balances = token_balances(contracts, tokens)
+    return [
+        AuthorizedUser("ethereum", "0x1234567890", "0x1234567890", balances),
+        TokenOwnershipResponse(True, balances),
+    ]
+
+
+# timed returns the seconds per call of fn, over at least min_time seconds
+def timed(fn, min_time: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark serializing response types as JSON, pickle and binary"
+    )
+    parser.add_argument("--contracts", nargs="+", type=int, default=[0, 10, 1000])
+    parser.add_argument("--tokens", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for contracts in args.contracts:
+        for obj in responses(contracts, args.tokens):
+            cls = type(obj)
+            for name, (encode, decode) in FORMATS.items():
+                data = encode(obj)
+                assert decode(cls, data) == obj
+                result = {
+                    "format": name,
+                    "type": cls.__name__,
+                    "contracts": contracts,
+                    "tokens": args.tokens,
+                    "bytes": len(data),
+                    "encode_seconds": timed(lambda: encode(obj), args.min_time),
+                    "decode_seconds": timed(lambda: decode(cls, data), args.min_time),
+                }
+                results.append(result)
+                print(
+                    f"{cls.__name__:<22} contracts={contracts:<5} {name:<6} "
+                    f"{result['bytes']:>9}B "
+                    f"encode {result['encode_seconds'] * 1e6:>9.1f}us "
+                    f"decode {result['decode_seconds'] * 1e6:>9.1f}us"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import json
+import tracemalloc
+from dataclasses import dataclass
+
+from picketapi.types import AuthorizedUser, TokenBalances
+
+
+# the dataclass AuthorizedUser before the response types were made compact
+@dataclass
+class LegacyAuthorizedUser:
+    chain: str
+    wallet_address: str
+    display_address: str
+    token_balances: TokenBalances
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            d["chain"], d["walletAddress"], d["displayAddress"], d["tokenBalances"]
+        )
+
+
+IMPLEMENTATIONS = {
+    "legacy": LegacyAuthorizedUser,
+    "current": AuthorizedUser,
+}
+
+
+def response_body(idx: int, contracts: int, tokens: int) -> str:
+    return json.dumps(
+        {
+            "chain": "ethereum",
+            "walletAddress": f"0x{idx:040x}",
+            "displayAddress": f"0x{idx:040x}",
+            "tokenBalances": {
+                f"0x{contract:040x}": {str(token): "1" for token in range(tokens)}
+                for contract in range(contracts)
+            },
+        }
+    )
+
+
+# bytes_per_object decodes count distinct responses, as the client does,
+# and returns the memory retained per parsed object
+def bytes_per_object(cls, bodies, access: bool) -> float:
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        objects = [cls.from_dict(json.loads(body)) for body in bodies]
+        if access:
+            for obj in objects:
+                len(obj.token_balances)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (current - base) / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory per cached user")
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--contracts", nargs="+", type=int, default=[0, 1, 10])
+    parser.add_argument("--tokens", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for contracts in args.contracts:
+        bodies = [
+            response_body(idx, contracts, args.tokens) for idx in range(args.objects)
+        ]
+        for implementation, cls in IMPLEMENTATIONS.items():
+            for access in (False, True):
+                result = {
+                    "implementation": implementation,
+                    "contracts": contracts,
+                    "tokens": args.tokens,
+                    "token_balances_accessed": access,
+                    "bytes_per_object": bytes_per_object(cls, bodies, access),
+                }
+                results.append(result)
+                print(
+                    f"{implementation:<8} contracts={contracts:<4} "
+                    f"accessed={str(access):<5} "
+                    f"{result['bytes_per_object']:>10.0f}B/object"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
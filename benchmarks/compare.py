@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        report = json.load(f)
+    return {
+        (
+            result["client"],
+            result.get("transport", ""),
+            result["method"],
+            result["concurrency"],
+        ): result
+        for result in report["results"]
+    }
+
+
+def change(old: float, new: float) -> float:
+    return (new - old) / old if old else 0.0
+
+
+# compare prints throughput and p99 changes between two benchmark results
+# and exits with status 1 if any benchmark regressed by more than the threshold
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change counted as a regression",
+    )
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    current = load(args.current)
+
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        throughput = change(old["throughput"], new["throughput"])
+        p99 = change(old["latency"]["p99"], new["latency"]["p99"])
+        regressed = throughput < -args.threshold or p99 > args.threshold
+        regressions += regressed
+
+        client, transport, method, concurrency = key
+        print(
+            f"{client:<12} {transport:<9} {method:<16} c={concurrency:<4} "
+            f"throughput {throughput:+7.1%}  p99 {p99:+7.1%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+
+    if regressions:
+        print(f"{regressions} regression(s)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
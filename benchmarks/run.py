@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from stub_server import StubPicketServer
+
+from picketapi import FakeTransport, HTTP2Transport, Picket
+
+CHAIN = "ethereum"
+WALLET = "0x1234567890"
+ACCESS_TOKEN = "xxx.yyy.zzz"
+REQUIREMENTS = {"contractAddress": "0x0", "minTokenBalance": "1"}
+
+# method name -> function calling it on a Picket or AsyncPicket client
+METHODS = {
+    "nonce": lambda picket: picket.nonce(chain=CHAIN, wallet_address=WALLET),
+    "auth": lambda picket: picket.auth(
+        chain=CHAIN, wallet_address=WALLET, signature="0xsignature"
+    ),
+    "authz": lambda picket: picket.authz(
+        access_token=ACCESS_TOKEN, requirements=REQUIREMENTS
+    ),
+    "validate": lambda picket: picket.validate(access_token=ACCESS_TOKEN),
+    "token_ownership": lambda picket: picket.token_ownesrhip(
+        chain=CHAIN, wallet_address=WALLET, requirements=REQUIREMENTS
+    ),
+}
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    rank = q * (len(ordered) - 1)
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def latency_summary(latencies) -> dict:
+    return {
+        "mean": sum(latencies) / len(latencies),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+    }
+
+
+def timed(call, picket) -> float:
+    start = time.perf_counter()
+    call(picket)
+    return time.perf_counter() - start
+
+
+# measure_allocations runs calls sequentially under tracemalloc
+# peak is the most memory allocated at once, retained is what is left per call afterwards
+def measure_allocations(call, picket, calls: int) -> dict:
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            call(picket)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes": peak - base,
+        "retained_bytes_per_call": (current - base) / calls,
+    }
+
+
+def new_transport(server: StubPicketServer, concurrency: int, args):
+    if args.transport == "http2":
+        return HTTP2Transport(max_connections=max(concurrency, 1))
+    if args.transport == "fake":
+        # answer in-process with the stub server's responses
+        return FakeTransport(server.responses, latency=args.latency)
+    # default RequestsTransport
+    return None
+
+
+def bench_sync(server: StubPicketServer, method: str, concurrency: int, args) -> dict:
+    call = METHODS[method]
+    with Picket(
+        "benchmark",
+        base_url=server.base_url,
+        pool_maxsize=max(concurrency, 1),
+        transport=new_transport(server, concurrency, args),
+        hedge_delay=args.hedge_delay,
+    ) as picket:
+        for _ in range(args.warmup):
+            call(picket)
+
+        per_worker = max(args.requests // concurrency, 1)
+
+        def worker():
+            return [timed(call, picket) for _ in range(per_worker)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(worker) for _ in range(concurrency)]
+            latencies = [latency for f in futures for latency in f.result()]
+        elapsed = time.perf_counter() - start
+
+        allocations = measure_allocations(call, picket, args.alloc_calls)
+
+    return {
+        "client": "Picket",
+        "transport": args.transport,
+        "method": method,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "latency": latency_summary(latencies),
+        "allocations": allocations,
+    }
+
+
+async def bench_async(base_url: str, method: str, concurrency: int, args) -> dict:
+    from picketapi import AsyncPicket
+
+    call = METHODS[method]
+
+    async def timed_async(picket) -> float:
+        start = time.perf_counter()
+        await call(picket)
+        return time.perf_counter() - start
+
+    async with AsyncPicket(
+        "benchmark",
+        base_url=base_url,
+        max_concurrency=max(concurrency, 1),
+        pool_maxsize=max(concurrency, 1),
+        hedge_delay=args.hedge_delay,
+    ) as picket:
+        for _ in range(args.warmup):
+            await call(picket)
+
+        per_worker = max(args.requests // concurrency, 1)
+
+        async def worker():
+            return [await timed_async(picket) for _ in range(per_worker)]
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        latencies = [latency for result in results for latency in result]
+
+        tracemalloc.start()
+        try:
+            base, _ = tracemalloc.get_traced_memory()
+            for _ in range(args.alloc_calls):
+                await call(picket)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "client": "AsyncPicket",
+        "transport": "httpx",
+        "method": method,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "latency": latency_summary(latencies),
+        "allocations": {
+            "peak_bytes": peak - base,
+            "retained_bytes_per_call": (current - base) / args.alloc_calls,
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        )
+        dirty = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    commit = commit.decode("utf-8").strip()
+    return commit + "-dirty" if dirty.strip() else commit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Picket client against a local stub server"
+    )
+    parser.add_argument(
+        "--methods", nargs="+", choices=sorted(METHODS), default=list(METHODS)
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-calls", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="stub server latency in seconds"
+    )
+    parser.add_argument(
+        "--balances",
+        type=int,
+        default=1,
+        help="number of contracts in tokenBalances responses",
+    )
+    parser.add_argument(
+        "--slow-fraction",
+        type=float,
+        default=0.0,
+        help="fraction of stub server responses delayed by --slow-latency",
+    )
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--hedge-delay",
+        type=float,
+        default=None,
+        help="hedge validate and tokenOwnership requests after this many seconds",
+    )
+    parser.add_argument(
+        "--transport", choices=["requests", "http2", "fake"], default="requests"
+    )
+    parser.add_argument(
+        "--async",
+        dest="run_async",
+        action="store_true",
+        help="also benchmark AsyncPicket (requires httpx)",
+    )
+    parser.add_argument("--output", help="defaults to benchmarks/results/<commit>.json")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = []
+    with StubPicketServer(
+        latency=args.latency,
+        balances=args.balances,
+        slow_fraction=args.slow_fraction,
+        slow_latency=args.slow_latency,
+    ) as server:
+        for method in args.methods:
+            for concurrency in args.concurrency:
+                result = bench_sync(server, method, concurrency, args)
+                results.append(result)
+                print_result(result)
+                if args.run_async:
+                    result = asyncio.run(
+                        bench_async(server.base_url, method, concurrency, args)
+                    )
+                    results.append(result)
+                    print_result(result)
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "alloc_calls": args.alloc_calls,
+            "latency": args.latency,
+            "balances": args.balances,
+            "slow_fraction": args.slow_fraction,
+            "slow_latency": args.slow_latency,
+            "hedge_delay": args.hedge_delay,
+            "transport": args.transport,
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}", file=sys.stderr)
+
+
+def print_result(result: dict):
+    latency = result["latency"]
+    print(
+        f"{result['client']:<12} {result['transport']:<9} "
+        f"{result['method']:<16} c={result['concurrency']:<4} "
+        f"{result['throughput']:>9.1f} req/s  "
+        f"p50={latency['p50'] * 1000:.2f}ms p95={latency['p95'] * 1000:.2f}ms "
+        f"p99={latency['p99'] * 1000:.2f}ms  "
+        f"peak={result['allocations']['peak_bytes']}B",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
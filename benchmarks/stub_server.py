@@ -0,0 +1,183 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from picketapi.recording import ReplayTransport
+
+API_PREFIX = "/api/v1/"
+
+TOKEN_OWNERSHIP_PATH = re.compile(r"^chains/([^/]+)/wallets/([^/]+)/tokenOwnership$")
+
+
+def token_balances(size: int) -> dict:
+    return {
+        f"0x{idx:040x}": {f"{token_id}": "1" for token_id in range(3)}
+        for idx in range(size)
+    }
+
+
+# StubPicketServer mimics the Picket API endpoints used by the client
+# latency is added to every response and balances sets the number of
+# contracts in tokenBalances, which controls the payload size
+# slow_fraction of responses are delayed by slow_latency on top, to simulate a long tail
+# replay serves recorded responses, at their recorded latency, instead of the stub ones
+class StubPicketServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        balances: int = 1,
+        slow_fraction: float = 0.0,
+        slow_latency: float = 0.0,
+        replay: Optional[ReplayTransport] = None,
+    ):
+        self.latency = latency
+        self.balances = balances
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.replay = replay
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        user = {
+            "chain": "ethereum",
+            "walletAddress": "0x1234567890",
+            "displayAddress": "0x1234567890",
+            "tokenBalances": token_balances(balances),
+        }
+        self.responses = {
+            "auth/nonce": {
+                "nonce": "nonce",
+                "statement": "Sign this message to log in",
+                "format": "siwe",
+            },
+            "auth": {"accessToken": "xxx.yyy.zzz", "user": user},
+            "authz": {"accessToken": "xxx.yyy.zzz", "user": user},
+            "auth/validate": user,
+            "tokenOwnership": {
+                "allowed": True,
+                "tokenBalances": user["tokenBalances"],
+            },
+        }
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def response(self, path: str):
+        if TOKEN_OWNERSHIP_PATH.match(path):
+            path = "tokenOwnership"
+        return self.responses.get(path)
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = self.rfile.read(length)
+
+                with server._lock:
+                    server.requests += 1
+                if server.replay is not None:
+                    return self.replay(json.loads(payload or b"{}"))
+                latency = server.latency
+                if server.slow_fraction and random.random() < server.slow_fraction:
+                    latency += server.slow_latency
+                if latency:
+                    time.sleep(latency)
+
+                data = None
+                if self.path.startswith(API_PREFIX):
+                    data = server.response(self.path[len(API_PREFIX) :])
+
+                status = 200
+                if data is None:
+                    status = 404
+                    data = {"msg": "not found", "code": "NOT_FOUND"}
+
+                self.respond(status, json.dumps(data).encode("utf-8"))
+
+            def replay(self, payload):
+                recording = server.replay.match(self.path, payload)
+                if recording is None:
+                    body = json.dumps({"msg": "no recording", "code": "NOT_FOUND"})
+                    return self.respond(404, body.encode("utf-8"))
+                time.sleep(recording.latency / server.replay.speed)
+                self.respond(recording.status_code, recording.response.encode("utf-8"))
+
+            def respond(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubPicketServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Picket API server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--balances", type=int, default=1)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--replay", help="serve the recordings in this file")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed")
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay:
+        replay = ReplayTransport.from_file(args.replay, speed=args.speed)
+
+    server = StubPicketServer(
+        port=args.port,
+        latency=args.latency,
+        balances=args.balances,
+        slow_fraction=args.slow_fraction,
+        slow_latency=args.slow_latency,
+        replay=replay,
+    )
+    print(f"Stub Picket API listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,8 @@
 # expose Picket as a top-level import
 from .picket import *
+from .async_picket import *
+from .transport import *
+from .cache import *
+from .requirements import *
+from .middleware import *
+from .recording import *
@@ -0,0 +1,513 @@
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from .coalesce import AsyncSingleFlight
+from .exceptions import DeadlineExceededError, PicketAPIException
+from .helpers import canonical_hash, endpoint_name, snake_to_camel_keys
+from .metrics import RequestEvent
+from .picket import (
+    BasePicket,
+    is_deterministic_failure,
+    is_overloaded,
+    nonce_cache_key,
+    token_ownership_cache_key,
+    validate_cache_key,
+)
+from .transport import Tracer, httpx_timeout
+from .types import (
+    NonceResponse,
+    AuthorizedUser,
+    AuthResponse,
+    TokenOwnershipResponse,
+)
+
+__all__ = ["AsyncPicket"]
+
+
+# AsyncTracer is a Tracer for httpx.AsyncClient, which awaits trace callbacks
+class AsyncTracer(Tracer):
+    async def __call__(self, name: str, info: dict):
+        self.mark(name)
+
+
+class AsyncPicket(BasePicket):
+    def __init__(self, api_key: str, **kwargs):
+        if httpx is None:
+            raise ImportError(
+                "AsyncPicket requires httpx. Install it with `pip install httpx`"
+            )
+
+        super().__init__(api_key, **kwargs)
+        # maximum number of requests in flight at once
+        # requests over the limit wait for a free slot instead of piling up on the pool
+        self.max_concurrency = kwargs.get("max_concurrency", 100)
+        self.single_flight = AsyncSingleFlight() if self.coalesce_requests else None
+        # concurrent nonce() calls for a wallet share one request to fill the cache
+        self.nonce_flight = (
+            AsyncSingleFlight() if self.nonce_cache is not None else None
+        )
+
+        self._client = None
+        # created lazily so it binds to the running event loop
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def new_client(self) -> "httpx.AsyncClient":
+        limits = httpx.Limits(
+            max_connections=self.pool_maxsize,
+            max_keepalive_connections=self.pool_maxsize,
+            keepalive_expiry=self.pool_idle_timeout,
+        )
+        # timeouts are set per attempt
+        return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(None))
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            self._client = self.new_client()
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def post_request(self, path: str, **kwargs):
+        return await self.request(path, kwargs)
+
+    # request sends payload to path and returns build(data), or data if build is None
+    # timeout and deadline override the client's defaults for this call
+    async def request(
+        self,
+        path: str,
+        payload: dict,
+        build: Optional[Callable] = None,
+        timeout=None,
+        deadline=None,
+    ):
+        if self.single_flight is not None:
+            # share identical in-flight requests between tasks
+            # build is part of the key, so every caller gets the result type it asked for
+            key = (path, canonical_hash(payload), build)
+            return await self.single_flight.do(
+                key, lambda: self._request(path, payload, build, timeout, deadline)
+            )
+        return await self._request(path, payload, build, timeout, deadline)
+
+    async def _request(self, path: str, payload: dict, build, timeout, deadline):
+        event = RequestEvent(endpoint_name(path))
+        start = time.perf_counter()
+        error = None
+        try:
+            data = await self._post(path, payload, timeout, deadline, event)
+            return self.build_response(event, data, build)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish_event(event, start, error)
+
+    async def _post(
+        self, path: str, payload: dict, timeout, deadline, event: RequestEvent
+    ):
+        url = self.url(path)
+        auth = httpx.BasicAuth(self.api_key, "")
+        headers = self.headers()
+        # transform keys to camelCase
+        start = time.perf_counter()
+        body = snake_to_camel_keys(payload)
+        event.transform = time.perf_counter() - start
+        deadline_at = self.deadline_at(deadline)
+
+        attempt = 0
+        while True:
+            self.check_circuit()
+            if (
+                self.rate_limiter is not None
+                and not await self.rate_limiter.acquire_async(
+                    path, self.remaining(deadline_at)
+                )
+            ):
+                raise DeadlineExceededError(
+                    "Picket API rate limit wait exceeds deadline"
+                )
+            if (
+                self.concurrency_limiter is not None
+                and not await self.concurrency_limiter.acquire_async(
+                    self.remaining(deadline_at)
+                )
+            ):
+                raise DeadlineExceededError(
+                    "Picket API concurrency limit wait exceeds deadline"
+                )
+
+            event.reset_timings()
+            event.attempts += 1
+            started = time.perf_counter()
+            try:
+                req = await self.send(
+                    path,
+                    url,
+                    headers,
+                    auth,
+                    body,
+                    httpx_timeout(self.attempt_timeout(timeout, deadline_at)),
+                    event,
+                )
+                event.status_code = req.status_code
+            except httpx.TransportError:
+                self.release_slot(started, overloaded=True)
+                self.record_outcome(failed=True)
+                delay = self.retry_delay(path, attempt, deadline_at)
+                if delay is None:
+                    raise
+            except BaseException:
+                # cancelled or failed before a response, not a signal of overload
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release()
+                raise
+            else:
+                self.release_slot(started, is_overloaded(req.status_code))
+                delay = self.response_retry_delay(
+                    path, attempt, deadline_at, req.status_code, req.headers
+                )
+                if delay is None:
+                    start = time.perf_counter()
+                    try:
+                        return self.handle_response(req.status_code, req.text)
+                    finally:
+                        event.json_decode = time.perf_counter() - start
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(
+        self, url: str, headers, auth, body, timeout, event: RequestEvent
+    ) -> "httpx.Response":
+        tracer = AsyncTracer()
+        async with self._get_semaphore():
+            tracer.start = time.perf_counter()
+            req = await self._get_client().post(
+                url,
+                auth=auth,
+                headers=headers,
+                json=body,
+                timeout=timeout,
+                extensions={"trace": tracer},
+            )
+            tracer.end = time.perf_counter()
+        tracer.record(event)
+        return req
+
+    # send sends one attempt, hedged for idempotent endpoints with a hedge policy
+    async def send(
+        self, path: str, url: str, headers, auth, body, timeout, event: RequestEvent
+    ) -> "httpx.Response":
+        policy = self.hedge_policy
+        if policy is None or not self.is_idempotent(path):
+            return await self._send(url, headers, auth, body, timeout, event)
+
+        policy.started()
+        delay = policy.hedge_delay(event.endpoint)
+        start = time.perf_counter()
+        if delay is None:
+            req = await self._send(url, headers, auth, body, timeout, event)
+            policy.observe(event.endpoint, time.perf_counter() - start)
+            return req
+
+        # each request records its timings on its own event, the winner's are kept
+        primary_event = RequestEvent(event.endpoint)
+        primary = asyncio.ensure_future(
+            self._send(url, headers, auth, body, timeout, primary_event)
+        )
+        # task -> event
+        attempts = {primary: primary_event}
+        pending = set(attempts)
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and policy.allow():
+                hedge_event = RequestEvent(event.endpoint)
+                hedge = asyncio.ensure_future(
+                    self._send(url, headers, auth, body, timeout, hedge_event)
+                )
+                attempts[hedge] = hedge_event
+                pending.add(hedge)
+                event.hedged = True
+
+            while True:
+                if not done:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                # a failed request loses unless the other one failed too
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    if task.exception() is not None and pending:
+                        continue
+                    event.copy_timings(attempts[task])
+                    if task is not primary:
+                        policy.won()
+                    req = task.result()
+                    policy.observe(event.endpoint, time.perf_counter() - start)
+                    return req
+                done = set()
+        finally:
+            # cancel the loser, or both requests if the caller was cancelled
+            for task in pending:
+                task.cancel()
+
+    # nonce
+    async def nonce(
+        self,
+        chain: str,
+        wallet_address: str,
+        locale: str = "en-US",
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> NonceResponse:
+        resp = self.cached_nonce(chain, wallet_address, locale)
+        if resp is not None:
+            return resp
+
+        async def fetch():
+            resp = await self.request(
+                "auth/nonce",
+                dict(chain=chain, wallet_address=wallet_address, locale=locale),
+                NonceResponse.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+            self.cache_nonce(chain, wallet_address, locale, resp)
+            return resp
+
+        if self.nonce_flight is None:
+            return await fetch()
+        return await self.nonce_flight.do(
+            nonce_cache_key(chain, wallet_address, locale), fetch
+        )
+
+    async def auth(
+        self,
+        chain: str,
+        wallet_address: str,
+        signature: str,
+        requirements: dict = {},
+        context: dict = {},
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthResponse:
+        try:
+            resp = await self.request(
+                "auth",
+                dict(
+                    chain=chain,
+                    wallet_address=wallet_address,
+                    signature=signature,
+                    requirements=requirements,
+                    context=context,
+                ),
+                AuthResponse.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+        except Exception as e:
+            # a rejected signature may be for a stale or used nonce, so fetch a new one
+            if is_deterministic_failure(e):
+                self.invalidate_nonce(chain, wallet_address)
+            raise
+        # the nonce has been used
+        self.invalidate_nonce(chain, wallet_address)
+        self.observe_auth(resp)
+        return resp
+
+    # refresh_verifier fetches the verifier's keys off the event loop when they are stale
+    async def refresh_verifier(self):
+        if self.verifier is not None and self.verifier.needs_refresh():
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.verifier.refresh)
+            except Exception:
+                # callers fall back to the Picket API
+                pass
+
+    async def authz(
+        self,
+        access_token: str,
+        requirements: dict,
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthResponse:
+        # revalidate always asks the Picket API
+        if not revalidate and self.local_authz:
+            await self.refresh_verifier()
+            resp = self.authz_locally(access_token, requirements)
+            if resp is not None:
+                self.authz_short_circuited += 1
+                return resp
+
+        self.authz_remote += 1
+        resp = await self.request(
+            "authz",
+            dict(
+                access_token=access_token,
+                requirements=requirements,
+                revalidate=revalidate,
+            ),
+            AuthResponse.from_dict,
+            timeout=timeout,
+            deadline=deadline,
+        )
+        self.observe_auth(resp)
+        return resp
+
+    async def validate(
+        self,
+        access_token: str,
+        requirements: dict = {},
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthorizedUser:
+        # revalidate always asks the Picket API
+        if not revalidate:
+            user = self.cached_validation(access_token, requirements)
+            if user is not None:
+                self.refresh_validation(access_token, requirements)
+                return user
+        return await self.validate_uncached(
+            access_token, requirements, revalidate, timeout, deadline
+        )
+
+    # validate_uncached is validate() without the validate cache lookup,
+    # for callers that have already missed the cache
+    async def validate_uncached(
+        self,
+        access_token: str,
+        requirements: dict = {},
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthorizedUser:
+        if not revalidate:
+            error = self.cached_validation_failure(access_token, requirements)
+            if error is not None:
+                raise error
+
+            await self.refresh_verifier()
+
+            user = self.validate_locally(access_token, requirements)
+            if user is not None:
+                return user
+
+            user = self.evaluate_locally(access_token, requirements)
+            if user is not None:
+                return user
+
+        try:
+            user = await self.request(
+                "auth/validate",
+                dict(access_token=access_token, requirements=requirements),
+                AuthorizedUser.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+        except PicketAPIException as e:
+            self.cache_validation_failure(access_token, requirements, e)
+            raise
+        if revalidate:
+            self.forget_validation_failure(access_token, requirements)
+        self.cache_validation(access_token, requirements, user)
+        self.observe_user(access_token, user)
+        return user
+
+    # refresh_validation renews a cached validate() result in a background task
+    # once it is due for a refresh
+    def refresh_validation(self, access_token: str, requirements: dict):
+        if self.refresher is None:
+            return
+        key = validate_cache_key(access_token, requirements)
+
+        async def refresh():
+            try:
+                await self.validate(access_token, requirements, revalidate=True)
+            except Exception as e:
+                self.refresh_failed(self.validate_cache, key, e)
+                raise
+
+        self.refresher.refresh_async(key, refresh)
+
+    async def token_ownesrhip(
+        self,
+        chain: str,
+        wallet_address: str,
+        timeout=None,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> TokenOwnershipResponse:
+        resp = self.cached_token_ownership(chain, wallet_address, kwargs)
+        if resp is not None:
+            self.refresh_token_ownership(chain, wallet_address, kwargs)
+            return resp
+
+        resp = self.token_ownership_locally(chain, wallet_address, kwargs)
+        if resp is not None:
+            return resp
+
+        return await self.fetch_token_ownership(
+            chain, wallet_address, kwargs, timeout, deadline
+        )
+
+    # fetch_token_ownership asks the Picket API and caches the result
+    async def fetch_token_ownership(
+        self,
+        chain: str,
+        wallet_address: str,
+        payload: dict,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> TokenOwnershipResponse:
+        path = os.path.join(
+            "chains", chain, "wallets", wallet_address, "tokenOwnership"
+        )
+        resp = await self.request(
+            path,
+            payload,
+            TokenOwnershipResponse.from_dict,
+            timeout=timeout,
+            deadline=deadline,
+        )
+        self.cache_token_ownership(chain, wallet_address, payload, resp)
+        self.observe_token_ownership(chain, wallet_address, resp)
+        return resp
+
+    # refresh_token_ownership renews a cached token ownership result in a background task
+    # once it is due for a refresh
+    def refresh_token_ownership(self, chain: str, wallet_address: str, payload: dict):
+        if self.refresher is None:
+            return
+        key = token_ownership_cache_key(chain, wallet_address, payload)
+
+        async def refresh():
+            try:
+                await self.fetch_token_ownership(chain, wallet_address, payload)
+            except Exception as e:
+                self.refresh_failed(self.token_ownership_cache, key, e)
+                raise
+
+        self.refresher.refresh_async(key, refresh)
@@ -0,0 +1,560 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Hashable, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .types import (
+    AuthorizedUser,
+    AuthResponse,
+    NonceResponse,
+    TokenOwnershipResponse,
+    _Model,
+)
+
+__all__ = ["CacheBackend", "TTLCache", "MmapCache", "SQLiteCache"]
+
+logger = logging.getLogger(__name__)
+
+
+# CacheBackend is the interface of the validate() and token ownership result caches
+# Entries expire after ttl seconds, capped at the backend's ttl, and can be tagged
+# with a group so related entries can be invalidated together.
+class CacheBackend:
+    # seconds entries are kept at most, or None when only their own ttl expires them
+    ttl: Optional[float] = None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        group: Optional[Hashable] = None,
+    ):
+        raise NotImplementedError
+
+    def delete(self, key: Hashable):
+        raise NotImplementedError
+
+    # invalidate removes every entry in the group and returns how many were removed
+    def invalidate(self, group: Hashable) -> int:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+# TTLCache is a thread-safe, in-process LRU cache with per-entry expiry
+class TTLCache(CacheBackend):
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (value, expires_at, group)
+        self._entries = OrderedDict()
+        # group -> set of keys
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        group: Optional[Hashable] = None,
+    ):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, time.monotonic() + ttl, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate(self, group: Hashable) -> int:
+        with self._lock:
+            keys = list(self._groups.get(group, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+    # callers must hold the lock
+    def _remove(self, key: Hashable):
+        _, _, group = self._entries.pop(key)
+        if group is not None:
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+
+# response types that shared backends can store
+_TYPES = {
+    cls.__name__: cls
+    for cls in (NonceResponse, AuthorizedUser, AuthResponse, TokenOwnershipResponse)
+}
+
+
+# encode_value serializes a cached value for the shared backends
+# Response types use their binary format, other values must be JSON serializable
+def encode_value(value: Any) -> bytes:
+    name = type(value).__name__
+    if _TYPES.get(name) is type(value):
+        return value.to_bytes()
+    return json.dumps({"value": value}, separators=(",", ":")).encode("utf-8")
+
+
+# decode_value raises ValueError for data it cannot decode, e.g. written by a newer version
+def decode_value(data: bytes) -> Any:
+    if data[:1] != b"{":
+        return _Model.from_bytes(data)
+    return json.loads(data)["value"]
+
+
+# _digest returns a fixed-size digest of a cache key or group
+# keys are often long access tokens, so the shared backends only store their digests
+def _digest(key: Hashable, size: int = 16) -> bytes:
+    data = key.encode("utf-8") if isinstance(key, str) else repr(key).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=size).digest()
+
+
+_MAGIC = b"PICKETC1"
+# magic, slots, slot size
+_FILE_HEADER = struct.Struct("<8sII")
+# sequence, key digest, group digest, expires at, value length
+_SLOT_HEADER = struct.Struct("<I16s8sdI")
+_SEQUENCE = struct.Struct("<I")
+_EMPTY_KEY = bytes(16)
+_NO_GROUP = bytes(8)
+# slots probed for each key
+_PROBES = 8
+_READ_RETRIES = 4
+
+
+# MmapCache is a fixed-size hash table in a memory-mapped file, shared by every
+# process on the host that opens the same path.
+# Writers serialize on an fcntl lock on the file. Readers take no lock: each slot has a
+# sequence number that writers make odd while they update it, and readers retry if it
+# changed while they read (a seqlock). Each key can live in one of 8 slots; when they are
+# all taken, the entry expiring soonest is evicted. Values larger than a slot are not cached.
+class MmapCache(CacheBackend):
+    def __init__(
+        self, path: str, slots: int = 16384, slot_size: int = 1024, ttl: float = 60
+    ):
+        if fcntl is None:
+            raise ImportError(
+                "MmapCache requires fcntl, which is only available on Unix"
+            )
+        if slot_size <= _SLOT_HEADER.size:
+            raise ValueError(f"slot_size must be larger than {_SLOT_HEADER.size}")
+
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.maxsize = slots
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # values too large for a slot
+        self.skipped = 0
+
+        size = _FILE_HEADER.size + slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _FILE_HEADER.pack(_MAGIC, slots, slot_size), 0)
+            header = os.pread(self._fd, _FILE_HEADER.size, 0)
+            if header != _FILE_HEADER.pack(_MAGIC, slots, slot_size):
+                raise ValueError(
+                    f"{path} is not an MmapCache file with {slots} slots of {slot_size} bytes"
+                )
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._mm = mmap.mmap(self._fd, size)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    def __len__(self):
+        now = time.time()
+        return sum(
+            1
+            for offset in self._offsets()
+            if self._read(offset, now, header_only=True) is not None
+        )
+
+    def _offsets(self):
+        return range(_FILE_HEADER.size, len(self._mm), self.slot_size)
+
+    def _probe(self, key_digest: bytes):
+        start = int.from_bytes(key_digest[:8], "little") % self.slots
+        for idx in range(_PROBES):
+            yield _FILE_HEADER.size + ((start + idx) % self.slots) * self.slot_size
+
+    @contextmanager
+    def _write_lock(self):
+        # flock is shared with a forked parent, so children reopen the file
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # _read returns (key digest, group digest, expires at, value) of a live slot, or None
+    def _read(self, offset: int, now: float, header_only: bool = False):
+        mm = self._mm
+        for _ in range(_READ_RETRIES):
+            sequence, key, group, expires_at, length = _SLOT_HEADER.unpack_from(
+                mm, offset
+            )
+            if sequence & 1:
+                # a writer is updating the slot
+                continue
+            if key == _EMPTY_KEY or expires_at <= now:
+                return None
+            value = None
+            if not header_only:
+                start = offset + _SLOT_HEADER.size
+                value = mm[start : start + length]
+            if _SEQUENCE.unpack_from(mm, offset)[0] == sequence:
+                return key, group, expires_at, value
+        return None
+
+    # callers must hold the write lock
+    def _write(self, offset: int, key: bytes, group: bytes, expires_at: float, value):
+        mm = self._mm
+        sequence = _SEQUENCE.unpack_from(mm, offset)[0]
+        _SEQUENCE.pack_into(mm, offset, (sequence + 1) & 0xFFFFFFFF)
+        _SLOT_HEADER.pack_into(
+            mm, offset, (sequence + 1) & 0xFFFFFFFF, key, group, expires_at, len(value)
+        )
+        start = offset + _SLOT_HEADER.size
+        mm[start : start + len(value)] = value
+        _SEQUENCE.pack_into(mm, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def _clear_slot(self, offset: int):
+        self._write(offset, _EMPTY_KEY, _NO_GROUP, 0.0, b"")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        key_digest = _digest(key)
+        now = time.time()
+        for offset in self._probe(key_digest):
+            slot = self._read(offset, now)
+            if slot is not None and slot[0] == key_digest:
+                try:
+                    value = decode_value(slot[3])
+                except (ValueError, KeyError):
+                    logger.debug(
+                        "Dropping undecodable Picket cache entry", exc_info=True
+                    )
+                    self.delete(key)
+                    break
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        group: Optional[Hashable] = None,
+    ):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        data = encode_value(value)
+        if len(data) > self.slot_size - _SLOT_HEADER.size:
+            self.skipped += 1
+            return
+
+        key_digest = _digest(key)
+        group_digest = _NO_GROUP if group is None else _digest(group, 8)
+        with self._write_lock():
+            now = time.time()
+            target = None
+            soonest = None
+            for offset in self._probe(key_digest):
+                _, slot_key, _, expires_at, _ = _SLOT_HEADER.unpack_from(
+                    self._mm, offset
+                )
+                if slot_key == key_digest:
+                    target = offset
+                    break
+                if target is None and (slot_key == _EMPTY_KEY or expires_at <= now):
+                    target = offset
+                if soonest is None or expires_at < soonest[1]:
+                    soonest = (offset, expires_at)
+
+            if target is None:
+                target = soonest[0]
+                self.evictions += 1
+            self._write(target, key_digest, group_digest, now + ttl, data)
+
+    def delete(self, key: Hashable):
+        key_digest = _digest(key)
+        with self._write_lock():
+            for offset in self._probe(key_digest):
+                if _SLOT_HEADER.unpack_from(self._mm, offset)[1] == key_digest:
+                    self._clear_slot(offset)
+
+    def invalidate(self, group: Hashable) -> int:
+        group_digest = _digest(group, 8)
+        removed = 0
+        with self._write_lock():
+            now = time.time()
+            for offset in self._offsets():
+                _, key, slot_group, expires_at, _ = _SLOT_HEADER.unpack_from(
+                    self._mm, offset
+                )
+                if key != _EMPTY_KEY and slot_group == group_digest:
+                    self._clear_slot(offset)
+                    removed += expires_at > now
+        return removed
+
+    def clear(self):
+        with self._write_lock():
+            for offset in self._offsets():
+                if _SLOT_HEADER.unpack_from(self._mm, offset)[1] != _EMPTY_KEY:
+                    self._clear_slot(offset)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
+
+
+# SQLiteCache stores entries in a SQLite database file shared by every process on the host
+# The database uses WAL mode, so reads do not block on writers. When the cache is
+# over maxsize, the entries expiring soonest are evicted; the size is checked every
+# 64 writes, so it may briefly exceed maxsize.
+class SQLiteCache(CacheBackend):
+    def __init__(
+        self, path: str, maxsize: int = 10000, ttl: float = 60, timeout: float = 5.0
+    ):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # seconds to wait for another process's write lock
+        self.timeout = timeout
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._writes = 0
+        # one connection per thread and process
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, grp BLOB, expires_at REAL NOT NULL, value BLOB NOT NULL"
+            ")"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_grp ON entries (grp)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # autocommit, transactions are started explicitly
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __len__(self):
+        row = (
+            self._conn()
+            .execute(
+                "SELECT COUNT(*) FROM entries WHERE expires_at > ?", (time.time(),)
+            )
+            .fetchone()
+        )
+        return row[0]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                (_digest(key), time.time()),
+            )
+            .fetchone()
+        )
+        if row is not None:
+            try:
+                value = decode_value(row[0])
+            except (ValueError, KeyError):
+                logger.debug("Dropping undecodable Picket cache entry", exc_info=True)
+                self.delete(key)
+            else:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        group: Optional[Hashable] = None,
+    ):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, grp, expires_at, value) VALUES (?, ?, ?, ?)",
+            (
+                _digest(key),
+                None if group is None else _digest(group, 8),
+                now + ttl,
+                encode_value(value),
+            ),
+        )
+
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            over = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            over -= self.maxsize
+            if over > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY expires_at LIMIT ?)",
+                    (over,),
+                )
+                self.evictions += over
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: Hashable):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (_digest(key),))
+
+    def invalidate(self, group: Hashable) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM entries WHERE grp = ? AND expires_at > ?",
+            (_digest(group, 8), time.time()),
+        )
+        return cursor.rowcount
+
+    def clear(self):
+        self._conn().execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+
+__all__ = ["CircuitBreaker"]
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+# CircuitBreaker fails fast once the error rate over a rolling window crosses a threshold.
+# After recovery_timeout a single probe request is let through (half-open);
+# its outcome closes the circuit or opens it again.
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        min_calls: int = 20,
+        window: float = 30.0,
+        recovery_timeout: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.recovery_timeout = recovery_timeout
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        # one [second, calls, failures] bucket per second in the window
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    # retry_after returns 0 if a request may be sent now,
+    # otherwise the seconds until the circuit allows a probe
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state == CLOSED:
+                return 0
+
+            now = time.monotonic()
+            remaining = self._opened_at + self.recovery_timeout - now
+            if remaining <= 0:
+                # let this request through as the probe
+                # another probe is allowed if it never reports back
+                self.state = HALF_OPEN
+                self._opened_at = now
+                return 0
+
+            return remaining
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._close()
+                return
+            self._record(failed=False)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+
+            self._record(failed=True)
+            calls, failures = self._totals()
+            if (
+                self.state == CLOSED
+                and calls >= self.min_calls
+                and failures / calls >= self.failure_threshold
+            ):
+                self._open()
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls, failures = self._totals()
+            return {"state": self.state, "calls": calls, "failures": failures}
+
+    # callers must hold the lock
+    def _record(self, failed: bool):
+        now = int(time.monotonic())
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        if failed:
+            bucket[2] += 1
+
+    def _totals(self):
+        oldest = time.monotonic() - self.window
+        while self._buckets and self._buckets[0][0] < oldest:
+            self._buckets.popleft()
+        calls = sum(b[1] for b in self._buckets)
+        failures = sum(b[2] for b in self._buckets)
+        return calls, failures
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+    def _close(self):
+        self.state = CLOSED
+        self._buckets.clear()
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable
+
+__all__ = ["SingleFlight", "AsyncSingleFlight"]
+
+
+# SingleFlight shares one in-flight call between concurrent callers with the same key.
+# Every caller receives the leader's result or re-raises the leader's exception.
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+# AsyncSingleFlight is SingleFlight for asyncio tasks
+class AsyncSingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+        self._in_flight = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # a cancelled caller must not cancel the request shared with other callers
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
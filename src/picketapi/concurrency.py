@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+__all__ = ["AdaptiveConcurrencyLimiter"]
+
+
+class _AsyncWaiter:
+    __slots__ = ("loop", "future")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+# AdaptiveConcurrencyLimiter limits the number of requests in flight with AIMD:
+# the limit grows by increase per limit successful requests, i.e. about once per round
+# trip, while it is in use and latency stays within latency_tolerance times the smoothed
+# latency. It is multiplied by backoff on an overload signal, i.e. a 429, 5xx, timeout or
+# connection error, or a slower response, at most once per round trip.
+# Threads and asyncio tasks can share one limiter; callers over the limit wait in
+# FIFO order and are counted in queue_depth.
+class AdaptiveConcurrencyLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        backoff: float = 0.75,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.05,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        # smoothed latency of recent requests in seconds
+        self.latency: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _try_acquire(self) -> bool:
+        # callers must hold the lock
+        if not self._waiters and self.in_flight < self.limit:
+            self.in_flight += 1
+            return True
+        return False
+
+    # acquire blocks until a request may be sent
+    # it returns False if that would take longer than timeout
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._try_acquire():
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return False
+        # the slot was handed over as the wait timed out
+        return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._try_acquire():
+                return True
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    return False
+            return True
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # give back the slot that was handed over
+            self.release()
+            raise
+
+    # release ends a request that took latency seconds
+    # without a latency, e.g. for cancelled requests, the limit is not changed
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if latency is not None:
+                self._update(latency, overloaded)
+            # hand free slots to waiters in FIFO order
+            while self._waiters and self.in_flight < self.limit:
+                self.in_flight += 1
+                self._waiters.popleft().set()
+
+    def _update(self, latency: float, overloaded: bool):
+        # callers must hold the lock
+        if self.latency is None:
+            self.latency = latency
+        elif latency > self.latency_tolerance * self.latency:
+            overloaded = True
+
+        now = time.monotonic()
+        if overloaded:
+            # requests in flight when the limit dropped report the same overload
+            if (
+                now - self._last_decrease >= self.latency
+                and self._limit > self.min_limit
+            ):
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif self._waiters or self.in_flight + 1 >= self.limit:
+            # only grow a limit that is in use
+            limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            if int(limit) > self.limit:
+                self.increases += 1
+            self._limit = limit
+
+        self.latency += self.smoothing * (latency - self.latency)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "latency": self.latency,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+    # prometheus renders the limit, in flight and queue depth gauges in the
+    # Prometheus text exposition format
+    def prometheus(self, prefix: str = "picket") -> str:
+        lines = []
+        for name, help, value in (
+            ("concurrency_limit", "Adaptive concurrency limit", self.limit),
+            ("in_flight_requests", "Picket API calls in flight", self.in_flight),
+            ("queue_depth", "Picket API calls waiting for the limit", self.queue_depth),
+        ):
+            lines += [
+                f"# HELP {prefix}_{name} {help}",
+                f"# TYPE {prefix}_{name} gauge",
+                f"{prefix}_{name} {value}",
+            ]
+        return "\n".join(lines) + "\n"
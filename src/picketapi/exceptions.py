@@ -1,8 +1,23 @@
 class PicketAPIException(Exception):
-    def __init__(self, msg: str, code: str):
+    def __init__(self, msg: str, code: str, status_code: int = None):
         super().__init__(msg)
         self.msg = msg
         self.code = code
+        self.status_code = status_code
 
     def __str__(self):
         return self.msg
+
+
+# raised without calling the Picket API while the circuit breaker is open
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"Picket API circuit breaker is open, retry in {retry_after:.1f}s"
+        )
+        self.retry_after = retry_after
+
+
+# raised when a request, including retries, runs past its deadline
+class DeadlineExceededError(Exception):
+    pass
@@ -0,0 +1,93 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from .metrics import DEFAULT_BUCKETS, Histogram
+
+__all__ = ["HedgePolicy"]
+
+
+# HedgePolicy decides when to send a second, identical request to an idempotent
+# endpoint whose response is slow. The first response wins and the other is cancelled.
+# The hedge is sent after delay seconds or, when delay is None, after the percentile
+# of the endpoint's observed latency, once min_samples latencies were observed.
+# Hedges are capped at max_rate of requests: every request earns max_rate of a hedge,
+# up to burst hedges, and a hedge is only sent when a whole one has been earned.
+class HedgePolicy:
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        min_delay: float = 0.005,
+        min_samples: int = 100,
+        max_rate: float = 0.05,
+        burst: float = 10,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.burst = burst
+        self.buckets = buckets
+        # endpoint -> Histogram of response latency
+        self.latency: Dict[str, Histogram] = {}
+
+        self.requests = 0
+        self.hedges = 0
+        # hedges whose response arrived first
+        self.hedge_wins = 0
+        # hedges not sent because of max_rate
+        self.capped = 0
+        self._budget = burst
+        self._lock = threading.Lock()
+
+    def _histogram(self, endpoint: str) -> Histogram:
+        histogram = self.latency.get(endpoint)
+        if histogram is None:
+            with self._lock:
+                histogram = self.latency.setdefault(endpoint, Histogram(self.buckets))
+        return histogram
+
+    # hedge_delay returns the seconds to wait before hedging a request to the endpoint,
+    # or None if it should not be hedged
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        if self.delay is not None:
+            return self.delay
+        histogram = self._histogram(endpoint)
+        if histogram.count < self.min_samples:
+            return None
+        return max(self.min_delay, histogram.percentile(self.percentile))
+
+    # started records a request that may be hedged
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            # rounded so that e.g. ten requests at a max_rate of 0.1 earn a whole hedge
+            self._budget = min(self.burst, round(self._budget + self.max_rate, 9))
+
+    # allow returns whether a hedge may be sent, and counts it if so
+    def allow(self) -> bool:
+        with self._lock:
+            if self._budget < 1:
+                self.capped += 1
+                return False
+            self._budget -= 1
+            self.hedges += 1
+            return True
+
+    # observe records the latency of a response
+    def observe(self, endpoint: str, seconds: float):
+        self._histogram(endpoint).observe(seconds)
+
+    def won(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "capped": self.capped,
+        }
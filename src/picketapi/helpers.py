@@ -1,14 +1,135 @@
+import base64
+import email.utils
+import hashlib
+import json
+import re
+import time
+from functools import lru_cache
+from typing import Callable, Optional
+
+
 def is_successful_status_code(status_code: int) -> bool:
     return status_code >= 200 and status_code < 300
 
 
-def snake_to_camel(name: str) -> str:
+# key conversions are memoized, payloads reuse a small set of keys
+@lru_cache(maxsize=1024)
+def _snake_to_camel(name: str) -> str:
     parts = name.split("_")
     return "".join(word if idx == 0 else word.title() for idx, word in enumerate(parts))
 
 
+def snake_to_camel(name: str) -> str:
+    # already camelCase, return it as is
+    if "_" not in name:
+        return name
+    return _snake_to_camel(name)
+
+
+_CAMEL_BOUNDARY = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+@lru_cache(maxsize=1024)
+def _camel_to_snake(name: str) -> str:
+    return _CAMEL_BOUNDARY.sub("_", name).lower()
+
+
+def camel_to_snake(name: str) -> str:
+    # already snake_case, return it as is
+    if name.islower() or not any(c.isupper() for c in name):
+        return name
+    return _camel_to_snake(name)
+
+
+_CONTAINERS = (dict, list, tuple)
+
+
+# _convert_keys converts the keys of every dict in value, including dicts in lists and tuples
+# Unchanged dicts, lists and tuples are returned as is instead of being copied
+def _convert_keys(value, convert: Callable[[str], str]):
+    value_type = type(value)
+    if value_type is dict:
+        result = None
+        for k, v in value.items():
+            new_k = convert(k) if type(k) is str else k
+            new_v = _convert_keys(v, convert) if type(v) in _CONTAINERS else v
+            if result is None:
+                if new_k is k and new_v is v:
+                    continue
+                # first change, copy the items before it
+                result = {}
+                for prev_k, prev_v in value.items():
+                    if prev_k is k:
+                        break
+                    result[prev_k] = prev_v
+            result[new_k] = new_v
+        return value if result is None else result
+
+    if value_type is list or value_type is tuple:
+        result = None
+        for idx, v in enumerate(value):
+            new_v = _convert_keys(v, convert) if type(v) in _CONTAINERS else v
+            if result is None:
+                if new_v is v:
+                    continue
+                result = list(value[:idx])
+            result.append(new_v)
+        if result is None:
+            return value
+        return result if value_type is list else tuple(result)
+
+    return value
+
+
 def snake_to_camel_keys(d: dict) -> dict:
-    return {
-        snake_to_camel(k): v if type(v) is not dict else snake_to_camel_keys(v)
-        for k, v in d.items()
-    }
+    return _convert_keys(d, snake_to_camel)
+
+
+def camel_to_snake_keys(d: dict) -> dict:
+    return _convert_keys(d, camel_to_snake)
+
+
+# canonical_hash returns a stable hash of a JSON payload, independent of key order and casing
+def canonical_hash(d: dict) -> str:
+    canonical = json.dumps(
+        snake_to_camel_keys(d), sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# token_expiry returns the exp claim of a JWT without verifying it
+def token_expiry(access_token: str) -> Optional[float]:
+    try:
+        payload = access_token.split(".")[1]
+        # restore the base64 padding stripped by JWT encoding
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+# endpoint_name returns the endpoint of an API path,
+# collapsing chains/{chain}/wallets/{wallet}/tokenOwnership to tokenOwnership
+def endpoint_name(path: str) -> str:
+    if path.endswith("/tokenOwnership"):
+        return "tokenOwnership"
+    return path
+
+
+# parse_retry_after returns the seconds to wait from a Retry-After header,
+# which is either a number of seconds or an HTTP date
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
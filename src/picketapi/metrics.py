@@ -0,0 +1,222 @@
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+__all__ = ["RequestEvent", "Histogram", "Metrics"]
+
+# latency buckets in seconds
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# request phases in the order they happen
+PHASES = (
+    "transform",
+    "acquire",
+    "connect",
+    "tls",
+    "ttfb",
+    "body_read",
+    "json_decode",
+    "build",
+)
+
+
+# RequestEvent is reported to hooks once per Picket API call
+# Timings are in seconds; a phase is None if it did not happen or could not be measured,
+# e.g. connect and tls are only set when a new connection was opened.
+# Phase timings are for the last attempt, total covers every attempt.
+@dataclass
+class RequestEvent:
+    endpoint: str
+    status_code: Optional[int] = None
+    error_code: Optional[str] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    total: Optional[float] = None
+    # snake_to_camel_keys on the payload
+    transform: Optional[float] = None
+    # waiting for a pooled connection
+    acquire: Optional[float] = None
+    # TCP connect
+    connect: Optional[float] = None
+    # TLS handshake
+    tls: Optional[float] = None
+    # sending the request until the response headers arrive
+    ttfb: Optional[float] = None
+    body_read: Optional[float] = None
+    json_decode: Optional[float] = None
+    # building the response dataclass
+    build: Optional[float] = None
+    # a hedged request was sent for the last attempt
+    hedged: bool = False
+
+    # add_timing adds to a phase, which may be measured more than once per attempt
+    def add_timing(self, phase: str, seconds: float):
+        current = getattr(self, phase)
+        setattr(self, phase, seconds if current is None else current + seconds)
+
+    # reset_timings clears the phase timings before a retry
+    def reset_timings(self):
+        for phase in PHASES:
+            if phase != "transform":
+                setattr(self, phase, None)
+        self.hedged = False
+
+    # copy_timings copies the phase timings of a request sent for this attempt
+    def copy_timings(self, other: "RequestEvent"):
+        for phase in PHASES:
+            if phase != "transform":
+                setattr(self, phase, getattr(other, phase))
+
+
+# Histogram is a thread-safe fixed-bucket histogram
+# Percentiles are estimated by interpolating within buckets
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if count == 0:
+            return None
+
+        rank = q * count
+        seen = 0
+        for idx, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                if idx == len(self.buckets):
+                    # no upper bound for the +Inf bucket
+                    return lower
+                upper = self.buckets[idx]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+# Metrics aggregates RequestEvents into per-endpoint latency histograms and counters
+# Register it as a hook with Picket(..., collect_metrics=True) or picket.add_hook(metrics)
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # endpoint -> Histogram of total latency
+        self.latency: Dict[str, Histogram] = {}
+        # (endpoint, phase) -> Histogram
+        self.phases: Dict[Tuple[str, str], Histogram] = {}
+        # (endpoint, status) -> count
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent):
+        self.observe(event)
+
+    def _histogram(self, histograms: dict, key) -> Histogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, event: RequestEvent):
+        if event.total is not None:
+            self._histogram(self.latency, event.endpoint).observe(event.total)
+        for phase in PHASES:
+            seconds = getattr(event, phase)
+            if seconds is not None:
+                self._histogram(self.phases, (event.endpoint, phase)).observe(seconds)
+
+        status = str(event.status_code) if event.status_code is not None else "error"
+        key = (event.endpoint, status)
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            endpoint: histogram.snapshot()
+            for endpoint, histogram in sorted(self.latency.items())
+        }
+
+    # prometheus renders the metrics in the Prometheus text exposition format
+    def prometheus(self, prefix: str = "picket") -> str:
+        lines = [
+            f"# HELP {prefix}_requests_total Picket API calls by endpoint and status",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for (endpoint, status), count in sorted(self.requests.items()):
+            labels = f'endpoint="{endpoint}",status="{status}"'
+            lines.append(f"{prefix}_requests_total{{{labels}}} {count}")
+
+        lines += [
+            f"# HELP {prefix}_request_duration_seconds Picket API call latency",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.latency.items()):
+            lines += _histogram_lines(
+                f"{prefix}_request_duration_seconds",
+                f'endpoint="{endpoint}"',
+                histogram,
+            )
+
+        lines += [
+            f"# HELP {prefix}_request_phase_seconds Picket API call latency by phase",
+            f"# TYPE {prefix}_request_phase_seconds histogram",
+        ]
+        for (endpoint, phase), histogram in sorted(self.phases.items()):
+            lines += _histogram_lines(
+                f"{prefix}_request_phase_seconds",
+                f'endpoint="{endpoint}",phase="{phase}"',
+                histogram,
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
@@ -0,0 +1,276 @@
+import json
+import logging
+import threading
+import time
+from http import HTTPStatus
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+from .async_picket import AsyncPicket
+from .metrics import DEFAULT_BUCKETS, Histogram, _histogram_lines
+from .picket import Picket, is_deterministic_failure
+from .types import AuthorizedUser
+
+__all__ = ["PicketWSGIMiddleware", "PicketASGIMiddleware", "RouteMetrics"]
+
+logger = logging.getLogger(__name__)
+
+# key of the AuthorizedUser in the WSGI environ or ASGI scope
+USER_KEY = "picket.user"
+# route of paths that match none of the configured routes
+DEFAULT_ROUTE = "*"
+
+
+# bearer_token returns the access token from an Authorization header
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+# RouteMetrics counts middleware outcomes and access token validation latency per route
+# outcomes are hit (validate cache), miss, missing (no access token),
+# rejected (the Picket API rejected the access token) and error
+class RouteMetrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # route -> Histogram of validation latency
+        self.latency: Dict[str, Histogram] = {}
+        # (route, outcome) -> count
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, outcome: str, seconds: float):
+        histogram = self.latency.get(route)
+        if histogram is None:
+            with self._lock:
+                histogram = self.latency.setdefault(route, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+        key = (route, outcome)
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def cache_hit_ratio(self, route: str) -> Optional[float]:
+        hits = self.requests.get((route, "hit"), 0)
+        misses = self.requests.get((route, "miss"), 0)
+        if hits + misses == 0:
+            return None
+        return hits / (hits + misses)
+
+    def snapshot(self) -> dict:
+        snapshot = {}
+        for route, histogram in sorted(self.latency.items()):
+            snapshot[route] = {
+                "latency": histogram.snapshot(),
+                "outcomes": {
+                    outcome: count
+                    for (r, outcome), count in sorted(self.requests.items())
+                    if r == route
+                },
+                "cache_hit_ratio": self.cache_hit_ratio(route),
+            }
+        return snapshot
+
+    # prometheus renders the metrics in the Prometheus text exposition format
+    def prometheus(self, prefix: str = "picket_middleware") -> str:
+        lines = [
+            f"# HELP {prefix}_requests_total Authenticated requests by route and outcome",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for (route, outcome), count in sorted(self.requests.items()):
+            labels = f'route="{route}",outcome="{outcome}"'
+            lines.append(f"{prefix}_requests_total{{{labels}}} {count}")
+
+        lines += [
+            f"# HELP {prefix}_validate_duration_seconds Access token validation latency",
+            f"# TYPE {prefix}_validate_duration_seconds histogram",
+        ]
+        for route, histogram in sorted(self.latency.items()):
+            lines += _histogram_lines(
+                f"{prefix}_validate_duration_seconds", f'route="{route}"', histogram
+            )
+        return "\n".join(lines) + "\n"
+
+
+# _Router maps request paths to the requirements of the longest matching route prefix
+# routes with None requirements are public and are not authenticated
+class _Router:
+    def __init__(self, routes: Optional[Mapping[str, Optional[dict]]], requirements):
+        self.routes = sorted((routes or {}).items(), key=lambda r: len(r[0]))[::-1]
+        self.requirements = requirements
+
+    def match(self, path: str) -> Tuple[str, Optional[dict]]:
+        for prefix, requirements in self.routes:
+            if path.startswith(prefix):
+                return prefix, requirements
+        return DEFAULT_ROUTE, self.requirements
+
+
+# error_response returns the status, headers and JSON body for a failed authentication
+def error_response(error: Optional[Exception]) -> Tuple[int, list, bytes]:
+    if error is None:
+        status, msg, code = 401, "missing access token", "MISSING_ACCESS_TOKEN"
+    elif is_deterministic_failure(error):
+        status, msg, code = error.status_code, error.msg, error.code
+    else:
+        # the Picket API is unavailable or rate limiting this service
+        status, msg, code = 503, "access token validation unavailable", "UNAVAILABLE"
+
+    headers = [("Content-Type", "application/json")]
+    if status == 401:
+        headers.append(("WWW-Authenticate", "Bearer"))
+    body = json.dumps({"msg": msg, "code": code}).encode("utf-8")
+    return status, headers, body
+
+
+def _new_client(cls, picket, kwargs):
+    if isinstance(picket, cls):
+        return picket
+    # cache and coalesce validate() calls unless configured otherwise
+    kwargs.setdefault("validate_cache_ttl", 60)
+    kwargs.setdefault("coalesce_requests", True)
+    return cls(picket, **kwargs)
+
+
+# PicketWSGIMiddleware authenticates requests with the Bearer access token in the
+# Authorization header and sets environ["picket.user"] to the AuthorizedUser.
+# picket is a Picket client or an API key; clients created from an API key are passed
+# the other keyword arguments and cache and coalesce validate() calls by default.
+# routes maps path prefixes to their requirements, or to None for public routes;
+# other paths use requirements.
+class PicketWSGIMiddleware:
+    def __init__(
+        self,
+        app,
+        picket: Union[Picket, str],
+        routes: Optional[Mapping[str, Optional[dict]]] = None,
+        requirements: Optional[dict] = None,
+        metrics: Optional[RouteMetrics] = None,
+        **kwargs,
+    ):
+        self.app = app
+        self.picket = _new_client(Picket, picket, kwargs)
+        self.router = _Router(routes, requirements or {})
+        self.metrics = metrics or RouteMetrics()
+
+    # validate returns the user and whether it was a cache hit or miss
+    def validate(
+        self, access_token: str, requirements: dict
+    ) -> Tuple[AuthorizedUser, str]:
+        user = self.picket.cached_validation(access_token, requirements)
+        if user is not None:
+            self.picket.refresh_validation(access_token, requirements)
+            return user, "hit"
+        return self.picket.validate_uncached(access_token, requirements), "miss"
+
+    def __call__(self, environ, start_response):
+        route, requirements = self.router.match(environ.get("PATH_INFO", ""))
+        if requirements is None:
+            return self.app(environ, start_response)
+
+        start = time.perf_counter()
+        access_token = bearer_token(environ.get("HTTP_AUTHORIZATION"))
+        error = None
+        if access_token is None:
+            outcome = "missing"
+        else:
+            try:
+                user, outcome = self.validate(access_token, requirements)
+            except Exception as e:
+                error, outcome = e, "rejected"
+                if not is_deterministic_failure(e):
+                    logger.warning("Picket access token validation failed: %s", e)
+                    outcome = "error"
+        self.metrics.observe(route, outcome, time.perf_counter() - start)
+
+        if outcome not in ("hit", "miss"):
+            status, headers, body = error_response(error)
+            headers.append(("Content-Length", str(len(body))))
+            start_response(f"{status} {HTTPStatus(status).phrase}", headers)
+            return [body]
+
+        environ[USER_KEY] = user
+        return self.app(environ, start_response)
+
+
+# PicketASGIMiddleware is PicketWSGIMiddleware for ASGI applications
+# Access tokens are validated with an AsyncPicket, so the event loop is never blocked,
+# and scope["picket.user"] is set to the AuthorizedUser.
+# Unauthenticated websocket connections are closed before they are accepted.
+class PicketASGIMiddleware:
+    def __init__(
+        self,
+        app,
+        picket: Union[AsyncPicket, str],
+        routes: Optional[Mapping[str, Optional[dict]]] = None,
+        requirements: Optional[dict] = None,
+        metrics: Optional[RouteMetrics] = None,
+        **kwargs,
+    ):
+        self.app = app
+        self.picket = _new_client(AsyncPicket, picket, kwargs)
+        self.router = _Router(routes, requirements or {})
+        self.metrics = metrics or RouteMetrics()
+
+    async def validate(
+        self, access_token: str, requirements: dict
+    ) -> Tuple[AuthorizedUser, str]:
+        user = self.picket.cached_validation(access_token, requirements)
+        if user is not None:
+            self.picket.refresh_validation(access_token, requirements)
+            return user, "hit"
+        return await self.picket.validate_uncached(access_token, requirements), "miss"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        route, requirements = self.router.match(scope.get("path", ""))
+        if requirements is None:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        authorization = None
+        for name, value in scope.get("headers", []):
+            if name.lower() == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+        access_token = bearer_token(authorization)
+        error = None
+        if access_token is None:
+            outcome = "missing"
+        else:
+            try:
+                user, outcome = await self.validate(access_token, requirements)
+            except Exception as e:
+                error, outcome = e, "rejected"
+                if not is_deterministic_failure(e):
+                    logger.warning("Picket access token validation failed: %s", e)
+                    outcome = "error"
+        self.metrics.observe(route, outcome, time.perf_counter() - start)
+
+        if outcome in ("hit", "miss"):
+            scope = dict(scope)
+            scope[USER_KEY] = user
+            return await self.app(scope, receive, send)
+
+        if scope["type"] == "websocket":
+            # policy violation
+            return await send({"type": "websocket.close", "code": 1008})
+
+        status, headers, body = error_response(error)
+        headers.append(("Content-Length", str(len(body))))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
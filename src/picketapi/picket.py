@@ -1,11 +1,38 @@
+import itertools
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
-import requests
-from requests.auth import HTTPBasicAuth
-from requests.exceptions import JSONDecodeError
-
-from .exceptions import PicketAPIException
-from .helpers import is_successful_status_code, snake_to_camel_keys
+from .circuit_breaker import CircuitBreaker
+from .exceptions import CircuitOpenError, DeadlineExceededError, PicketAPIException
+from .cache import TTLCache
+from .coalesce import SingleFlight
+from .concurrency import AdaptiveConcurrencyLimiter
+from .hedge import HedgePolicy
+from .helpers import (
+    canonical_hash,
+    endpoint_name,
+    is_successful_status_code,
+    snake_to_camel_keys,
+    parse_retry_after,
+    token_expiry,
+)
+from .metrics import Metrics, RequestEvent
+from .ratelimit import RateLimiter
+from .refresh import RefreshAhead
+from .requirements import RequirementEvaluator, contract_key, evaluate_token_balances
+from .retry import RetryPolicy
+from .transport import RequestsTransport, Transport, TransportResponse
+from .verify import AccessTokenVerifier
 from .types import (
     NonceResponse,
     AuthorizedUser,
@@ -13,16 +40,224 @@ from .types import (
     TokenOwnershipResponse,
 )
 
+logger = logging.getLogger(__name__)
+
 API_VERSION = "v1"
 API_BASE_URL = os.path.join("https://picketapi.com/api/", API_VERSION)
 
+# endpoints that are safe to retry
+# token ownership paths (chains/{chain}/wallets/{wallet}/tokenOwnership) are idempotent too
+IDEMPOTENT_PATHS = {"auth/nonce", "auth/validate"}
+
+# seconds a nonce is valid for after the Picket API creates it
+NONCE_VALIDITY = 120
+
+
+# 4xx status codes that are not deterministic, since the same request may succeed later
+TRANSIENT_CLIENT_ERRORS = {408, 429}
+
+
+# is_deterministic_failure returns whether the Picket API would reject the same request
+# again, e.g. for an expired or forged access token
+def is_deterministic_failure(error: Exception) -> bool:
+    return (
+        isinstance(error, PicketAPIException)
+        and error.status_code is not None
+        and 400 <= error.status_code < 500
+        and error.status_code not in TRANSIENT_CLIENT_ERRORS
+    )
+
+
+# is_overloaded returns whether a response status shows the Picket API is overloaded
+def is_overloaded(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+# cache keys are strings so they are the same in every process sharing a cache backend
+def validate_cache_key(access_token: str, requirements: dict) -> str:
+    return f"validate:{canonical_hash(requirements)}:{access_token}"
+
+
+# failures get their own keys, so one backend can hold both validate() caches
+def validate_failure_cache_key(access_token: str, requirements: dict) -> str:
+    return f"validateFailure:{canonical_hash(requirements)}:{access_token}"
+
+
+def token_ownership_cache_key(chain: str, wallet_address: str, payload: dict) -> str:
+    return f"tokenOwnership:{canonical_hash(payload)}:{chain}:{wallet_address}"
+
+
+def wallet_group(chain: str, wallet_address: str) -> str:
+    return f"wallet:{chain}:{wallet_address}"
+
+
+def nonce_cache_key(chain: str, wallet_address: str, locale: str) -> str:
+    return f"nonce:{chain}:{wallet_address}:{locale}"
 
-class Picket:
+
+# BasePicket holds the configuration and request/response handling shared by
+# the blocking and asyncio clients
+class BasePicket:
     def __init__(self, api_key: str, **kwargs):
         self.api_key = api_key
         # Base URL for API
         # Configurable for testing
         self.base_url = kwargs.get("base_url", API_BASE_URL)
+        # Connection pooling
+        # number of per-host connection pools to keep
+        self.pool_connections = kwargs.get("pool_connections", 10)
+        # maximum number of connections to keep per host
+        self.pool_maxsize = kwargs.get("pool_maxsize", 10)
+        # block instead of opening extra connections when the pool is exhausted
+        self.pool_block = kwargs.get("pool_block", False)
+        self.keep_alive = kwargs.get("keep_alive", True)
+        # close pooled connections after this many idle seconds (None to disable)
+        self.pool_idle_timeout = kwargs.get("pool_idle_timeout", 60)
+        # Local access token verification
+        # opt-in by providing a static verification key or a JWKS URL
+        self.verifier = kwargs.get("verifier", None)
+        if self.verifier is None and (
+            "verification_key" in kwargs or "jwks_url" in kwargs
+        ):
+            self.verifier = AccessTokenVerifier(
+                key=kwargs.get("verification_key", None),
+                jwks_url=kwargs.get("jwks_url", None),
+                algorithms=kwargs.get("token_algorithms", None),
+                refresh_interval=kwargs.get("key_refresh_interval", 300),
+            )
+        # validate() result cache
+        # opt-in by setting a TTL in seconds, or by passing a CacheBackend,
+        # e.g. an MmapCache or SQLiteCache shared by every worker process on the host
+        self.validate_cache = kwargs.get("validate_cache", None)
+        if (
+            self.validate_cache is None
+            and kwargs.get("validate_cache_ttl", None) is not None
+        ):
+            self.validate_cache = TTLCache(
+                maxsize=kwargs.get("validate_cache_size", 10000),
+                ttl=kwargs["validate_cache_ttl"],
+            )
+        # token ownership result cache, configured like the validate() cache
+        self.token_ownership_cache = kwargs.get("token_ownership_cache", None)
+        if (
+            self.token_ownership_cache is None
+            and kwargs.get("token_ownership_cache_ttl", None) is not None
+        ):
+            self.token_ownership_cache = TTLCache(
+                maxsize=kwargs.get("token_ownership_cache_size", 10000),
+                ttl=kwargs["token_ownership_cache_ttl"],
+            )
+        # nonce() cache (opt-in)
+        # nonces are cached for nonce_cache_fraction of their two minute validity,
+        # since the Picket API returns the wallet's existing nonce until it expires anyway
+        self.nonce_cache = kwargs.get("nonce_cache", None)
+        if (
+            self.nonce_cache is None
+            and kwargs.get("nonce_cache_fraction", None) is not None
+        ):
+            self.nonce_cache = TTLCache(
+                maxsize=kwargs.get("nonce_cache_size", 10000),
+                ttl=NONCE_VALIDITY * kwargs["nonce_cache_fraction"],
+            )
+        # validate() failure cache (opt-in)
+        # deterministic failures, e.g. for expired or forged access tokens, are cached for
+        # negative_cache_ttl seconds and raised again without calling the Picket API.
+        # negative_cache_codes limits caching to failures with those PicketAPIException codes
+        self.negative_cache = kwargs.get("negative_cache", None)
+        if (
+            self.negative_cache is None
+            and kwargs.get("negative_cache_ttl", None) is not None
+        ):
+            self.negative_cache = TTLCache(
+                maxsize=kwargs.get("negative_cache_size", 10000),
+                ttl=kwargs["negative_cache_ttl"],
+            )
+        self.negative_cache_codes = kwargs.get("negative_cache_codes", None)
+        # Local requirement evaluation (opt-in)
+        # answer token requirements from balances the Picket API returned in the last
+        # requirement_staleness seconds, and only ask the Picket API when that is undecidable
+        self.evaluator = kwargs.get("evaluator", None)
+        if (
+            self.evaluator is None
+            and kwargs.get("requirement_staleness", None) is not None
+        ):
+            self.evaluator = RequirementEvaluator(
+                max_staleness=kwargs["requirement_staleness"],
+                maxsize=kwargs.get("requirement_cache_size", 10000),
+            )
+        # Refresh-ahead (opt-in)
+        # validate() and token ownership cache entries that are read after refresh_ahead
+        # of their TTL has passed are renewed in the background, with at most
+        # refresh_concurrency renewals at once, while the cached value is served
+        self.refresher = kwargs.get("refresher", None)
+        if self.refresher is None and kwargs.get("refresh_ahead", None) is not None:
+            self.refresher = RefreshAhead(
+                fraction=kwargs["refresh_ahead"],
+                max_concurrency=kwargs.get("refresh_concurrency", 4),
+            )
+        # Local authz (opt-in, requires local validation)
+        # authz() returns the current access token without calling the Picket API when
+        # its verified claims already meet the requirements and it is valid for at least
+        # authz_min_lifetime more seconds
+        self.local_authz = kwargs.get("local_authz", False)
+        self.authz_min_lifetime = kwargs.get("authz_min_lifetime", 300)
+        self.authz_short_circuited = 0
+        self.authz_remote = 0
+        # share one in-flight request between concurrent identical calls
+        self.coalesce_requests = kwargs.get("coalesce_requests", False)
+        # Timeouts and retries
+        # (connect, read) timeout in seconds for each attempt
+        self.timeout = kwargs.get("timeout", (5, 30))
+        # overall time limit in seconds for a request, including retries
+        self.deadline = kwargs.get("deadline", None)
+        self.retry_policy = kwargs.get("retry_policy", RetryPolicy())
+        # Adaptive concurrency (opt-in)
+        # limit requests in flight to a limit that grows while the Picket API keeps up and
+        # shrinks on 429s, 5xx, timeouts and latency increases, up to max_concurrency_limit
+        self.concurrency_limiter = kwargs.get("concurrency_limiter", None)
+        if self.concurrency_limiter is None and kwargs.get(
+            "adaptive_concurrency", False
+        ):
+            max_limit = kwargs.get("max_concurrency_limit", 64)
+            if "pool_maxsize" in kwargs:
+                # requests past the pool size would open connections only to drop them
+                max_limit = min(max_limit, self.pool_maxsize)
+            self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+                initial_limit=self.pool_maxsize, max_limit=max_limit
+            )
+        # unless it is set, the pool grows with the limiter so requests reuse connections
+        if self.concurrency_limiter is not None and "pool_maxsize" not in kwargs:
+            self.pool_maxsize = max(
+                self.pool_maxsize, self.concurrency_limiter.max_limit
+            )
+        # Hedged requests (opt-in)
+        # send a second request to an idempotent endpoint when the first is slower than
+        # hedge_delay seconds, or than a percentile of observed latency with a HedgePolicy
+        self.hedge_policy = kwargs.get("hedge_policy", None)
+        if self.hedge_policy is None and kwargs.get("hedge_delay", None) is not None:
+            self.hedge_policy = HedgePolicy(
+                delay=kwargs["hedge_delay"],
+                max_rate=kwargs.get("hedge_max_rate", 0.05),
+            )
+        # fail fast while the Picket API is unhealthy (opt-in)
+        self.circuit_breaker = kwargs.get("circuit_breaker", None)
+        # Client-side rate limiting (opt-in)
+        # limiters created from rate_limit are shared by all clients using the same API key
+        self.rate_limiter = kwargs.get("rate_limiter", None)
+        if self.rate_limiter is None and "rate_limit" in kwargs:
+            self.rate_limiter = RateLimiter.shared(
+                api_key,
+                rate=kwargs["rate_limit"],
+                burst=kwargs.get("rate_limit_burst", None),
+                endpoint_rates=kwargs.get("endpoint_rate_limits", None),
+            )
+        # Instrumentation
+        # hooks are called with a RequestEvent after every Picket API call
+        self.hooks = list(kwargs.get("hooks", []))
+        self.metrics = None
+        if kwargs.get("collect_metrics", False):
+            self.metrics = Metrics()
+            self.hooks.append(self.metrics)
 
     def headers(self):
         return {
@@ -30,36 +265,677 @@ class Picket:
             "Content-Type": "application/json",
         }
 
-    def post_request(self, path: str, **kwargs):
-        url = os.path.join(self.base_url, path)
-        auth = HTTPBasicAuth(self.api_key, "")
-        headers = self.headers()
+    def url(self, path: str) -> str:
+        return os.path.join(self.base_url, path)
 
-        # transform keys to camelCase
-        req = requests.post(
-            url, auth=auth, headers=headers, json=snake_to_camel_keys(kwargs)
-        )
+    def handle_response(self, status_code: int, text: str):
         try:
-            data = req.json()
-        except JSONDecodeError:
-            raise Exception(req.text)
+            data = json.loads(text)
+        except ValueError:
+            raise Exception(text)
 
-        if not is_successful_status_code(req.status_code):
+        if not is_successful_status_code(status_code):
             if "msg" not in data:
                 raise Exception(data)
             # msg is required, code is optional
-            raise PicketAPIException(data["msg"], data.get("code", None))
+            raise PicketAPIException(data["msg"], data.get("code", None), status_code)
 
         return data
 
+    def add_hook(self, hook: Callable[[RequestEvent], None]):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[RequestEvent], None]):
+        self.hooks.remove(hook)
+
+    # finish_event records the outcome of a call and reports it to the hooks
+    def finish_event(
+        self, event: RequestEvent, start: float, error: Optional[BaseException]
+    ):
+        event.total = time.perf_counter() - start
+        if error is not None:
+            event.error = error
+            if isinstance(error, PicketAPIException):
+                event.status_code = error.status_code
+                event.error_code = error.code
+
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Picket request hook failed")
+
+    def build_response(self, event: RequestEvent, data, build):
+        if build is None:
+            return data
+        start = time.perf_counter()
+        resp = build(data)
+        event.build = time.perf_counter() - start
+        return resp
+
+    def is_idempotent(self, path: str) -> bool:
+        return path in IDEMPOTENT_PATHS or path.endswith("/tokenOwnership")
+
+    def check_circuit(self):
+        if self.circuit_breaker is None:
+            return
+        retry_after = self.circuit_breaker.retry_after()
+        if retry_after > 0:
+            raise CircuitOpenError(retry_after)
+
+    def record_outcome(self, failed: bool):
+        if self.circuit_breaker is None:
+            return
+        if failed:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def deadline_at(self, deadline: Optional[float]) -> Optional[float]:
+        deadline = self.deadline if deadline is None else deadline
+        if deadline is None:
+            return None
+        return time.monotonic() + deadline
+
+    # remaining returns the seconds left before the deadline, or None if there is no deadline
+    def remaining(self, deadline_at: Optional[float]) -> Optional[float]:
+        if deadline_at is None:
+            return None
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError("Picket API request deadline exceeded")
+        return remaining
+
+    # attempt_timeout clips the timeout of one attempt to the time left before the deadline
+    def attempt_timeout(self, timeout, deadline_at: Optional[float]):
+        timeout = self.timeout if timeout is None else timeout
+        remaining = self.remaining(deadline_at)
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+    # retry_delay returns the backoff before retrying a failed attempt
+    # or None if the request should not be retried
+    def retry_delay(
+        self,
+        path: str,
+        attempt: int,
+        deadline_at: Optional[float],
+        retry_after: Optional[float] = None,
+    ) -> Optional[float]:
+        if not self.is_idempotent(path) or attempt >= self.retry_policy.max_retries:
+            return None
+
+        delay = self.retry_policy.backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+    # response_retry_delay records the outcome of an attempt that got a response
+    # and returns the delay before retrying it, or None if the response is final
+    def response_retry_delay(
+        self,
+        path: str,
+        attempt: int,
+        deadline_at: Optional[float],
+        status_code: int,
+        headers,
+    ) -> Optional[float]:
+        retry_after = None
+        if status_code == 429:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if self.rate_limiter is not None:
+                self.rate_limiter.rate_limited(path, retry_after)
+
+        # only server errors count against the circuit breaker
+        self.record_outcome(failed=status_code >= 500)
+        if not self.retry_policy.should_retry_status(status_code):
+            return None
+        return self.retry_delay(path, attempt, deadline_at, retry_after)
+
+    # default_concurrency is the number of parallel calls made by the bulk methods
+    # with a concurrency limiter, it decides how many of them are in flight at once
+    def default_concurrency(self) -> int:
+        if self.concurrency_limiter is not None:
+            return self.concurrency_limiter.max_limit
+        return self.pool_maxsize
+
+    # release_slot ends a request started at started with the concurrency limiter
+    def release_slot(self, started: float, overloaded: bool):
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release(time.perf_counter() - started, overloaded)
+
+    # validate_locally returns the AuthorizedUser for a locally verified access token
+    # or None if the token must be validated by the Picket API
+    def validate_locally(
+        self, access_token: str, requirements: dict
+    ) -> Optional[AuthorizedUser]:
+        # requirements are evaluated server-side
+        if self.verifier is None or requirements:
+            return None
+
+        claims = self.verifier.verify(access_token)
+        if claims is None:
+            return None
+
+        try:
+            return AuthorizedUser.from_dict(claims)
+        except KeyError:
+            return None
+
+    # authz_locally returns an AuthResponse reusing the access token when its claims
+    # already meet the requirements, or None if the Picket API has to be asked
+    def authz_locally(
+        self, access_token: str, requirements: dict
+    ) -> Optional[AuthResponse]:
+        if not self.local_authz or self.verifier is None:
+            return None
+
+        exp = token_expiry(access_token)
+        if exp is None or exp - time.time() < self.authz_min_lifetime:
+            return None
+
+        user = self.validate_locally(access_token, {})
+        if user is None:
+            return None
+        if requirements and not evaluate_token_balances(
+            user.token_balances, requirements
+        ):
+            return None
+        return AuthResponse(access_token, user)
+
+    def authz_stats(self) -> dict:
+        return {
+            "short_circuited": self.authz_short_circuited,
+            "remote": self.authz_remote,
+        }
+
+    def cached_nonce(
+        self, chain: str, wallet_address: str, locale: str
+    ) -> Optional[NonceResponse]:
+        if self.nonce_cache is None:
+            return None
+        return self.nonce_cache.get(nonce_cache_key(chain, wallet_address, locale))
+
+    def cache_nonce(
+        self, chain: str, wallet_address: str, locale: str, resp: NonceResponse
+    ):
+        if self.nonce_cache is not None:
+            self.nonce_cache.set(
+                nonce_cache_key(chain, wallet_address, locale),
+                resp,
+                group=wallet_group(chain, wallet_address),
+            )
+
+    # invalidate_nonce drops the cached nonces of a wallet, e.g. once it has been used
+    def invalidate_nonce(self, chain: str, wallet_address: str):
+        if self.nonce_cache is not None:
+            self.nonce_cache.invalidate(wallet_group(chain, wallet_address))
+
+    # evaluate_locally returns the user for an access token when the wallet's
+    # recent token balances show that it meets the requirements
+    # Like the Picket API's, the user's token balances include the required contract's.
+    def evaluate_locally(
+        self, access_token: str, requirements: dict
+    ) -> Optional[AuthorizedUser]:
+        if self.evaluator is None or not requirements:
+            return None
+
+        user = self.evaluator.user(access_token)
+        if user is None:
+            user = self.validate_locally(access_token, {})
+        if user is None:
+            return None
+
+        # the API's error for unmet requirements is left to the API,
+        # so only requirements that are met are answered locally
+        requirements = snake_to_camel_keys(requirements)
+        if not self.evaluator.evaluate(user.chain, user.wallet_address, requirements):
+            return None
+
+        contract = requirements.get("contractAddress", requirements.get("collection"))
+        balance = self.evaluator.balance(user.chain, user.wallet_address, contract)
+        if balance is None:
+            # expired since it was evaluated
+            return None
+        token_balances = {
+            c: tokens
+            for c, tokens in user.token_balances.items()
+            if contract_key(c) != contract_key(contract)
+        }
+        token_balances[contract] = balance.balances
+        return AuthorizedUser(
+            user.chain, user.wallet_address, user.display_address, token_balances
+        )
+
+    def observe_user(self, access_token: str, user: AuthorizedUser):
+        if self.evaluator is not None:
+            self.evaluator.observe_user(access_token, user)
+
+    def observe_auth(self, resp: AuthResponse):
+        self.observe_user(resp.access_token, resp.user)
+
+    # token_ownership_locally answers a token ownership check from recent balances
+    def token_ownership_locally(
+        self, chain: str, wallet_address: str, payload: dict
+    ) -> Optional[TokenOwnershipResponse]:
+        if self.evaluator is None or payload.keys() != {"requirements"}:
+            return None
+
+        requirements = snake_to_camel_keys(payload["requirements"])
+        allowed = self.evaluator.evaluate(chain, wallet_address, requirements)
+        if allowed is None:
+            return None
+
+        contract = requirements.get("contractAddress", requirements.get("collection"))
+        balance = self.evaluator.balance(chain, wallet_address, contract)
+        if balance is None:
+            # expired since it was evaluated
+            return None
+        return TokenOwnershipResponse(allowed, {contract: balance.balances})
+
+    def observe_token_ownership(
+        self, chain: str, wallet_address: str, resp: TokenOwnershipResponse
+    ):
+        if self.evaluator is not None:
+            self.evaluator.observe(chain, wallet_address, resp.token_balances)
+
+    def cached_validation(
+        self, access_token: str, requirements: dict
+    ) -> Optional[AuthorizedUser]:
+        if self.validate_cache is None:
+            return None
+        user = self.validate_cache.get(validate_cache_key(access_token, requirements))
+        # never mistake anything else in a shared backend for a user
+        if not isinstance(user, AuthorizedUser):
+            return None
+        return user
+
+    def cache_validation(
+        self, access_token: str, requirements: dict, user: AuthorizedUser
+    ):
+        if self.validate_cache is None:
+            return
+
+        # never cache past the token's own expiry
+        ttl = None
+        exp = token_expiry(access_token)
+        if exp is not None:
+            ttl = exp - time.time()
+
+        key = validate_cache_key(access_token, requirements)
+        self.validate_cache.set(key, user, ttl=ttl, group=access_token)
+        self.cached_for_refresh(self.validate_cache, key, ttl)
+
+    # invalidate drops all cached validate() results and failures for the access token,
+    # and the user recorded for evaluating requirements locally
+    def invalidate(self, access_token: str):
+        if self.validate_cache is not None:
+            self.validate_cache.invalidate(access_token)
+        if self.negative_cache is not None:
+            self.negative_cache.invalidate(access_token)
+        if self.evaluator is not None:
+            self.evaluator.forget_user(access_token)
+
+    # cached_validation_failure returns the error to raise again for a recent failure
+    def cached_validation_failure(
+        self, access_token: str, requirements: dict
+    ) -> Optional[PicketAPIException]:
+        if self.negative_cache is None:
+            return None
+        failure = self.negative_cache.get(
+            validate_failure_cache_key(access_token, requirements)
+        )
+        if not isinstance(failure, dict):
+            return None
+        return PicketAPIException(
+            failure["msg"], failure["code"], failure["statusCode"]
+        )
+
+    def cache_validation_failure(
+        self, access_token: str, requirements: dict, error: Exception
+    ):
+        if self.negative_cache is None or not is_deterministic_failure(error):
+            return
+        if (
+            self.negative_cache_codes is not None
+            and error.code not in self.negative_cache_codes
+        ):
+            return
+        # stored as plain data so it can be shared through any cache backend
+        failure = {
+            "msg": error.msg,
+            "code": error.code,
+            "statusCode": error.status_code,
+        }
+        self.negative_cache.set(
+            validate_failure_cache_key(access_token, requirements),
+            failure,
+            group=access_token,
+        )
+
+    def forget_validation_failure(self, access_token: str, requirements: dict):
+        if self.negative_cache is not None:
+            self.negative_cache.delete(
+                validate_failure_cache_key(access_token, requirements)
+            )
+
+    def cached_token_ownership(
+        self, chain: str, wallet_address: str, payload: dict
+    ) -> Optional[TokenOwnershipResponse]:
+        if self.token_ownership_cache is None:
+            return None
+        return self.token_ownership_cache.get(
+            token_ownership_cache_key(chain, wallet_address, payload)
+        )
+
+    def cache_token_ownership(
+        self,
+        chain: str,
+        wallet_address: str,
+        payload: dict,
+        resp: TokenOwnershipResponse,
+    ):
+        if self.token_ownership_cache is None:
+            return
+        key = token_ownership_cache_key(chain, wallet_address, payload)
+        self.token_ownership_cache.set(
+            key, resp, group=wallet_group(chain, wallet_address)
+        )
+        self.cached_for_refresh(self.token_ownership_cache, key, None)
+
+    # invalidate_token_ownership drops all cached token ownership results for the wallet
+    def invalidate_token_ownership(self, chain: str, wallet_address: str):
+        if self.token_ownership_cache is not None:
+            self.token_ownership_cache.invalidate(wallet_group(chain, wallet_address))
+
+    # cached_for_refresh tells the refresher when a cache entry expires
+    def cached_for_refresh(self, cache, key: str, ttl: Optional[float]):
+        if self.refresher is None:
+            return
+        if cache.ttl is not None:
+            ttl = cache.ttl if ttl is None else min(ttl, cache.ttl)
+        # entries that never expire need no refresh
+        if ttl is not None:
+            self.refresher.stored(key, ttl)
+
+    # refresh_failed handles an error renewing a cache entry in the background
+    # entries are dropped when the Picket API rejects the request, e.g. because the
+    # access token was revoked, and kept until they expire on transient errors
+    def refresh_failed(self, cache, key: str, error: Exception):
+        if is_deterministic_failure(error):
+            cache.delete(key)
+
+
+class Picket(BasePicket):
+    def __init__(self, api_key: str, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.single_flight = SingleFlight() if self.coalesce_requests else None
+        # concurrent nonce() calls for a wallet share one request to fill the cache
+        self.nonce_flight = SingleFlight() if self.nonce_cache is not None else None
+        # transport used to send requests, e.g. HTTP2Transport or FakeTransport
+        # defaults to pooled requests sessions configured by the pool_* options
+        self.transport: Transport = kwargs.get("transport", None)
+        if self.transport is None:
+            self.transport = RequestsTransport(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                pool_block=self.pool_block,
+                keep_alive=self.keep_alive,
+                pool_idle_timeout=self.pool_idle_timeout,
+            )
+        # hedged requests are sent from a thread pool so the first response can be
+        # returned while the other is still in flight
+        # requests never queue for a worker: when all are busy they are not hedged
+        self.hedge_max_workers = kwargs.get("hedge_max_workers", 64)
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+        self._hedge_workers_busy = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.refresher is not None:
+            self.refresher.close()
+        with self._hedge_executor_lock:
+            executor, self._hedge_executor = self._hedge_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        self.transport.close()
+
+    def post_request(self, path: str, **kwargs):
+        return self.request(path, kwargs)
+
+    # request sends payload to path and returns build(data), or data if build is None
+    # timeout and deadline override the client's defaults for this call
+    def request(
+        self,
+        path: str,
+        payload: dict,
+        build: Optional[Callable] = None,
+        timeout=None,
+        deadline=None,
+    ):
+        if self.single_flight is not None:
+            # share identical in-flight requests between threads
+            # build is part of the key, so every caller gets the result type it asked for
+            key = (path, canonical_hash(payload), build)
+            return self.single_flight.do(
+                key, lambda: self._request(path, payload, build, timeout, deadline)
+            )
+        return self._request(path, payload, build, timeout, deadline)
+
+    def _request(self, path: str, payload: dict, build, timeout, deadline):
+        event = RequestEvent(endpoint_name(path))
+        start = time.perf_counter()
+        error = None
+        try:
+            data = self._post(path, payload, timeout, deadline, event)
+            return self.build_response(event, data, build)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish_event(event, start, error)
+
+    def _post(
+        self,
+        path: str,
+        payload: dict,
+        timeout,
+        deadline,
+        event: RequestEvent,
+    ):
+        url = self.url(path)
+        auth = (self.api_key, "")
+        headers = self.headers()
+        # transform keys to camelCase
+        start = time.perf_counter()
+        body = snake_to_camel_keys(payload)
+        event.transform = time.perf_counter() - start
+        deadline_at = self.deadline_at(deadline)
+
+        attempt = 0
+        while True:
+            self.check_circuit()
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(
+                path, self.remaining(deadline_at)
+            ):
+                raise DeadlineExceededError(
+                    "Picket API rate limit wait exceeds deadline"
+                )
+            if (
+                self.concurrency_limiter is not None
+                and not self.concurrency_limiter.acquire(self.remaining(deadline_at))
+            ):
+                raise DeadlineExceededError(
+                    "Picket API concurrency limit wait exceeds deadline"
+                )
+
+            event.reset_timings()
+            event.attempts += 1
+            started = time.perf_counter()
+            try:
+                resp = self.send(
+                    path,
+                    url,
+                    headers,
+                    auth,
+                    body,
+                    self.attempt_timeout(timeout, deadline_at),
+                    event,
+                )
+                event.status_code = resp.status_code
+            except self.transport.retryable_errors:
+                self.release_slot(started, overloaded=True)
+                self.record_outcome(failed=True)
+                delay = self.retry_delay(path, attempt, deadline_at)
+                if delay is None:
+                    raise
+            except BaseException:
+                # failed before a response, not a signal of overload
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release()
+                raise
+            else:
+                self.release_slot(started, is_overloaded(resp.status_code))
+                delay = self.response_retry_delay(
+                    path, attempt, deadline_at, resp.status_code, resp.headers
+                )
+                if delay is None:
+                    start = time.perf_counter()
+                    try:
+                        return self.handle_response(resp.status_code, resp.text)
+                    finally:
+                        event.json_decode = time.perf_counter() - start
+
+            time.sleep(delay)
+            attempt += 1
+
+    # send sends one attempt, hedged for idempotent endpoints with a hedge policy
+    def send(
+        self, path: str, url: str, headers, auth, body, timeout, event: RequestEvent
+    ) -> TransportResponse:
+        policy = self.hedge_policy
+        if policy is None or not self.is_idempotent(path):
+            return self.transport.send(url, headers, auth, body, timeout, event)
+
+        policy.started()
+        delay = policy.hedge_delay(event.endpoint)
+        if delay is None or not self._reserve_hedge_worker():
+            start = time.perf_counter()
+            resp = self.transport.send(url, headers, auth, body, timeout, event)
+            policy.observe(event.endpoint, time.perf_counter() - start)
+            return resp
+
+        # each request records its timings on its own event, the winner's are kept
+        primary_event = RequestEvent(event.endpoint)
+        started = threading.Event()
+        primary = self._submit_hedgeable(
+            started, url, headers, auth, body, timeout, primary_event
+        )
+        # the delay starts once the request is sent, not when it was submitted
+        started.wait()
+        start = time.perf_counter()
+        # future -> event
+        attempts = {primary: primary_event}
+        done, _ = wait(attempts, timeout=delay)
+        if not done and self._reserve_hedge_worker():
+            if policy.allow():
+                hedge_event = RequestEvent(event.endpoint)
+                hedge = self._submit_hedgeable(
+                    threading.Event(), url, headers, auth, body, timeout, hedge_event
+                )
+                attempts[hedge] = hedge_event
+                event.hedged = True
+            else:
+                self._release_hedge_worker()
+
+        pending = set(attempts)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # a failed request loses unless the other one failed too
+            for future in sorted(done, key=lambda f: f.exception() is not None):
+                if future.exception() is not None and pending:
+                    continue
+                # the loser cannot be interrupted once it was sent, so its response
+                # is discarded when it arrives
+                event.copy_timings(attempts[future])
+                if future is not primary:
+                    policy.won()
+                resp = future.result()
+                policy.observe(event.endpoint, time.perf_counter() - start)
+                return resp
+
+    def _reserve_hedge_worker(self) -> bool:
+        with self._hedge_executor_lock:
+            if self._hedge_workers_busy >= self.hedge_max_workers:
+                return False
+            self._hedge_workers_busy += 1
+            return True
+
+    def _release_hedge_worker(self):
+        with self._hedge_executor_lock:
+            self._hedge_workers_busy -= 1
+
+    # _submit_hedgeable sends a request from a worker reserved by _reserve_hedge_worker
+    # and sets started when it is sent
+    def _submit_hedgeable(self, started: threading.Event, *args) -> Future:
+        def send():
+            started.set()
+            try:
+                return self.transport.send(*args)
+            finally:
+                self._release_hedge_worker()
+
+        with self._hedge_executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.hedge_max_workers,
+                    thread_name_prefix="picket-hedge",
+                )
+            executor = self._hedge_executor
+        return executor.submit(send)
+
     # nonce
     def nonce(
-        self, chain: str, wallet_address: str, locale: str = "en-US"
+        self,
+        chain: str,
+        wallet_address: str,
+        locale: str = "en-US",
+        timeout=None,
+        deadline: Optional[float] = None,
     ) -> NonceResponse:
-        data = self.post_request(
-            "auth/nonce", chain=chain, wallet_address=wallet_address, locale=locale
+        resp = self.cached_nonce(chain, wallet_address, locale)
+        if resp is not None:
+            return resp
+
+        def fetch():
+            resp = self.request(
+                "auth/nonce",
+                dict(chain=chain, wallet_address=wallet_address, locale=locale),
+                NonceResponse.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+            self.cache_nonce(chain, wallet_address, locale, resp)
+            return resp
+
+        if self.nonce_flight is None:
+            return fetch()
+        return self.nonce_flight.do(
+            nonce_cache_key(chain, wallet_address, locale), fetch
         )
-        return NonceResponse.from_dict(data)
 
     def auth(
         self,
@@ -68,39 +944,305 @@ class Picket:
         signature: str,
         requirements: dict = {},
         context: dict = {},
+        timeout=None,
+        deadline: Optional[float] = None,
     ) -> AuthResponse:
-        data = self.post_request(
-            "auth",
-            chain=chain,
-            wallet_address=wallet_address,
-            signature=signature,
-            requirements=requirements,
-            context=context,
-        )
-        return AuthResponse.from_dict(data)
+        try:
+            resp = self.request(
+                "auth",
+                dict(
+                    chain=chain,
+                    wallet_address=wallet_address,
+                    signature=signature,
+                    requirements=requirements,
+                    context=context,
+                ),
+                AuthResponse.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+        except Exception as e:
+            # a rejected signature may be for a stale or used nonce, so fetch a new one
+            if is_deterministic_failure(e):
+                self.invalidate_nonce(chain, wallet_address)
+            raise
+        # the nonce has been used
+        self.invalidate_nonce(chain, wallet_address)
+        self.observe_auth(resp)
+        return resp
 
     def authz(
-        self, access_token: str, requirements: dict, revalidate: bool = False
+        self,
+        access_token: str,
+        requirements: dict,
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
     ) -> AuthResponse:
-        data = self.post_request(
+        # revalidate always asks the Picket API
+        if not revalidate:
+            resp = self.authz_locally(access_token, requirements)
+            if resp is not None:
+                self.authz_short_circuited += 1
+                return resp
+
+        self.authz_remote += 1
+        resp = self.request(
             "authz",
-            access_token=access_token,
-            requirements=requirements,
-            revalidate=revalidate,
+            dict(
+                access_token=access_token,
+                requirements=requirements,
+                revalidate=revalidate,
+            ),
+            AuthResponse.from_dict,
+            timeout=timeout,
+            deadline=deadline,
         )
-        return AuthResponse.from_dict(data)
+        self.observe_auth(resp)
+        return resp
 
-    def validate(self, access_token: str, requirements: dict = {}) -> AuthorizedUser:
-        data = self.post_request(
-            "auth/validate", access_token=access_token, requirements=requirements
+    def validate(
+        self,
+        access_token: str,
+        requirements: dict = {},
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthorizedUser:
+        # revalidate always asks the Picket API
+        if not revalidate:
+            user = self.cached_validation(access_token, requirements)
+            if user is not None:
+                self.refresh_validation(access_token, requirements)
+                return user
+        return self.validate_uncached(
+            access_token, requirements, revalidate, timeout, deadline
         )
-        return AuthorizedUser.from_dict(data)
+
+    # validate_uncached is validate() without the validate cache lookup,
+    # for callers that have already missed the cache
+    def validate_uncached(
+        self,
+        access_token: str,
+        requirements: dict = {},
+        revalidate: bool = False,
+        timeout=None,
+        deadline: Optional[float] = None,
+    ) -> AuthorizedUser:
+        if not revalidate:
+            error = self.cached_validation_failure(access_token, requirements)
+            if error is not None:
+                raise error
+
+            user = self.validate_locally(access_token, requirements)
+            if user is not None:
+                return user
+
+            user = self.evaluate_locally(access_token, requirements)
+            if user is not None:
+                return user
+
+        try:
+            user = self.request(
+                "auth/validate",
+                dict(access_token=access_token, requirements=requirements),
+                AuthorizedUser.from_dict,
+                timeout=timeout,
+                deadline=deadline,
+            )
+        except PicketAPIException as e:
+            self.cache_validation_failure(access_token, requirements, e)
+            raise
+        if revalidate:
+            self.forget_validation_failure(access_token, requirements)
+        self.cache_validation(access_token, requirements, user)
+        self.observe_user(access_token, user)
+        return user
+
+    # refresh_validation renews a cached validate() result in the background
+    # once it is due for a refresh
+    def refresh_validation(self, access_token: str, requirements: dict):
+        if self.refresher is None:
+            return
+        key = validate_cache_key(access_token, requirements)
+
+        def refresh():
+            try:
+                self.validate(access_token, requirements, revalidate=True)
+            except Exception as e:
+                self.refresh_failed(self.validate_cache, key, e)
+                raise
+
+        self.refresher.refresh(key, refresh)
+
+    # validate_stream validates the access tokens from an iterable, with at most concurrency
+    # requests in flight, and yields (access_token, result) pairs as they complete.
+    # result is the AuthorizedUser or the exception raised for that token.
+    # Tokens are read lazily and no new requests are sent while the consumer is busy,
+    # so memory use does not grow with the number of tokens.
+    def validate_stream(
+        self,
+        access_tokens: Iterable[str],
+        requirements: dict = {},
+        concurrency: Optional[int] = None,
+        revalidate: bool = False,
+    ) -> Iterator[Tuple[str, Union[AuthorizedUser, Exception]]]:
+        concurrency = concurrency or self.default_concurrency()
+        access_tokens = iter(access_tokens)
+        # future -> access token
+        in_flight = {}
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            while True:
+                for access_token in itertools.islice(
+                    access_tokens, concurrency - len(in_flight)
+                ):
+                    future = executor.submit(
+                        self.validate, access_token, requirements, revalidate
+                    )
+                    in_flight[future] = access_token
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    access_token = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    yield access_token, result
+        finally:
+            # the consumer stopped early
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
 
     def token_ownesrhip(
-        self, chain: str, wallet_address: str, **kwargs
+        self,
+        chain: str,
+        wallet_address: str,
+        timeout=None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> TokenOwnershipResponse:
+        resp = self.cached_token_ownership(chain, wallet_address, kwargs)
+        if resp is not None:
+            self.refresh_token_ownership(chain, wallet_address, kwargs)
+            return resp
+
+        resp = self.token_ownership_locally(chain, wallet_address, kwargs)
+        if resp is not None:
+            return resp
+
+        return self.fetch_token_ownership(
+            chain, wallet_address, kwargs, timeout, deadline
+        )
+
+    # fetch_token_ownership asks the Picket API and caches the result
+    def fetch_token_ownership(
+        self,
+        chain: str,
+        wallet_address: str,
+        payload: dict,
+        timeout=None,
+        deadline: Optional[float] = None,
     ) -> TokenOwnershipResponse:
         path = os.path.join(
             "chains", chain, "wallets", wallet_address, "tokenOwnership"
         )
-        data = self.post_request(path, **kwargs)
-        return TokenOwnershipResponse.from_dict(data)
+        resp = self.request(
+            path,
+            payload,
+            TokenOwnershipResponse.from_dict,
+            timeout=timeout,
+            deadline=deadline,
+        )
+        self.cache_token_ownership(chain, wallet_address, payload, resp)
+        self.observe_token_ownership(chain, wallet_address, resp)
+        return resp
+
+    # refresh_token_ownership renews a cached token ownership result in the background
+    # once it is due for a refresh
+    def refresh_token_ownership(self, chain: str, wallet_address: str, payload: dict):
+        if self.refresher is None:
+            return
+        key = token_ownership_cache_key(chain, wallet_address, payload)
+
+        def refresh():
+            try:
+                self.fetch_token_ownership(chain, wallet_address, payload)
+            except Exception as e:
+                self.refresh_failed(self.token_ownership_cache, key, e)
+                raise
+
+        self.refresher.refresh(key, refresh)
+
+    # token_ownership_as_completed checks token ownership for many (chain, wallet_address, requirements)
+    # items in parallel and yields (index, result) pairs as they complete.
+    # index is the item's position in items. result is the TokenOwnershipResponse
+    # or the exception raised for that item. Identical items are only requested once.
+    def token_ownership_as_completed(
+        self,
+        items: Iterable[Tuple[str, str, dict]],
+        max_workers: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Union[TokenOwnershipResponse, Exception]]]:
+        max_workers = max_workers or self.default_concurrency()
+        items = enumerate(items)
+        # future -> item key
+        in_flight = {}
+        # item key -> indexes of the identical items waiting for it
+        waiting = {}
+        # item key -> result, so identical items are only requested once
+        results = {}
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while True:
+                # items are read lazily, up to max_workers requests at a time
+                for idx, (chain, wallet_address, requirements) in items:
+                    key = (chain, wallet_address, canonical_hash(requirements))
+                    if key in results:
+                        yield idx, results[key]
+                    elif key in waiting:
+                        waiting[key].append(idx)
+                    else:
+                        waiting[key] = [idx]
+                        future = executor.submit(
+                            self.token_ownesrhip,
+                            chain,
+                            wallet_address,
+                            requirements=requirements,
+                        )
+                        in_flight[future] = key
+                        if len(in_flight) >= max_workers:
+                            break
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    results[key] = result
+                    for idx in waiting.pop(key):
+                        yield idx, result
+        finally:
+            # the consumer stopped early
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    # token_ownership_many is token_ownership_as_completed with results in input order
+    def token_ownership_many(
+        self,
+        items: Iterable[Tuple[str, str, dict]],
+        max_workers: Optional[int] = None,
+    ) -> List[Union[TokenOwnershipResponse, Exception]]:
+        items = list(items)
+        results = [None] * len(items)
+        for idx, result in self.token_ownership_as_completed(items, max_workers):
+            results[idx] = result
+        return results
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from .helpers import endpoint_name
+
+__all__ = ["TokenBucket", "RateLimiter"]
+
+
+# TokenBucket allows rate requests per second with bursts of up to burst requests.
+# When the server rate limits us, throttle() halves the rate and pause() stops
+# all requests for a while; the rate then recovers linearly over recovery_period seconds.
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        recovery_period: float = 30.0,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.recovery_period = recovery_period
+
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    # reserve takes a token and returns 0,
+    # or returns the seconds to wait before a token is available
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    # acquire blocks until a token is available
+    # it returns False without taking a token if that would take longer than timeout
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def throttle(self, factor: float = 0.5):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    # callers must hold the lock
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rate < self.max_rate:
+            recovered = self.max_rate * elapsed / self.recovery_period
+            self.rate = min(self.max_rate, self.rate + recovered)
+        # no tokens accumulate while paused
+        refilling = now - max(now - elapsed, self._paused_until)
+        if refilling > 0:
+            self.tokens = min(self.capacity, self.tokens + refilling * self.rate)
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+# RateLimiter combines a global bucket with optional per-endpoint buckets.
+# Endpoints are named after their path, e.g. "auth/validate" or "tokenOwnership".
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        endpoint_rates: Optional[Dict[str, float]] = None,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.endpoint_buckets = {
+            endpoint: TokenBucket(endpoint_rate)
+            for endpoint, endpoint_rate in (endpoint_rates or {}).items()
+        }
+
+    # shared returns the limiter for an API key, creating it on first use,
+    # so every Picket client in the process using that key shares its limits.
+    # Asking for the same key with a different configuration raises ValueError
+    # instead of silently keeping the first client's limits.
+    @classmethod
+    def shared(
+        cls,
+        api_key: str,
+        rate: float,
+        burst: Optional[float] = None,
+        endpoint_rates: Optional[Dict[str, float]] = None,
+    ) -> "RateLimiter":
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        config = (rate, burst, dict(endpoint_rates or {}))
+        with _shared_limiters_lock:
+            shared = _shared_limiters.get(key)
+            if shared is None:
+                limiter = cls(rate, burst, endpoint_rates)
+                _shared_limiters[key] = (limiter, config)
+                return limiter
+            limiter, existing = shared
+            if config != existing:
+                rate, burst, endpoint_rates = existing
+                raise ValueError(
+                    f"a shared rate limiter with rate={rate}, burst={burst}, "
+                    f"endpoint_rates={endpoint_rates} already exists for this API key"
+                )
+            return limiter
+
+    def buckets(self, path: str):
+        bucket = self.endpoint_buckets.get(endpoint_name(path))
+        if bucket is None:
+            return [self.bucket]
+        return [bucket, self.bucket]
+
+    def acquire(self, path: str, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for bucket in self.buckets(path):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if not bucket.acquire(remaining):
+                return False
+        return True
+
+    async def acquire_async(self, path: str, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for bucket in self.buckets(path):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if not await bucket.acquire_async(remaining):
+                return False
+        return True
+
+    # rate_limited slows down after the server responded with 429
+    def rate_limited(self, path: str, retry_after: Optional[float] = None):
+        for bucket in self.buckets(path):
+            bucket.throttle()
+            bucket.pause(retry_after if retry_after is not None else 1 / bucket.rate)
+
+    def stats(self) -> dict:
+        stats = {"global": self.bucket.rate}
+        for endpoint, bucket in self.endpoint_buckets.items():
+            stats[endpoint] = bucket.rate
+        return stats
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .helpers import canonical_hash
+from .transport import Transport, TransportResponse
+
+__all__ = [
+    "Recording",
+    "RecordingTransport",
+    "ReplayTransport",
+    "read_recordings",
+    "replay_requests",
+    "client_sender",
+    "redact_credentials",
+]
+
+# request and response fields that are credentials
+CREDENTIAL_FIELDS = frozenset({"accessToken", "signature"})
+_REDACTED_PREFIX = "sha256:"
+
+
+# redact_credentials replaces credentials in a request or response body with their
+# SHA-256 hash. Hashing keeps identical requests identical, so replays still match them,
+# and values that are already hashed are kept as is.
+def redact_credentials(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: _hash_credential(v) if k in CREDENTIAL_FIELDS else redact_credentials(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact_credentials(v) for v in value]
+    return value
+
+
+def _hash_credential(value: Any) -> Any:
+    if not isinstance(value, str) or value.startswith(_REDACTED_PREFIX):
+        return value
+    return _REDACTED_PREFIX + hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+# Recording is one recorded Picket API call
+# offset is the seconds since recording started, latency the seconds the call took
+class Recording:
+    __slots__ = ("offset", "path", "payload", "status_code", "response", "latency")
+
+    def __init__(
+        self,
+        offset: float,
+        path: str,
+        payload: Any,
+        status_code: int,
+        response: str,
+        latency: float,
+    ):
+        self.offset = offset
+        self.path = path
+        self.payload = payload
+        self.status_code = status_code
+        self.response = response
+        self.latency = latency
+
+    @classmethod
+    def from_dict(cls, d):
+        if "response" in d:
+            response = json.dumps(d["response"], separators=(",", ":"))
+        else:
+            response = d["text"]
+        return cls(d["t"], d["path"], d["payload"], d["status"], response, d["latency"])
+
+    def to_dict(self) -> dict:
+        d = {
+            "t": round(self.offset, 6),
+            "path": self.path,
+            "payload": self.payload,
+            "status": self.status_code,
+            "latency": round(self.latency, 6),
+        }
+        # JSON responses are embedded as is, which is shorter than an escaped string
+        try:
+            d["response"] = json.loads(self.response)
+        except ValueError:
+            d["text"] = self.response
+        return d
+
+
+# read_recordings reads the recordings written by a RecordingTransport
+def read_recordings(path: str) -> Iterator[Recording]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield Recording.from_dict(json.loads(line))
+
+
+# RecordingTransport sends requests with another transport and appends each call's
+# path, payload, status, response and latency to a file, one JSON object per line.
+# Payload keys are sorted so identical requests are recorded identically.
+# Payloads and JSON responses are recorded as returned by redact, which hashes access
+# tokens and signatures by default. With redact=None, recordings contain credentials.
+class RecordingTransport(Transport):
+    def __init__(
+        self,
+        transport: Transport,
+        path: str,
+        redact: Optional[Callable[[Any], Any]] = redact_credentials,
+    ):
+        self.transport = transport
+        self.redact = redact
+        self.retryable_errors = transport.retryable_errors
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.recorded = 0
+
+    def send(self, url, headers, auth, body, timeout, event):
+        start = time.monotonic()
+        resp = self.transport.send(url, headers, auth, body, timeout, event)
+        latency = time.monotonic() - start
+        payload, text = body, resp.text
+        if self.redact is not None:
+            payload = self.redact(body)
+            try:
+                text = json.dumps(self.redact(json.loads(text)), separators=(",", ":"))
+            except ValueError:
+                pass
+        recording = Recording(
+            start - self._start,
+            urlsplit(url).path,
+            payload,
+            resp.status_code,
+            text,
+            latency,
+        )
+        line = json.dumps(
+            recording.to_dict(), sort_keys=True, separators=(",", ":"), default=str
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+        return resp
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        self.transport.close()
+
+
+# ReplayTransport answers requests with recorded responses, after the recorded latency
+# divided by speed. Requests are matched by path and payload, then by path only; when a
+# request matches several recordings they are returned in turn. Unmatched requests get 404.
+# Requests are passed through the redact function they were recorded with before matching.
+class ReplayTransport(Transport):
+    def __init__(
+        self,
+        recordings: Iterable[Recording],
+        speed: float = 1.0,
+        redact: Optional[Callable[[Any], Any]] = redact_credentials,
+    ):
+        self.speed = speed
+        self.redact = redact
+        # (path, payload hash) -> recordings
+        self._by_request: Dict[Tuple[str, str], List[Recording]] = defaultdict(list)
+        self._by_path: Dict[str, List[Recording]] = defaultdict(list)
+        for recording in recordings:
+            key = (recording.path, canonical_hash(recording.payload))
+            self._by_request[key].append(recording)
+            self._by_path[recording.path].append(recording)
+        # key -> number of times it was replayed
+        self._replayed = defaultdict(int)
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.unmatched = 0
+
+    @classmethod
+    def from_file(
+        cls,
+        path: str,
+        speed: float = 1.0,
+        redact: Optional[Callable[[Any], Any]] = redact_credentials,
+    ) -> "ReplayTransport":
+        return cls(read_recordings(path), speed, redact)
+
+    def match(self, path: str, payload) -> Optional[Recording]:
+        if self.redact is not None and payload is not None:
+            payload = self.redact(payload)
+        for key, recordings in (
+            ((path, canonical_hash(payload or {})), self._by_request),
+            (path, self._by_path),
+        ):
+            matches = recordings.get(key)
+            if matches:
+                with self._lock:
+                    idx = self._replayed[key]
+                    self._replayed[key] += 1
+                    self.matched += 1
+                return matches[idx % len(matches)]
+        with self._lock:
+            self.unmatched += 1
+        return None
+
+    def send(self, url, headers, auth, body, timeout, event):
+        start = time.perf_counter()
+        recording = self.match(urlsplit(url).path, body)
+        if recording is None:
+            status_code = 404
+            text = json.dumps({"msg": "no recording", "code": "NOT_FOUND"})
+        else:
+            status_code, text = recording.status_code, recording.response
+            if recording.latency and self.speed:
+                time.sleep(recording.latency / self.speed)
+        event.ttfb = time.perf_counter() - start
+        return TransportResponse(
+            status_code, {"Content-Type": "application/json"}, text
+        )
+
+
+# replay_requests calls send(recording) for each recording at its recorded offset
+# divided by speed, from up to max_workers threads, and returns the
+# (recording, seconds, error) of every call in the order they completed.
+# Calls start late rather than being skipped when max_workers are busy.
+def replay_requests(
+    recordings: Iterable[Recording],
+    send: Callable[[Recording], Any],
+    speed: float = 1.0,
+    max_workers: int = 16,
+) -> List[Tuple[Recording, float, Optional[Exception]]]:
+    results = []
+    lock = threading.Lock()
+
+    def call(recording: Recording):
+        start = time.perf_counter()
+        error = None
+        try:
+            send(recording)
+        except Exception as e:
+            error = e
+        with lock:
+            results.append((recording, time.perf_counter() - start, error))
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # recordings are written as calls complete, not as they start
+        for recording in sorted(recordings, key=lambda r: r.offset):
+            delay = start + recording.offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(call, recording)
+    return results
+
+
+# client_sender returns a replay_requests send function that repeats each recorded call
+# with a Picket client, e.g. one using a ReplayTransport
+def client_sender(picket) -> Callable[[Recording], Any]:
+    prefix = urlsplit(picket.base_url).path.rstrip("/") + "/"
+
+    def send(recording: Recording):
+        path = recording.path
+        if path.startswith(prefix):
+            path = path[len(prefix) :]
+        return picket.request(path.lstrip("/"), recording.payload)
+
+    return send
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Hashable
+
+from .cache import TTLCache
+
+__all__ = ["RefreshAhead"]
+
+logger = logging.getLogger(__name__)
+
+
+# RefreshAhead renews hot cache entries before they expire.
+# Once an entry is past fraction of its TTL, the next cache hit on it starts a background
+# refresh and is served the cached value in the meantime, so entries that keep being
+# read never expire, while entries that are not read again expire as usual.
+# At most max_concurrency refreshes run at once; refreshes over the limit are skipped.
+class RefreshAhead:
+    def __init__(
+        self, fraction: float = 0.75, max_concurrency: int = 4, maxsize: int = 10000
+    ):
+        self.fraction = fraction
+        self.max_concurrency = max_concurrency
+
+        self.refreshes = 0
+        self.failures = 0
+        # refreshes skipped because max_concurrency were already running
+        self.skipped = 0
+
+        # cache key -> monotonic time after which the entry is refreshed when read
+        self._refresh_at = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        # running asyncio refresh tasks, referenced so they are not garbage collected
+        self._tasks = set()
+
+    # stored records that an entry was cached for ttl seconds
+    def stored(self, key: Hashable, ttl: float):
+        if ttl > 0:
+            self._refresh_at.set(key, time.monotonic() + ttl * self.fraction, ttl=ttl)
+
+    def _start(self, key: Hashable) -> bool:
+        refresh_at = self._refresh_at.get(key)
+        if refresh_at is None or time.monotonic() < refresh_at:
+            return False
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            if len(self._refreshing) >= self.max_concurrency:
+                self.skipped += 1
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _finish(self, key: Hashable, failed: bool):
+        with self._lock:
+            self._refreshing.discard(key)
+            self.refreshes += 1
+            self.failures += failed
+
+    # refresh calls fn in a background thread if the entry is due for a refresh
+    # and returns whether it did
+    def refresh(self, key: Hashable, fn: Callable[[], Any]) -> bool:
+        if not self._start(key):
+            return False
+
+        def run():
+            failed = False
+            try:
+                fn()
+            except Exception:
+                failed = True
+                logger.debug("Picket cache refresh failed", exc_info=True)
+            finally:
+                self._finish(key, failed)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="picket-refresh",
+                )
+            executor = self._executor
+        executor.submit(run)
+        return True
+
+    # refresh_async is refresh for asyncio, running fn in a task on the current event loop
+    def refresh_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> bool:
+        if not self._start(key):
+            return False
+
+        async def run():
+            failed = False
+            try:
+                await fn()
+            except Exception:
+                failed = True
+                logger.debug("Picket cache refresh failed", exc_info=True)
+            finally:
+                self._finish(key, failed)
+
+        task = asyncio.ensure_future(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    # close waits for running refreshes
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "running": len(self._refreshing),
+        }
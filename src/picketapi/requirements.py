@@ -0,0 +1,173 @@
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Mapping, Optional
+
+from .cache import TTLCache
+from .helpers import snake_to_camel_keys, token_expiry
+from .types import AuthorizedUser
+
+__all__ = ["ContractBalance", "RequirementEvaluator"]
+
+# requirement keys that can be evaluated locally
+# any other key, e.g. allowedWallets or creatorAddress, is left to the Picket API
+LOCAL_REQUIREMENTS = {"contractAddress", "collection", "minTokenBalance", "tokenIds"}
+
+
+# contract_key normalizes a contract address or collection for lookups
+# EVM addresses are case-insensitive, other chains' addresses are not
+def contract_key(contract: str) -> str:
+    if contract.startswith("0x"):
+        return contract.lower()
+    return contract
+
+
+def _decimal(value) -> Optional[Decimal]:
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+# ContractBalance is a wallet's parsed balances for one contract or collection
+class ContractBalance:
+    __slots__ = ("balances", "total", "tokens")
+
+    def __init__(self, balances: Mapping[str, str]):
+        # token_id -> balance as returned by the Picket API
+        self.balances = balances
+        self.tokens: Dict[str, Decimal] = {}
+        self.total = Decimal(0)
+        for token_id, balance in balances.items():
+            amount = _decimal(balance)
+            if amount is None:
+                # unparseable balances make the contract undecidable
+                self.total = None
+                return
+            self.tokens[token_id] = amount
+            self.total += amount
+
+
+# evaluate_requirements decides requirements from the balances returned by
+# balance(contract), or returns None when they cannot be decided locally
+def evaluate_requirements(
+    requirements: dict, balance: Callable[[str], Optional[ContractBalance]]
+) -> Optional[bool]:
+    requirements = snake_to_camel_keys(requirements)
+    if not requirements or not requirements.keys() <= LOCAL_REQUIREMENTS:
+        return None
+
+    contract = requirements.get("contractAddress", requirements.get("collection"))
+    if contract is None or (
+        "contractAddress" in requirements and "collection" in requirements
+    ):
+        return None
+
+    contract_balance = balance(contract)
+    if contract_balance is None or contract_balance.total is None:
+        return None
+
+    min_balance = _decimal(requirements.get("minTokenBalance", 1))
+    if min_balance is None:
+        return None
+
+    token_ids = requirements.get("tokenIds")
+    if token_ids:
+        amount = sum(
+            (
+                contract_balance.tokens.get(str(token_id), Decimal(0))
+                for token_id in token_ids
+            ),
+            Decimal(0),
+        )
+    else:
+        amount = contract_balance.total
+    return amount >= min_balance
+
+
+# evaluate_token_balances decides requirements from a wallet's token balances,
+# e.g. the tokenBalances claim of an access token
+def evaluate_token_balances(
+    token_balances: Mapping[str, Mapping[str, str]], requirements: dict
+) -> Optional[bool]:
+    contracts = {contract_key(c): tokens for c, tokens in token_balances.items()}
+
+    def balance(contract: str) -> Optional[ContractBalance]:
+        tokens = contracts.get(contract_key(contract))
+        return None if tokens is None else ContractBalance(tokens)
+
+    return evaluate_requirements(requirements, balance)
+
+
+# RequirementEvaluator answers token requirements locally from the token balances
+# in recent Picket API responses.
+# Balances are indexed by (chain, wallet, contract) and are used for max_staleness seconds
+# after they were received. evaluate returns True or False when the requirements can be
+# decided from those balances, and None when they cannot, e.g. when they were never
+# received for the contract or they use requirements that are only known to the server.
+class RequirementEvaluator:
+    def __init__(self, max_staleness: float = 30, maxsize: int = 10000):
+        self.max_staleness = max_staleness
+        # (chain, wallet, contract) -> ContractBalance
+        self._balances = TTLCache(maxsize=maxsize, ttl=max_staleness)
+        # access token -> AuthorizedUser
+        self._users = TTLCache(maxsize=maxsize, ttl=max_staleness)
+
+        self.decided = 0
+        self.undecidable = 0
+
+    # observe records balances the Picket API returned for a wallet
+    def observe(self, chain: str, wallet_address: str, token_balances: Mapping):
+        for contract, tokens in token_balances.items():
+            self._balances.set(
+                (chain, wallet_address, contract_key(contract)),
+                ContractBalance(tokens),
+                group=(chain, wallet_address),
+            )
+
+    # observe_user records the user the Picket API returned for an access token
+    def observe_user(self, access_token: str, user: AuthorizedUser):
+        self.observe(user.chain, user.wallet_address, user.token_balances)
+
+        ttl = None
+        exp = token_expiry(access_token)
+        if exp is not None:
+            ttl = exp - time.time()
+        self._users.set(access_token, user, ttl=ttl)
+
+    # user returns the user recently returned for an access token
+    def user(self, access_token: str) -> Optional[AuthorizedUser]:
+        return self._users.get(access_token)
+
+    def balance(
+        self, chain: str, wallet_address: str, contract: str
+    ) -> Optional[ContractBalance]:
+        return self._balances.get((chain, wallet_address, contract_key(contract)))
+
+    # forget_user drops the user recorded for an access token, e.g. once it is revoked
+    def forget_user(self, access_token: str):
+        self._users.delete(access_token)
+
+    # forget drops the balances recorded for a wallet
+    def forget(self, chain: str, wallet_address: str):
+        self._balances.invalidate((chain, wallet_address))
+
+    def evaluate(
+        self, chain: str, wallet_address: str, requirements: dict
+    ) -> Optional[bool]:
+        result = self._evaluate(chain, wallet_address, requirements)
+        if result is None:
+            self.undecidable += 1
+        else:
+            self.decided += 1
+        return result
+
+    def _evaluate(
+        self, chain: str, wallet_address: str, requirements: dict
+    ) -> Optional[bool]:
+        return evaluate_requirements(
+            requirements,
+            lambda contract: self.balance(chain, wallet_address, contract),
+        )
+
+    def stats(self) -> dict:
+        return {"decided": self.decided, "undecidable": self.undecidable}
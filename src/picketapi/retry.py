@@ -0,0 +1,32 @@
+import random
+from typing import Iterable
+
+__all__ = ["RetryPolicy"]
+
+
+# RetryPolicy retries idempotent requests that failed with a transient error
+# using exponential backoff with full jitter
+class RetryPolicy:
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        jitter: bool = True,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def should_retry_status(self, status_code: int) -> bool:
+        return status_code in self.retry_statuses
+
+    # backoff returns the delay in seconds before the given retry (starting at 0)
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2**attempt))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
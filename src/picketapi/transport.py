@@ -0,0 +1,401 @@
+import json
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Type, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from .metrics import RequestEvent
+
+__all__ = [
+    "TransportResponse",
+    "Transport",
+    "RequestsTransport",
+    "HTTP2Transport",
+    "FakeTransport",
+]
+
+
+# TransportResponse is the raw HTTP response returned by a transport
+class TransportResponse:
+    __slots__ = ("status_code", "headers", "text")
+
+    def __init__(self, status_code: int, headers: Mapping[str, str], text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+
+# Transport sends a JSON POST request to the Picket API
+# Errors in retryable_errors are connection errors and timeouts, which are safe to
+# retry for idempotent endpoints; any other error is raised to the caller as is.
+# Transports record the acquire, connect, tls, ttfb and body_read timings on the event.
+class Transport:
+    retryable_errors: Tuple[Type[BaseException], ...] = ()
+
+    def send(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        auth: Tuple[str, str],
+        body: Any,
+        timeout,
+        event: RequestEvent,
+    ) -> TransportResponse:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# per-thread RequestEvent that connection timings are recorded into
+_current_event = threading.local()
+
+
+def _add_timing(phase: str, seconds: float):
+    event = getattr(_current_event, "event", None)
+    if event is not None:
+        event.add_timing(phase, seconds)
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _add_timing("connect", time.perf_counter() - start)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    _tcp_seconds = 0.0
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._tcp_seconds = time.perf_counter() - start
+            _add_timing("connect", self._tcp_seconds)
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        # connect opens the TCP connection, then performs the TLS handshake
+        _add_timing("tls", time.perf_counter() - start - self._tcp_seconds)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            _add_timing("acquire", time.perf_counter() - start)
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            _add_timing("acquire", time.perf_counter() - start)
+
+
+# KeepAliveAdapter pools keep-alive connections and times how they are acquired and opened
+class KeepAliveAdapter(HTTPAdapter):
+    __attrs__ = HTTPAdapter.__attrs__ + ["keep_alive"]
+
+    def __init__(self, keep_alive: bool = True, **kwargs):
+        # must be set before HTTPAdapter.__init__ calls init_poolmanager
+        self.keep_alive = keep_alive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keep_alive:
+            # enable TCP keep-alive so idle pooled connections are not silently dropped
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+# RequestsTransport sends requests over a pooled requests.Session, one request per
+# connection at a time. This is the default transport.
+class RequestsTransport(Transport):
+    retryable_errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        pool_idle_timeout: Optional[float] = 60,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.pool_idle_timeout = pool_idle_timeout
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._in_flight = 0
+        self._last_used = 0.0
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = KeepAliveAdapter(
+            keep_alive=self.keep_alive,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _acquire_session(self) -> requests.Session:
+        with self._session_lock:
+            now = time.monotonic()
+            # evict idle connections, which the server has likely closed already
+            if (
+                self._session is not None
+                and self._in_flight == 0
+                and self.pool_idle_timeout is not None
+                and now - self._last_used > self.pool_idle_timeout
+            ):
+                self._session.close()
+                self._session = None
+
+            if self._session is None:
+                self._session = self.new_session()
+
+            self._in_flight += 1
+            self._last_used = now
+            return self._session
+
+    def _release_session(self):
+        with self._session_lock:
+            self._in_flight -= 1
+            self._last_used = time.monotonic()
+
+    def send(self, url, headers, auth, body, timeout, event):
+        session = self._acquire_session()
+        _current_event.event = event
+        try:
+            start = time.perf_counter()
+            # stream so that time to first byte and body read are measured separately
+            req = session.post(
+                url, auth=auth, headers=headers, json=body, timeout=timeout, stream=True
+            )
+            sent = time.perf_counter()
+            # the body must be read to release the connection back to the pool
+            req.content
+            event.body_read = time.perf_counter() - sent
+            event.ttfb = (
+                sent
+                - start
+                - (event.acquire or 0)
+                - (event.connect or 0)
+                - (event.tls or 0)
+            )
+            return TransportResponse(req.status_code, req.headers, req.text)
+        finally:
+            _current_event.event = None
+            self._release_session()
+
+
+# Tracer collects httpcore trace events to time the phases of a request
+class Tracer:
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.times = {}
+
+    def __call__(self, name: str, info: dict):
+        self.mark(name)
+
+    def mark(self, name: str):
+        # drop the http11/http2 prefix so both protocols use the same names
+        if name.startswith("http"):
+            name = name.split(".", 1)[1]
+        self.times[name] = time.perf_counter()
+
+    def span(self, started: str, complete: str) -> Optional[float]:
+        if started not in self.times or complete not in self.times:
+            return None
+        return self.times[complete] - self.times[started]
+
+    def record(self, event: RequestEvent):
+        first = self.times.get(
+            "connection.connect_tcp.started",
+            self.times.get("send_request_headers.started"),
+        )
+        if first is None:
+            # no trace events, e.g. with a mock transport
+            event.ttfb = self.end - self.start
+            return
+
+        # time spent waiting for a pooled connection
+        event.acquire = first - self.start
+        event.connect = self.span(
+            "connection.connect_tcp.started", "connection.connect_tcp.complete"
+        )
+        event.tls = self.span(
+            "connection.start_tls.started", "connection.start_tls.complete"
+        )
+        event.ttfb = self.span(
+            "send_request_headers.started", "receive_response_headers.complete"
+        )
+        event.body_read = self.span(
+            "receive_response_body.started", "receive_response_body.complete"
+        )
+
+
+# httpx_timeout converts a requests-style timeout to an httpx.Timeout
+def httpx_timeout(timeout) -> "httpx.Timeout":
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+# HTTP2Transport multiplexes concurrent requests over a few HTTP/2 connections with httpx,
+# instead of opening a connection per concurrent request.
+# It requires httpx with HTTP/2 support: pip install httpx[http2]
+class HTTP2Transport(Transport):
+    def __init__(
+        self,
+        max_connections: int = 10,
+        keepalive_expiry: Optional[float] = 60,
+        http2: bool = True,
+    ):
+        if httpx is None:
+            raise ImportError(
+                "HTTP2Transport requires httpx. Install it with `pip install httpx[http2]`"
+            )
+        self.retryable_errors = (httpx.TransportError,)
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def new_client(self) -> "httpx.Client":
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        # timeouts are set per attempt
+        return httpx.Client(
+            http2=self.http2, limits=limits, timeout=httpx.Timeout(None)
+        )
+
+    def _get_client(self) -> "httpx.Client":
+        with self._client_lock:
+            if self._client is None:
+                self._client = self.new_client()
+            return self._client
+
+    def close(self):
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def send(self, url, headers, auth, body, timeout, event):
+        tracer = Tracer()
+        tracer.start = time.perf_counter()
+        req = self._get_client().post(
+            url,
+            auth=auth,
+            headers=headers,
+            json=body,
+            timeout=httpx_timeout(timeout),
+            extensions={"trace": tracer},
+        )
+        tracer.end = time.perf_counter()
+        tracer.record(event)
+        return TransportResponse(req.status_code, req.headers, req.text)
+
+
+FakeRoute = Union[Any, Callable[[Any], Any]]
+
+
+# FakeTransport answers requests in-process, for tests and benchmarks
+# routes maps an endpoint path, e.g. "auth/validate" or "tokenOwnership", to the
+# response data, or to a function called with the request body that returns the data.
+# Data may be a (status_code, data) tuple; unknown paths return 404.
+class FakeTransport(Transport):
+    def __init__(
+        self, routes: Optional[Dict[str, FakeRoute]] = None, latency: float = 0.0
+    ):
+        self.routes = dict(routes or {})
+        self.latency = latency
+        # (url, body) of every request sent
+        self.calls: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def route(self, url: str) -> Optional[FakeRoute]:
+        # longest match first, so auth/validate is not answered by auth
+        for path in sorted(self.routes, key=len, reverse=True):
+            if url == path or url.endswith("/" + path):
+                return self.routes[path]
+        return None
+
+    def send(self, url, headers, auth, body, timeout, event):
+        start = time.perf_counter()
+        with self._lock:
+            self.calls.append((url, body))
+        if self.latency:
+            time.sleep(self.latency)
+
+        route = self.route(url)
+        if route is None:
+            status_code, data = 404, {"msg": "not found", "code": "NOT_FOUND"}
+        else:
+            data = route(body) if callable(route) else route
+            status_code = 200
+            if isinstance(data, tuple):
+                status_code, data = data
+
+        event.ttfb = time.perf_counter() - start
+        text = json.dumps(data, default=_to_json)
+        return TransportResponse(
+            status_code, {"Content-Type": "application/json"}, text
+        )
+
+
+def _to_json(obj):
+    # TokenBalancesView and other mappings
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
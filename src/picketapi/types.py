@@ -1,27 +1,393 @@
-from dataclasses import dataclass
-from typing import Dict
+import struct
+import sys
+from array import array
+from collections.abc import ItemsView, ValuesView
+from itertools import accumulate, chain
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 
+# contract -> token_id -> balance
+# Response types accept any such mapping and return it as a read-only TokenBalancesView
+TokenBalances = Mapping[str, Mapping[str, str]]
 
-@dataclass
-class NonceResponse:
-    nonce: str
-    statement: str
-    format: str
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# _pack_token_balances flattens {contract: {token_id: balance}} into one tuple of
+# (contract, number of tokens, token_id, balance, token_id, balance, ..., contract, ...)
+# with interned strings, so balances shared across users are stored once
+def _pack_token_balances(token_balances) -> tuple:
+    if isinstance(token_balances, TokenBalancesView):
+        return token_balances._data
+    packed = []
+    for contract, balances in (token_balances or {}).items():
+        packed.append(_intern(contract))
+        packed.append(len(balances))
+        for token_id, balance in balances.items():
+            packed.append(_intern(token_id))
+            packed.append(_intern(balance))
+    return tuple(packed)
+
+
+# Balances is a read-only mapping of token_id -> balance for one contract
+# The token index is only built on the first lookup
+class Balances(Mapping):
+    __slots__ = ("_data", "_start", "_count", "_index")
+
+    def __init__(self, data: tuple, start: int, count: int):
+        self._data = data
+        self._start = start
+        self._count = count
+        self._index: Optional[Dict[str, int]] = None
+
+    def _tokens(self) -> Dict[str, int]:
+        if self._index is None:
+            end = self._start + 2 * self._count
+            self._index = dict(
+                zip(self._data[self._start : end : 2], range(self._start + 1, end, 2))
+            )
+        return self._index
+
+    def __getitem__(self, token_id: str) -> str:
+        return self._data[self._tokens()[token_id]]
+
+    def __contains__(self, token_id) -> bool:
+        return token_id in self._tokens()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data[self._start : self._start + 2 * self._count : 2])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> ItemsView:
+        return _BalancesItems(self)
+
+    def values(self) -> ValuesView:
+        return _BalancesValues(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+# items and values walk the packed tuple instead of looking up every token
+class _BalancesItems(ItemsView):
+    __slots__ = ()
+
+    def __iter__(self):
+        balances = self._mapping
+        start, end = balances._start, balances._start + 2 * balances._count
+        return zip(balances._data[start:end:2], balances._data[start + 1 : end : 2])
+
+
+class _BalancesValues(ValuesView):
+    __slots__ = ()
+
+    def __iter__(self):
+        balances = self._mapping
+        start, end = balances._start, balances._start + 2 * balances._count
+        return iter(balances._data[start + 1 : end : 2])
+
+
+# TokenBalancesView is a read-only mapping of contract -> Balances over packed token balances
+# The contract index is only built on the first lookup
+class TokenBalancesView(Mapping):
+    __slots__ = ("_data", "_index")
+
+    def __init__(self, data: tuple):
+        self._data = data
+        self._index: Optional[Dict[str, Tuple[int, int]]] = None
+
+    def _contracts(self) -> Dict[str, Tuple[int, int]]:
+        if self._index is None:
+            index = {}
+            data = self._data
+            idx = 0
+            while idx < len(data):
+                count = data[idx + 1]
+                index[data[idx]] = (idx + 2, count)
+                idx += 2 + 2 * count
+            self._index = index
+        return self._index
+
+    def __getitem__(self, contract: str) -> Balances:
+        start, count = self._contracts()[contract]
+        return Balances(self._data, start, count)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._contracts())
+
+    def __len__(self) -> int:
+        return len(self._contracts())
+
+    def __eq__(self, other):
+        if isinstance(other, TokenBalancesView) and self._data == other._data:
+            return True
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    # to_dict returns the token balances as mutable, JSON serializable dicts
+    def to_dict(self) -> Dict[str, Dict[str, str]]:
+        return {contract: dict(balances.items()) for contract, balances in self.items()}
+
+
+# The binary format written by to_bytes is a header, then the distinct values of the
+# response: the lengths and UTF-8 text of its strings and its token counts, then the
+# references to those values in the order the response uses them, and the other fields,
+# e.g. booleans. Each value is stored once, e.g. a contract or a balance shared by many
+# tokens, and _KNOWN_STRINGS are not stored at all.
+# Integer arrays use the narrowest unsigned little-endian type that fits their values.
+# Changes to the format, the known strings or the type tags must bump _BINARY_VERSION.
+_BINARY_VERSION = 1
+# version, type tag, widths of the lengths, ints, references and fields,
+# number of strings, ints, references and fields, text size
+_BINARY_HEADER = struct.Struct("<BBBBBBIIIII")
+# width -> array typecode and largest value
+_BINARY_WIDTHS = (("B", 0xFF), ("H", 0xFFFF), ("I", 0xFFFFFFFF))
+_KNOWN_STRINGS = ("ethereum", "solana", "polygon", "optimism", "arbitrum", "avalanche")
+
+
+def _pack_ints(values: List[int], largest: Optional[int] = None) -> Tuple[int, bytes]:
+    if largest is None:
+        largest = max(values, default=0)
+    for width, (typecode, limit) in enumerate(_BINARY_WIDTHS):
+        if largest <= limit:
+            break
+    else:
+        raise ValueError("response too large to serialize")
+    if typecode == "B":
+        return width, bytes(values)
+    return width, struct.pack(f"<{len(values)}{typecode}", *values)
+
+
+def _unpack_ints(data: bytes, pos: int, width: int, count: int) -> Tuple[list, int]:
+    if width == 0:
+        end = pos + count
+        if end > len(data):
+            raise ValueError("truncated data")
+        return list(data[pos:end]), end
+    if width >= len(_BINARY_WIDTHS):
+        raise ValueError(f"invalid integer width {width}")
+    ints = array(_BINARY_WIDTHS[width][0])
+    end = pos + count * ints.itemsize
+    if end > len(data):
+        raise ValueError("truncated data")
+    ints.frombytes(data[pos:end])
+    if sys.byteorder == "big":
+        ints.byteswap()
+    return ints.tolist(), end
+
+
+# _Encoder collects the values and other fields of a response for to_bytes
+class _Encoder:
+    __slots__ = ("values", "fields")
+
+    def __init__(self):
+        self.values: list = []
+        self.fields: List[int] = []
+
+    def token_balances(self, packed: tuple):
+        self.fields.append(len(packed))
+        self.values.extend(packed)
+
+
+# _Decoder reads the values and other fields of a response in the order _Encoder wrote them
+class _Decoder:
+    __slots__ = ("values", "fields", "value_pos", "field_pos")
+
+    def __init__(self, values: list, fields: List[int]):
+        self.values = values
+        self.fields = fields
+        self.value_pos = 0
+        self.field_pos = 0
+
+    def value(self):
+        self.value_pos += 1
+        return self.values[self.value_pos - 1]
+
+    def field(self) -> int:
+        self.field_pos += 1
+        return self.fields[self.field_pos - 1]
+
+    def token_balances(self) -> tuple:
+        size = self.field()
+        packed = tuple(self.values[self.value_pos : self.value_pos + size])
+        self.value_pos += size
+        # check the token counts, so corrupt data fails here rather than on access
+        pos = 0
+        while pos < size:
+            count = packed[pos + 1]
+            if type(count) is not int:
+                raise ValueError("invalid token balances")
+            pos += 2 + 2 * count
+        if pos != size:
+            raise ValueError("invalid token balances")
+        return packed
+
+    def done(self) -> bool:
+        return self.value_pos == len(self.values) and self.field_pos == len(self.fields)
+
+
+# _Model gives the slotted response types dataclass-style equality and repr
+# to_dict returns the API representation accepted by from_dict
+# to_bytes returns the compact binary representation accepted by from_bytes
+class _Model:
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{self.__class__.__name__}({fields})"
+
+    def to_bytes(self) -> bytes:
+        encoder = _Encoder()
+        self._encode(encoder)
+        distinct = dict.fromkeys(chain(_KNOWN_STRINGS, encoder.values))
+        strings = [value for value in distinct if type(value) is str]
+        ints = [value for value in distinct if type(value) is int]
+        if len(strings) + len(ints) != len(distinct):
+            raise TypeError(f"{self.__class__.__name__} values must be str or int")
+        index = dict(zip(chain(strings, ints), range(len(distinct))))
+        strings = strings[len(_KNOWN_STRINGS) :]
+        text = "".join(strings).encode("utf-8")
+
+        lengths_width, lengths = _pack_ints(list(map(len, strings)))
+        ints_width, ints_data = _pack_ints(ints)
+        refs = list(map(index.__getitem__, encoder.values))
+        refs_width, refs_data = _pack_ints(refs, len(distinct) - 1)
+        fields_width, fields = _pack_ints(encoder.fields)
+        header = _BINARY_HEADER.pack(
+            _BINARY_VERSION,
+            _BINARY_TAGS[self.__class__],
+            lengths_width,
+            ints_width,
+            refs_width,
+            fields_width,
+            len(strings),
+            len(ints),
+            len(refs),
+            len(encoder.fields),
+            len(text),
+        )
+        return b"".join((header, lengths, text, ints_data, refs_data, fields))
+
+    # from_bytes raises ValueError if data is not a serialized cls
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        try:
+            header = _BINARY_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("truncated data") from None
+        version, tag, lengths_width, ints_width, refs_width, fields_width = header[:6]
+        strings_count, ints_count, refs_count, fields_count, text_size = header[6:]
+        if version != _BINARY_VERSION:
+            raise ValueError(f"unsupported binary format version {version}")
+        if not 0 < tag <= len(_BINARY_TYPES):
+            raise ValueError(f"unknown type tag {tag}")
+        model = _BINARY_TYPES[tag - 1]
+        if not issubclass(model, cls):
+            raise ValueError(f"expected {cls.__name__}, got {model.__name__}")
+
+        pos = _BINARY_HEADER.size
+        lengths, pos = _unpack_ints(data, pos, lengths_width, strings_count)
+        try:
+            text = data[pos : pos + text_size].decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ValueError(f"invalid {model.__name__} data") from e
+        ints, pos = _unpack_ints(data, pos + text_size, ints_width, ints_count)
+        refs, pos = _unpack_ints(data, pos, refs_width, refs_count)
+        fields, pos = _unpack_ints(data, pos, fields_width, fields_count)
+        if pos != len(data):
+            raise ValueError("trailing data")
+
+        offsets = [0] + list(accumulate(lengths))
+        if offsets[-1] != len(text):
+            raise ValueError("invalid string lengths")
+        # strings are interned like in from_dict
+        values = list(_KNOWN_STRINGS)
+        values.extend(
+            map(sys.intern, map(text.__getitem__, map(slice, offsets, offsets[1:])))
+        )
+        values.extend(ints)
+        try:
+            decoder = _Decoder(list(map(values.__getitem__, refs)), fields)
+            obj = model._decode(decoder)
+        except IndexError as e:
+            raise ValueError(f"invalid {model.__name__} data") from e
+        if not decoder.done():
+            raise ValueError(f"invalid {model.__name__} data")
+        return obj
+
+
+class NonceResponse(_Model):
+    __slots__ = ("nonce", "statement", "format")
+    _fields = __slots__
+
+    def __init__(self, nonce: str, statement: str, format: str):
+        self.nonce = nonce
+        self.statement = statement
+        self.format = format
 
     @classmethod
     def from_dict(cls, d):
         return cls(d["nonce"], d["statement"], d["format"])
 
+    def to_dict(self) -> dict:
+        return {"nonce": self.nonce, "statement": self.statement, "format": self.format}
+
+    def _encode(self, encoder: _Encoder):
+        encoder.values += (self.nonce, self.statement, self.format)
+
+    @classmethod
+    def _decode(cls, decoder: _Decoder):
+        return cls(decoder.value(), decoder.value(), decoder.value())
+
+
+# token_balances are stored packed and only unpacked into a TokenBalancesView when accessed
+class _TokenBalancesModel(_Model):
+    __slots__ = ("_token_balances", "_token_balances_view")
 
-TokenBalances = Dict[str, Dict[str, str]]
+    @property
+    def token_balances(self) -> TokenBalancesView:
+        view = self._token_balances_view
+        if view is None:
+            view = TokenBalancesView(self._token_balances)
+            self._token_balances_view = view
+        return view
 
+    @token_balances.setter
+    def token_balances(self, token_balances: TokenBalances):
+        self._token_balances = _pack_token_balances(token_balances)
+        self._token_balances_view = None
 
-@dataclass
-class AuthorizedUser:
-    chain: str
-    wallet_address: str
-    display_address: str
-    token_balances: TokenBalances
+
+class AuthorizedUser(_TokenBalancesModel):
+    __slots__ = ("chain", "wallet_address", "display_address")
+    _fields = ("chain", "wallet_address", "display_address", "token_balances")
+
+    def __init__(
+        self,
+        chain: str,
+        wallet_address: str,
+        display_address: str,
+        token_balances: TokenBalances,
+    ):
+        self.chain = _intern(chain)
+        self.wallet_address = wallet_address
+        self.display_address = display_address
+        self.token_balances = token_balances
 
     @classmethod
     def from_dict(cls, d):
@@ -29,23 +395,83 @@ class AuthorizedUser:
             d["chain"], d["walletAddress"], d["displayAddress"], d["tokenBalances"]
         )
 
+    def to_dict(self) -> dict:
+        return {
+            "chain": self.chain,
+            "walletAddress": self.wallet_address,
+            "displayAddress": self.display_address,
+            "tokenBalances": self.token_balances.to_dict(),
+        }
+
+    def _encode(self, encoder: _Encoder):
+        encoder.values += (self.chain, self.wallet_address, self.display_address)
+        encoder.token_balances(self._token_balances)
+
+    @classmethod
+    def _decode(cls, decoder: _Decoder):
+        chain, wallet_address, display_address = (
+            decoder.value(),
+            decoder.value(),
+            decoder.value(),
+        )
+        token_balances = TokenBalancesView(decoder.token_balances())
+        return cls(chain, wallet_address, display_address, token_balances)
+
+
+class AuthResponse(_Model):
+    __slots__ = ("access_token", "user")
+    _fields = __slots__
 
-@dataclass
-class AuthResponse:
-    access_token: str
-    user: AuthorizedUser
+    def __init__(self, access_token: str, user: AuthorizedUser):
+        self.access_token = access_token
+        self.user = user
 
     @classmethod
     def from_dict(cls, d):
         user = AuthorizedUser.from_dict(d["user"])
         return cls(d["accessToken"], user)
 
+    def to_dict(self) -> dict:
+        return {"accessToken": self.access_token, "user": self.user.to_dict()}
 
-@dataclass
-class TokenOwnershipResponse:
-    allowed: bool
-    token_balances: TokenBalances
+    def _encode(self, encoder: _Encoder):
+        encoder.values.append(self.access_token)
+        self.user._encode(encoder)
+
+    @classmethod
+    def _decode(cls, decoder: _Decoder):
+        access_token = decoder.value()
+        return cls(access_token, AuthorizedUser._decode(decoder))
+
+
+class TokenOwnershipResponse(_TokenBalancesModel):
+    __slots__ = ("allowed",)
+    _fields = ("allowed", "token_balances")
+
+    def __init__(self, allowed: bool, token_balances: TokenBalances):
+        self.allowed = allowed
+        self.token_balances = token_balances
 
     @classmethod
     def from_dict(cls, d):
         return cls(d["allowed"], d["tokenBalances"])
+
+    def to_dict(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "tokenBalances": self.token_balances.to_dict(),
+        }
+
+    def _encode(self, encoder: _Encoder):
+        encoder.fields.append(int(self.allowed))
+        encoder.token_balances(self._token_balances)
+
+    @classmethod
+    def _decode(cls, decoder: _Decoder):
+        allowed = bool(decoder.field())
+        return cls(allowed, TokenBalancesView(decoder.token_balances()))
+
+
+# type tags of the binary format, which may only be appended to
+_BINARY_TYPES = (NonceResponse, AuthorizedUser, AuthResponse, TokenOwnershipResponse)
+_BINARY_TAGS = {model: tag for tag, model in enumerate(_BINARY_TYPES, 1)}
@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import List, Optional
+
+import requests
+
+try:
+    import jwt
+except ImportError:  # pragma: no cover
+    jwt = None
+
+__all__ = ["AccessTokenVerifier"]
+
+
+# AccessTokenVerifier checks an access token's signature, expiry and claims
+# locally, without a round trip to the Picket API.
+# Keys come from either a static verification key or a JWKS URL, which is
+# re-fetched every refresh_interval seconds.
+class AccessTokenVerifier:
+    def __init__(
+        self,
+        key=None,
+        jwks_url: Optional[str] = None,
+        algorithms: Optional[List[str]] = None,
+        refresh_interval: float = 300,
+        audience=None,
+        issuer: Optional[str] = None,
+        leeway: float = 0,
+    ):
+        if jwt is None:
+            raise ImportError(
+                "local access token verification requires PyJWT. Install it with `pip install pyjwt[crypto]`"
+            )
+        if key is None and jwks_url is None:
+            raise ValueError("either key or jwks_url is required")
+
+        self.key = key
+        self.jwks_url = jwks_url
+        self.algorithms = algorithms or ["RS256"]
+        self.refresh_interval = refresh_interval
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+
+        self._keys = {}
+        self._next_refresh = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self) -> bool:
+        if self.jwks_url is None:
+            return False
+        return self._next_refresh is None or time.monotonic() >= self._next_refresh
+
+    def fetch_jwks(self) -> dict:
+        resp = requests.get(self.jwks_url, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+
+    def refresh(self):
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if not self.needs_refresh():
+                return
+            # back off before the next attempt if the fetch fails
+            self._next_refresh = time.monotonic() + min(self.refresh_interval, 30)
+            jwks = jwt.PyJWKSet.from_dict(self.fetch_jwks())
+            self._keys = {k.key_id: k.key for k in jwks.keys}
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def signing_key(self, token: str):
+        if self.key is not None:
+            return self.key
+
+        if self.needs_refresh():
+            self.refresh()
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        return self._keys.get(kid)
+
+    # verify returns the token's claims if it is valid, otherwise None
+    # callers should fall back to the Picket API, which returns the authoritative error
+    def verify(self, access_token: str) -> Optional[dict]:
+        try:
+            key = self.signing_key(access_token)
+            if key is None:
+                return None
+
+            return jwt.decode(
+                access_token,
+                key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={
+                    "require": ["exp"],
+                    "verify_aud": self.audience is not None,
+                },
+            )
+        except (jwt.PyJWTError, requests.RequestException, ValueError):
+            return None
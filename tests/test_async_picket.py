@@ -0,0 +1,378 @@
+import asyncio
+import base64
+import json
+import os
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from picketapi import AsyncPicket
+from picketapi import types
+from picketapi.exceptions import PicketAPIException
+from picketapi.helpers import snake_to_camel_keys
+from picketapi.retry import RetryPolicy
+
+
+def mock_picket(handler, **kwargs) -> AsyncPicket:
+    picket = AsyncPicket("api_key", **kwargs)
+    picket._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return picket
+
+
+def expect(picket, path, req_data, resp_data, status=200):
+    basic_auth = base64.b64encode(f"{picket.api_key}:".encode("utf-8")).decode("utf-8")
+
+    def handler(request):
+        assert request.method == "POST"
+        assert str(request.url) == os.path.join(picket.base_url, path)
+        assert request.headers["Authorization"] == f"Basic {basic_auth}"
+        assert request.headers["User-Agent"] == picket.headers()["User-Agent"]
+        assert json.loads(request.content) == snake_to_camel_keys(req_data)
+        return httpx.Response(status, json=resp_data)
+
+    return handler
+
+
+def test_async_picket_init():
+    picket = AsyncPicket("api_key", max_concurrency=5)
+    assert picket.api_key == "api_key"
+    assert picket.max_concurrency == 5
+
+
+def test_async_picket_nonce():
+    picket = AsyncPicket("api_key")
+    req_data = {"chain": "chain", "wallet_address": "wallet_address", "locale": "en"}
+    resp_data = {"nonce": "nonce", "statement": "statement", "format": "format"}
+    picket._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(expect(picket, "auth/nonce", req_data, resp_data))
+    )
+
+    resp = asyncio.run(picket.nonce(**req_data))
+
+    assert type(resp) == types.NonceResponse
+    assert resp.nonce == resp_data["nonce"]
+
+
+def test_async_picket_validate():
+    picket = AsyncPicket("api_key")
+    req_data = {
+        "access_token": "xxx.yyy.zzz",
+        "requirements": {"contract_address": "0xContract"},
+    }
+    resp_data = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {"contractAddress": {"0x12345": "1"}},
+    }
+    picket._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            expect(picket, "auth/validate", req_data, resp_data)
+        )
+    )
+
+    resp = asyncio.run(picket.validate(**req_data))
+
+    assert type(resp) == types.AuthorizedUser
+    assert resp.wallet_address == resp_data["walletAddress"]
+    assert resp.token_balances == resp_data["tokenBalances"]
+
+
+def test_async_picket_token_ownership():
+    picket = AsyncPicket("api_key")
+    req_data = {"token_ids": [1, 2]}
+    resp_data = {"allowed": True, "tokenBalances": {"token_ids": {"1": "1"}}}
+    path = os.path.join("chains", "chain", "wallets", "wallet", "tokenOwnership")
+    picket._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(expect(picket, path, req_data, resp_data))
+    )
+
+    resp = asyncio.run(picket.token_ownesrhip("chain", "wallet", **req_data))
+
+    assert type(resp) == types.TokenOwnershipResponse
+    assert resp.allowed is True
+
+
+def test_async_picket_error():
+    picket = mock_picket(
+        lambda request: httpx.Response(400, json={"msg": "message", "code": "code"})
+    )
+
+    with pytest.raises(PicketAPIException) as e:
+        asyncio.run(picket.authz(access_token="xxx.yyy.zzz", requirements={}))
+
+    assert e.value.msg == "message"
+    assert e.value.code == "code"
+
+
+def test_async_picket_max_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={})
+
+    async def run():
+        picket = mock_picket(handler, max_concurrency=3)
+        async with picket:
+            await asyncio.gather(*(picket.post_request("path") for _ in range(20)))
+
+    asyncio.run(run())
+    assert peak == 3
+
+
+def test_async_picket_coalesce_requests():
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"nonce": "n", "statement": "s", "format": "f"})
+
+    async def run():
+        picket = mock_picket(handler, coalesce_requests=True)
+        return await asyncio.gather(
+            *(picket.nonce("chain", "wallet") for _ in range(5))
+        )
+
+    results = asyncio.run(run())
+    assert [r.nonce for r in results] == ["n"] * 5
+    assert calls == 1
+
+
+def test_async_picket_coalesce_requests_build():
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"nonce": "n", "statement": "s", "format": "f"})
+
+    async def run():
+        picket = mock_picket(handler, coalesce_requests=True)
+        return await asyncio.gather(
+            picket.nonce("chain", "wallet"),
+            picket.post_request(
+                "auth/nonce", chain="chain", wallet_address="wallet", locale="en-US"
+            ),
+        )
+
+    nonce, raw = asyncio.run(run())
+    assert nonce.nonce == "n"
+    assert raw == {"nonce": "n", "statement": "s", "format": "f"}
+    assert calls == 2
+
+
+def test_async_picket_retry():
+    statuses = [503, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        return httpx.Response(
+            status, json={"nonce": "n", "statement": "s", "format": "f"}
+        )
+
+    picket = mock_picket(handler, retry_policy=RetryPolicy(backoff_base=0))
+    resp = asyncio.run(picket.nonce("chain", "wallet"))
+
+    assert resp.nonce == "n"
+    assert statuses == []
+
+
+def test_async_picket_timeout():
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200, json={})
+
+    picket = mock_picket(handler, timeout=(1, 2))
+    asyncio.run(picket.request("auth/validate", {}))
+
+    assert timeouts[0]["connect"] == 1
+    assert timeouts[0]["read"] == 2
+
+
+def test_async_picket_hooks():
+    events = []
+    picket = mock_picket(
+        lambda request: httpx.Response(400, json={"msg": "message", "code": "code"}),
+        hooks=[events.append],
+    )
+
+    with pytest.raises(PicketAPIException):
+        asyncio.run(picket.validate("xxx.yyy.zzz"))
+
+    event = events[0]
+    assert event.endpoint == "auth/validate"
+    assert event.status_code == 400
+    assert event.error_code == "code"
+    assert event.ttfb >= 0
+
+
+def test_async_picket_nonce_cache():
+    paths = []
+
+    async def handler(request):
+        paths.append(request.url.path)
+        await asyncio.sleep(0.01)
+        if request.url.path.endswith("nonce"):
+            nonce = str(len(paths))
+            return httpx.Response(
+                200, json={"nonce": nonce, "statement": "s", "format": "f"}
+            )
+        if json.loads(request.content)["signature"] == "bad":
+            return httpx.Response(
+                401, json={"msg": "invalid signature", "code": "INVALID_SIGNATURE"}
+            )
+        user = {
+            "chain": "chain",
+            "walletAddress": "wallet",
+            "displayAddress": "wallet",
+            "tokenBalances": {},
+        }
+        return httpx.Response(200, json={"accessToken": "xxx.yyy.zzz", "user": user})
+
+    async def run():
+        picket = mock_picket(handler, nonce_cache_fraction=0.5)
+        # concurrent calls share one request
+        nonces = await asyncio.gather(
+            *(picket.nonce("chain", "wallet") for _ in range(5))
+        )
+        assert [n.nonce for n in nonces] == ["1"] * 5
+        assert (await picket.nonce("chain", "wallet")).nonce == "1"
+
+        await picket.auth("chain", "wallet", "signature")
+        assert (await picket.nonce("chain", "wallet")).nonce == "3"
+
+        # a rejected signature drops the nonce too
+        with pytest.raises(PicketAPIException):
+            await picket.auth("chain", "wallet", "bad")
+        assert (await picket.nonce("chain", "wallet")).nonce == "5"
+
+    asyncio.run(run())
+    assert len(paths) == 5
+
+
+def test_async_picket_validate_refresh_ahead():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        token = json.loads(request.content)["accessToken"]
+        user = {
+            "chain": "ethereum",
+            "walletAddress": token,
+            "displayAddress": token,
+            "tokenBalances": {},
+        }
+        return httpx.Response(200, json=user)
+
+    async def run():
+        picket = mock_picket(handler, validate_cache_ttl=0.5, refresh_ahead=0.75)
+        user = await picket.validate("a")
+        await asyncio.sleep(0.4)
+        # served from the cache and renewed in a background task
+        assert await picket.validate("a") is user
+        await asyncio.gather(*picket.refresher._tasks)
+        assert len(calls) == 2
+
+        await asyncio.sleep(0.15)
+        assert await picket.validate("a") == user
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_async_picket_validate_negative_cache():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(401, json={"msg": "token expired", "code": "EXPIRED"})
+
+    async def run():
+        picket = mock_picket(handler, negative_cache_ttl=60)
+        for _ in range(3):
+            with pytest.raises(PicketAPIException) as e:
+                await picket.validate("xxx.yyy.zzz")
+            assert e.value.msg == "token expired"
+            assert e.value.code == "EXPIRED"
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_async_picket_hedged_request():
+    calls = []
+    cancelled = []
+
+    async def handler(request):
+        calls.append(request)
+        token = "slow" if len(calls) == 1 else "fast"
+        if token == "slow":
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(request)
+                raise
+        user = {
+            "chain": "ethereum",
+            "walletAddress": token,
+            "displayAddress": token,
+            "tokenBalances": {},
+        }
+        return httpx.Response(200, json=user)
+
+    async def run():
+        picket = mock_picket(handler, hedge_delay=0.02)
+        user = await picket.validate("xxx.yyy.zzz")
+        assert user.wallet_address == "fast"
+        await asyncio.sleep(0)
+        assert picket.hedge_policy.stats()["hedge_wins"] == 1
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert len(cancelled) == 1
+
+
+def test_async_picket_authz_locally():
+    jwt = pytest.importorskip("jwt")
+    secret = "s" * 32
+    claims = {
+        "chain": "ethereum",
+        "walletAddress": "0x1",
+        "displayAddress": "0x1",
+        "tokenBalances": {"0xContract": {"1": "1"}},
+        "exp": 9999999999,
+    }
+    token = jwt.encode(claims, secret, algorithm="HS256")
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"accessToken": "new", "user": claims})
+
+    async def run():
+        picket = mock_picket(
+            handler,
+            verification_key=secret,
+            token_algorithms=["HS256"],
+            local_authz=True,
+        )
+        resp = await picket.authz(token, {"contractAddress": "0xContract"})
+        assert resp.access_token == token
+        resp = await picket.authz(token, {"contractAddress": "0xContract"}, True)
+        assert resp.access_token == "new"
+        return picket
+
+    picket = asyncio.run(run())
+    assert len(calls) == 1
+    assert picket.authz_stats() == {"short_circuited": 1, "remote": 1}
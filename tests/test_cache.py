@@ -0,0 +1,184 @@
+import multiprocessing
+import sys
+import time
+
+import pytest
+
+from picketapi import cache
+from picketapi.cache import MmapCache, SQLiteCache, TTLCache
+from picketapi.types import AuthorizedUser
+
+
+def test_ttl_cache_get_set():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("key") is None
+    assert cache.get("key", "default") == "default"
+
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert len(cache) == 1
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 1}
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", "value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+    # entries never outlive the cache ttl
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("key", "value", ttl=60)
+    time.sleep(0.02)
+    assert cache.get("key") is None
+
+    # non-positive ttls are not cached
+    cache.set("key", "value", ttl=-1)
+    assert len(cache) == 0
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # a is now the most recently used
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(("token", "a"), 1, group="token")
+    cache.set(("token", "b"), 2, group="token")
+    cache.set(("other", "a"), 3, group="other")
+
+    assert cache.invalidate("token") == 2
+    assert cache.get(("token", "a")) is None
+    assert cache.get(("token", "b")) is None
+    assert cache.get(("other", "a")) == 3
+    assert cache.invalidate("token") == 0
+
+
+@pytest.fixture(params=["mmap", "sqlite"])
+def shared_cache(request, tmp_path):
+    if request.param == "mmap":
+        if sys.platform == "win32":
+            pytest.skip("MmapCache requires fcntl")
+        cache = MmapCache(str(tmp_path / "cache"), slots=64, slot_size=512, ttl=60)
+    else:
+        cache = SQLiteCache(str(tmp_path / "cache.db"), maxsize=64, ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_shared_cache_get_set(shared_cache):
+    assert shared_cache.get("key") is None
+    assert shared_cache.get("key", "default") == "default"
+
+    user = AuthorizedUser("ethereum", "0x1", "0x1", {"0xA": {"1": "1"}})
+    shared_cache.set("key", user)
+    shared_cache.set(("token", "requirements"), {"json": ["value"]})
+    assert shared_cache.get("key") == user
+    assert shared_cache.get(("token", "requirements")) == {"json": ["value"]}
+
+    shared_cache.set("key", "updated")
+    assert shared_cache.get("key") == "updated"
+
+    shared_cache.delete("key")
+    assert shared_cache.get("key") is None
+    assert shared_cache.stats()["size"] == 1
+
+
+def test_shared_cache_undecodable_entry(shared_cache, monkeypatch):
+    # an entry written by a newer version during a rolling deploy
+    user = AuthorizedUser("ethereum", "0x1", "0x1", {"0xA": {"1": "1"}})
+    newer = b"\x02" + user.to_bytes()[1:]
+    monkeypatch.setattr(cache, "encode_value", lambda value: newer)
+    shared_cache.set("key", user)
+
+    misses = shared_cache.stats()["misses"]
+    assert shared_cache.get("key") is None
+    assert shared_cache.stats()["misses"] == misses + 1
+    assert shared_cache.stats()["size"] == 0
+
+
+def test_shared_cache_expiry(shared_cache):
+    shared_cache.set("key", "value", ttl=0.01)
+    time.sleep(0.02)
+    assert shared_cache.get("key") is None
+
+    shared_cache.set("key", "value", ttl=-1)
+    assert shared_cache.get("key") is None
+
+
+def test_shared_cache_invalidate(shared_cache):
+    shared_cache.set("a", 1, group="token")
+    shared_cache.set("b", 2, group="token")
+    shared_cache.set("c", 3, group="other")
+
+    assert shared_cache.invalidate("token") == 2
+    assert shared_cache.get("a") is None
+    assert shared_cache.get("b") is None
+    assert shared_cache.get("c") == 3
+
+    shared_cache.clear()
+    assert shared_cache.get("c") is None
+
+
+def _set_in_child(cache, key, value):
+    cache.set(key, value)
+
+
+def test_shared_cache_across_processes(shared_cache):
+    ctx = multiprocessing.get_context("fork")
+    process = ctx.Process(target=_set_in_child, args=(shared_cache, "key", "value"))
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    assert shared_cache.get("key") == "value"
+
+
+def test_shared_cache_reopen(tmp_path):
+    path = str(tmp_path / "cache")
+    MmapCache(path, slots=16, slot_size=256).set("key", "value")
+    assert MmapCache(path, slots=16, slot_size=256).get("key") == "value"
+    with pytest.raises(ValueError):
+        MmapCache(path, slots=32, slot_size=256)
+
+    path = str(tmp_path / "cache.db")
+    SQLiteCache(path).set("key", "value")
+    assert SQLiteCache(path).get("key") == "value"
+
+
+def test_mmap_cache_eviction(tmp_path):
+    cache = MmapCache(str(tmp_path / "cache"), slots=8, slot_size=128, ttl=60)
+    for idx in range(9):
+        cache.set(idx, idx, ttl=50 + idx)
+
+    # the entry expiring soonest was evicted
+    assert cache.evictions == 1
+    assert cache.get(0) is None
+    assert [cache.get(idx) for idx in range(1, 9)] == list(range(1, 9))
+
+    # values larger than a slot are not cached
+    cache.set("large", "x" * 128)
+    assert cache.get("large") is None
+    assert cache.skipped == 1
+
+
+def test_sqlite_cache_eviction(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), maxsize=10, ttl=60)
+    for idx in range(64):
+        cache.set(idx, idx, ttl=50 + idx / 100)
+
+    assert len(cache) == 10
+    assert cache.evictions == 54
+    assert cache.get(63) == 63
+    assert cache.get(0) is None
@@ -0,0 +1,51 @@
+from picketapi.circuit_breaker import CircuitBreaker
+
+
+def test_circuit_breaker_opens():
+    breaker = CircuitBreaker(failure_threshold=0.5, min_calls=4, recovery_timeout=60)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.retry_after() == 0
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after() > 0
+    assert breaker.stats() == {"state": "open", "calls": 4, "failures": 2}
+
+
+def test_circuit_breaker_min_calls():
+    breaker = CircuitBreaker(failure_threshold=0.5, min_calls=4)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_half_open():
+    breaker = CircuitBreaker(failure_threshold=0.5, min_calls=1, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # a probe is let through once the recovery timeout passes
+    assert breaker.retry_after() == 0
+    assert breaker.state == "half-open"
+
+    # a failed probe opens the circuit again
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # a successful probe closes it
+    breaker.retry_after()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["calls"] == 0
+
+
+def test_circuit_breaker_single_probe():
+    breaker = CircuitBreaker(failure_threshold=0.5, min_calls=1, recovery_timeout=60)
+    breaker.record_failure()
+    breaker._opened_at -= 60
+
+    assert breaker.retry_after() == 0
+    # only one probe at a time
+    assert breaker.retry_after() > 0
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from picketapi.coalesce import AsyncSingleFlight, SingleFlight
+
+
+def wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_single_flight():
+    single_flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        # wait until every other caller has joined the in-flight call
+        wait_for(lambda: single_flight.coalesced == 4)
+        return "result"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do("key", fn)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert single_flight.stats() == {"calls": 5, "coalesced": 4}
+
+    # later calls are not coalesced with finished ones
+    assert single_flight.do("key", lambda: "again") == "again"
+
+
+def test_single_flight_exception():
+    single_flight = SingleFlight()
+    errors = []
+
+    def fn():
+        wait_for(lambda: single_flight.coalesced == 1)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            single_flight.do("key", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+
+def test_async_single_flight():
+    single_flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(
+            *(single_flight.do("key", fn) for _ in range(5)),
+            single_flight.do("other", fn),
+        )
+
+    assert asyncio.run(run()) == ["result"] * 6
+    assert len(calls) == 2
+    assert single_flight.stats() == {"calls": 6, "coalesced": 4}
+
+
+def test_async_single_flight_exception():
+    single_flight = AsyncSingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            *(single_flight.do("key", fn) for _ in range(2)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], ValueError)
+    assert results[0] is results[1]
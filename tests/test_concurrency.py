@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from picketapi.concurrency import AdaptiveConcurrencyLimiter
+
+
+def fill(limiter: AdaptiveConcurrencyLimiter):
+    while limiter.in_flight < limiter.limit:
+        assert limiter.acquire(0)
+
+
+def test_limiter_additive_increase():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4)
+    fill(limiter)
+
+    # about one increase per limit successful requests
+    for _ in range(3):
+        limiter.release(0.01)
+        assert limiter.acquire(0)
+    assert limiter.limit == 3
+
+    for _ in range(20):
+        fill(limiter)
+        limiter.release(0.01)
+    assert limiter.limit == 4
+    assert limiter.stats()["increases"] == 2
+
+
+def test_limiter_only_grows_in_use():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    for _ in range(20):
+        assert limiter.acquire(0)
+        limiter.release(0.01)
+    assert limiter.limit == 4
+
+
+def test_limiter_multiplicative_decrease():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16, backoff=0.5, min_limit=2)
+    fill(limiter)
+
+    limiter.release(0.01, overloaded=True)
+    assert limiter.limit == 8
+    # overloads reported within a round trip of the decrease are ignored
+    limiter.release(0.01, overloaded=True)
+    assert limiter.limit == 8
+
+    for _ in range(3):
+        time.sleep(0.02)
+        limiter.release(0.01, overloaded=True)
+    assert limiter.limit == 2
+    assert limiter.stats()["decreases"] == 3
+
+
+def test_limiter_latency_increase():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, backoff=0.5)
+    fill(limiter)
+    for _ in range(5):
+        limiter.release(0.01)
+    # much slower than the smoothed latency
+    limiter.release(0.1)
+    assert limiter.limit == 5
+
+
+def test_limiter_queue():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(0.01)
+    assert limiter.queue_depth == 0
+
+    acquired = []
+
+    def wait():
+        acquired.append(limiter.acquire(5))
+
+    threads = [threading.Thread(target=wait) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while limiter.queue_depth < 2:
+        time.sleep(0.001)
+    assert limiter.stats()["queue_depth"] == 2
+
+    limiter.release()
+    limiter.release()
+    for thread in threads:
+        thread.join()
+    assert acquired == [True, True]
+    assert limiter.in_flight == 1
+    assert limiter.queue_depth == 0
+
+    text = limiter.prometheus()
+    assert "picket_concurrency_limit 1\n" in text
+    assert "picket_in_flight_requests 1\n" in text
+    assert "picket_queue_depth 0\n" in text
+
+
+def test_limiter_async():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+
+    async def run():
+        assert await limiter.acquire_async()
+        assert not await limiter.acquire_async(0.01)
+
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        cancelled = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 2
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert limiter.queue_depth == 1
+
+        limiter.release(0.01)
+        assert await waiter
+        assert limiter.in_flight == 1
+        limiter.release(0.01)
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
@@ -18,3 +18,17 @@ def test_picket_api_exception_str():
     code = "code"
     exception = exceptions.PicketAPIException(msg, code)
     assert str(exception) == msg
+
+
+def test_picket_api_exception_status_code():
+    exception = exceptions.PicketAPIException("msg", "code")
+    assert exception.status_code is None
+
+    exception = exceptions.PicketAPIException("msg", "code", 400)
+    assert exception.status_code == 400
+
+
+def test_circuit_open_error():
+    exception = exceptions.CircuitOpenError(1.5)
+    assert exception.retry_after == 1.5
+    assert "1.5s" in str(exception)
@@ -0,0 +1,49 @@
+from picketapi.hedge import HedgePolicy
+
+
+def test_hedge_policy_fixed_delay():
+    policy = HedgePolicy(delay=0.05)
+    assert policy.hedge_delay("validate") == 0.05
+
+
+def test_hedge_policy_adaptive_delay():
+    policy = HedgePolicy(percentile=0.9, min_samples=10, min_delay=0.001)
+    assert policy.hedge_delay("validate") is None
+
+    for _ in range(9):
+        policy.observe("validate", 0.02)
+    assert policy.hedge_delay("validate") is None
+
+    policy.observe("validate", 0.02)
+    delay = policy.hedge_delay("validate")
+    assert 0.01 <= delay <= 0.025
+    # other endpoints have their own latency
+    assert policy.hedge_delay("tokenOwnership") is None
+
+    fast = HedgePolicy(min_samples=1, min_delay=0.005)
+    fast.observe("validate", 0.0001)
+    assert fast.hedge_delay("validate") == 0.005
+
+
+def test_hedge_policy_max_rate():
+    policy = HedgePolicy(delay=0.01, max_rate=0.1, burst=2)
+
+    policy.started()
+    assert policy.allow()
+    assert policy.allow()
+    assert not policy.allow()
+
+    # a hedge is earned every 10 requests
+    for _ in range(9):
+        policy.started()
+        assert not policy.allow()
+    policy.started()
+    assert policy.allow()
+
+    policy.won()
+    assert policy.stats() == {
+        "requests": 11,
+        "hedges": 3,
+        "hedge_wins": 1,
+        "capped": 10,
+    }
@@ -45,3 +45,71 @@ def test_snake_to_camel_keys_nested():
             },
         },
     }
+
+
+def test_snake_to_camel_keys_lists_and_tuples():
+    d = {
+        "requirements": [{"contract_address": "0x1"}, {"min_token_balance": "1"}],
+        "token_ids": ({"token_id": "1"}, "token_id"),
+    }
+    assert helpers.snake_to_camel_keys(d) == {
+        "requirements": [{"contractAddress": "0x1"}, {"minTokenBalance": "1"}],
+        "tokenIds": ({"tokenId": "1"}, "token_id"),
+    }
+
+
+def test_snake_to_camel_keys_unchanged():
+    d = {"walletAddress": "0x1", "nested": [{"tokenIds": ["1", "2"]}], 1: "one"}
+    assert helpers.snake_to_camel_keys(d) is d
+
+
+def test_snake_to_camel_keys_does_not_modify_input():
+    d = {"wallet_address": "0x1", "nested": {"token_ids": ["1"]}}
+    converted = helpers.snake_to_camel_keys(d)
+    assert converted == {"walletAddress": "0x1", "nested": {"tokenIds": ["1"]}}
+    assert d == {"wallet_address": "0x1", "nested": {"token_ids": ["1"]}}
+
+
+def test_camel_to_snake():
+    assert helpers.camel_to_snake("snakeToCamel") == "snake_to_camel"
+    assert helpers.camel_to_snake("walletAddress") == "wallet_address"
+    assert helpers.camel_to_snake("wallet_address") == "wallet_address"
+    assert helpers.camel_to_snake("tokenIds") == "token_ids"
+
+
+def test_camel_to_snake_keys():
+    d = {"accessToken": "xxx", "user": {"tokenBalances": {"0x1": {"1": "1"}}}}
+    assert helpers.camel_to_snake_keys(d) == {
+        "access_token": "xxx",
+        "user": {"token_balances": {"0x1": {"1": "1"}}},
+    }
+    assert helpers.snake_to_camel_keys(helpers.camel_to_snake_keys(d)) == d
+
+
+def test_canonical_hash():
+    a = {"contract_address": "0x1", "min_token_balance": "1"}
+    b = {"minTokenBalance": "1", "contractAddress": "0x1"}
+    assert helpers.canonical_hash(a) == helpers.canonical_hash(b)
+    assert helpers.canonical_hash(a) != helpers.canonical_hash({})
+
+
+def test_token_expiry():
+    # {"alg": "none"}.{"exp": 1700000000}.
+    token = "eyJhbGciOiJub25lIn0.eyJleHAiOjE3MDAwMDAwMDB9."
+    assert helpers.token_expiry(token) == 1700000000
+    assert helpers.token_expiry("xxx.yyy.zzz") is None
+    assert helpers.token_expiry("not a jwt") is None
+
+
+def test_endpoint_name():
+    assert helpers.endpoint_name("auth/validate") == "auth/validate"
+    path = "chains/solana/wallets/wallet/tokenOwnership"
+    assert helpers.endpoint_name(path) == "tokenOwnership"
+
+
+def test_parse_retry_after():
+    assert helpers.parse_retry_after("3") == 3
+    assert helpers.parse_retry_after("-1") == 0
+    assert helpers.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert helpers.parse_retry_after("soon") is None
+    assert helpers.parse_retry_after(None) is None
@@ -0,0 +1,64 @@
+from picketapi.metrics import Histogram, Metrics, RequestEvent
+
+
+def test_histogram_percentile():
+    histogram = Histogram(buckets=(1, 2, 3, 4))
+    assert histogram.percentile(0.5) is None
+
+    for value in (0.5, 1.5, 2.5, 3.5):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == 8
+    assert histogram.percentile(0.5) == 2
+    assert histogram.percentile(1) == 4
+
+    # values past the last bucket report the last bound
+    histogram.observe(10)
+    assert histogram.percentile(1) == 4
+
+
+def test_histogram_snapshot():
+    histogram = Histogram()
+    for _ in range(100):
+        histogram.observe(0.02)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 100
+    assert 0.01 <= snapshot["p50"] <= 0.025
+    assert 0.01 <= snapshot["p99"] <= 0.025
+
+
+def test_request_event_timings():
+    event = RequestEvent("auth/validate", transform=0.1)
+    event.add_timing("connect", 0.2)
+    event.add_timing("connect", 0.3)
+    assert event.connect == 0.5
+
+    event.reset_timings()
+    assert event.connect is None
+    assert event.transform == 0.1
+
+
+def test_metrics():
+    metrics = Metrics()
+    metrics(RequestEvent("auth/validate", status_code=200, total=0.02, ttfb=0.01))
+    metrics(RequestEvent("auth/validate", status_code=400, total=0.03))
+    metrics(RequestEvent("authz", total=1))
+
+    snapshot = metrics.snapshot()
+    assert sorted(snapshot) == ["auth/validate", "authz"]
+    assert snapshot["auth/validate"]["count"] == 2
+
+    text = metrics.prometheus()
+    assert 'picket_requests_total{endpoint="auth/validate",status="200"} 1' in text
+    assert 'picket_requests_total{endpoint="authz",status="error"} 1' in text
+    assert (
+        'picket_request_duration_seconds_bucket{endpoint="auth/validate",le="+Inf"} 2'
+        in text
+    )
+    assert 'picket_request_duration_seconds_count{endpoint="authz"} 1' in text
+    assert (
+        'picket_request_phase_seconds_count{endpoint="auth/validate",phase="ttfb"} 1'
+        in text
+    )
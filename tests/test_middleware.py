@@ -0,0 +1,225 @@
+import asyncio
+import json
+
+import pytest
+
+from picketapi import Picket
+from picketapi.middleware import (
+    PicketASGIMiddleware,
+    PicketWSGIMiddleware,
+    RouteMetrics,
+    bearer_token,
+)
+from picketapi.transport import FakeTransport
+
+
+def user_data(access_token: str) -> dict:
+    return {
+        "chain": "ethereum",
+        "walletAddress": access_token,
+        "displayAddress": access_token,
+        "tokenBalances": {},
+    }
+
+
+def validate_route(body):
+    if body["accessToken"] == "bad":
+        return 401, {"msg": "invalid token", "code": "INVALID_TOKEN"}
+    if body["accessToken"] == "down":
+        return 503, {"msg": "unavailable", "code": "UNAVAILABLE"}
+    if body["requirements"] and body["accessToken"] != "holder":
+        return 403, {"msg": "requirements not met", "code": "FORBIDDEN"}
+    return user_data(body["accessToken"])
+
+
+def wsgi_app(environ, start_response):
+    user = environ.get("picket.user")
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [(user.wallet_address if user else "anonymous").encode("utf-8")]
+
+
+def call_wsgi(app, path: str, authorization=None):
+    environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET"}
+    if authorization is not None:
+        environ["HTTP_AUTHORIZATION"] = authorization
+    started = {}
+
+    def start_response(status, headers):
+        started["status"] = status
+        started["headers"] = dict(headers)
+
+    body = b"".join(app(environ, start_response))
+    return started["status"], started["headers"], body
+
+
+def test_bearer_token():
+    assert bearer_token("Bearer xxx.yyy.zzz") == "xxx.yyy.zzz"
+    assert bearer_token("bearer  xxx.yyy.zzz ") == "xxx.yyy.zzz"
+    assert bearer_token("Basic abc") is None
+    assert bearer_token("Bearer ") is None
+    assert bearer_token(None) is None
+
+
+def test_wsgi_middleware():
+    transport = FakeTransport({"auth/validate": validate_route})
+    app = PicketWSGIMiddleware(
+        wsgi_app,
+        "api_key",
+        routes={
+            "/health": None,
+            "/holders": {"contractAddress": "0xContract"},
+        },
+        transport=transport,
+    )
+    assert app.picket.validate_cache is not None
+    assert app.picket.coalesce_requests
+
+    status, _, body = call_wsgi(app, "/health")
+    assert status == "200 OK"
+    assert body == b"anonymous"
+
+    status, headers, body = call_wsgi(app, "/profile")
+    assert status == "401 Unauthorized"
+    assert headers["WWW-Authenticate"] == "Bearer"
+    assert json.loads(body)["code"] == "MISSING_ACCESS_TOKEN"
+
+    for _ in range(3):
+        status, _, body = call_wsgi(app, "/profile", "Bearer alice")
+        assert status == "200 OK"
+        assert body == b"alice"
+    assert len(transport.calls) == 1
+
+    status, _, body = call_wsgi(app, "/profile", "Bearer bad")
+    assert status == "401 Unauthorized"
+    assert json.loads(body) == {"msg": "invalid token", "code": "INVALID_TOKEN"}
+
+    # per-route requirements
+    status, _, body = call_wsgi(app, "/holders/1", "Bearer alice")
+    assert status == "403 Forbidden"
+    status, _, body = call_wsgi(app, "/holders/1", "Bearer holder")
+    assert status == "200 OK"
+    assert transport.calls[-1][1]["requirements"] == {"contractAddress": "0xContract"}
+
+    # Picket API errors are not passed on to the client
+    status, _, body = call_wsgi(app, "/profile", "Bearer down")
+    assert status == "503 Service Unavailable"
+
+    snapshot = app.metrics.snapshot()
+    assert snapshot["*"]["outcomes"] == {
+        "error": 1,
+        "hit": 2,
+        "miss": 1,
+        "missing": 1,
+        "rejected": 1,
+    }
+    assert snapshot["*"]["cache_hit_ratio"] == pytest.approx(2 / 3)
+    assert snapshot["/holders"]["outcomes"] == {"miss": 1, "rejected": 1}
+    assert "/health" not in snapshot
+
+    # each request looks up the validate cache once
+    stats = app.picket.validate_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 5)
+
+
+def test_wsgi_middleware_client():
+    picket = Picket("api_key", transport=FakeTransport({"auth/validate": user_data}))
+    metrics = RouteMetrics()
+    app = PicketWSGIMiddleware(wsgi_app, picket, metrics=metrics)
+    assert app.picket is picket
+    assert app.metrics is metrics
+
+    transport = picket.transport
+    transport.routes["auth/validate"] = lambda body: user_data(body["accessToken"])
+    status, _, body = call_wsgi(app, "/", "Bearer alice")
+    assert body == b"alice"
+
+    text = metrics.prometheus()
+    assert 'picket_middleware_requests_total{route="*",outcome="miss"} 1' in text
+    assert "picket_middleware_validate_duration_seconds_count" in text
+
+
+async def asgi_app(scope, receive, send):
+    user = scope.get("picket.user")
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.accept"})
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    body = (user.wallet_address if user else "anonymous").encode("utf-8")
+    await send({"type": "http.response.body", "body": body})
+
+
+async def call_asgi(app, path: str, authorization=None, type="http"):
+    headers = []
+    if authorization is not None:
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    scope = {"type": type, "path": path, "headers": headers}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages
+
+
+def test_asgi_middleware():
+    httpx = pytest.importorskip("httpx")
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        body = json.loads(request.content)
+        status, data = 200, validate_route(body)
+        if isinstance(data, tuple):
+            status, data = data
+        return httpx.Response(status, json=data)
+
+    async def run():
+        app = PicketASGIMiddleware(
+            asgi_app, "api_key", routes={"/public": None}, requirements={}
+        )
+        app.picket._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        messages = await call_asgi(app, "/public")
+        assert messages[1]["body"] == b"anonymous"
+
+        for _ in range(2):
+            messages = await call_asgi(app, "/me", "Bearer alice")
+            assert messages[0]["status"] == 200
+            assert messages[1]["body"] == b"alice"
+
+        messages = await call_asgi(app, "/me", "Bearer bad")
+        assert messages[0]["status"] == 401
+        assert (b"www-authenticate", b"Bearer") in messages[0]["headers"]
+        assert json.loads(messages[1]["body"])["code"] == "INVALID_TOKEN"
+
+        messages = await call_asgi(app, "/me")
+        assert messages[0]["status"] == 401
+
+        # websockets are closed before they are accepted
+        messages = await call_asgi(app, "/ws", type="websocket")
+        assert messages == [{"type": "websocket.close", "code": 1008}]
+        messages = await call_asgi(app, "/ws", "Bearer alice", type="websocket")
+        assert messages == [{"type": "websocket.accept"}]
+
+        # lifespan events are passed through
+        received = []
+
+        async def lifespan_app(scope, receive, send):
+            received.append(scope["type"])
+
+        await PicketASGIMiddleware(lifespan_app, app.picket)(
+            {"type": "lifespan"}, None, None
+        )
+        assert received == ["lifespan"]
+        return app
+
+    app = asyncio.run(run())
+    assert len(calls) == 2
+    outcomes = app.metrics.snapshot()["*"]["outcomes"]
+    assert outcomes == {"hit": 2, "miss": 1, "missing": 2, "rejected": 1}
+    stats = app.picket.validate_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
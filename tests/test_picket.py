@@ -1,14 +1,33 @@
 import base64
+import http.server
+import itertools
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+import requests
 import responses
 from responses import matchers
 
 from picketapi import Picket
 from picketapi import types
-from picketapi.exceptions import PicketAPIException
+from picketapi.cache import CacheBackend, SQLiteCache
+from picketapi.concurrency import AdaptiveConcurrencyLimiter
+from picketapi.transport import FakeTransport
+from picketapi.circuit_breaker import CircuitBreaker
+from picketapi.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    PicketAPIException,
+)
+from picketapi.retry import RetryPolicy
+from picketapi.hedge import HedgePolicy
 from picketapi.helpers import snake_to_camel_keys
 
+SECRET = "s" * 32
+
 
 def test_picket():
     assert Picket is not None
@@ -431,3 +450,1261 @@ def test_picket_unknown_error(picket):
         picket.authz(**req_data)
 
     assert str(e.value) == resp_data
+
+
+def test_picket_pool_config():
+    picket = Picket("api_key", pool_connections=2, pool_maxsize=20, pool_block=True)
+    session = picket.transport._acquire_session()
+    picket.transport._release_session()
+
+    adapter = session.get_adapter(picket.base_url)
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 20
+    assert adapter.poolmanager.connection_pool_kw["block"] is True
+    assert adapter._pool_connections == 2
+
+
+@responses.activate
+def test_picket_session_reused(picket):
+    path = "path"
+    responses.add(
+        responses.POST, os.path.join(picket.base_url, path), json={}, status=200
+    )
+
+    picket.post_request(path)
+    session = picket.transport._session
+    assert session is not None
+
+    picket.post_request(path)
+    assert picket.transport._session is session
+
+
+@responses.activate
+def test_picket_session_idle_eviction():
+    picket = Picket("api_key", pool_idle_timeout=60)
+    path = "path"
+    responses.add(
+        responses.POST, os.path.join(picket.base_url, path), json={}, status=200
+    )
+
+    picket.post_request(path)
+    session = picket.transport._session
+    # pretend the pool has been idle past the timeout
+    picket.transport._last_used -= 120
+
+    picket.post_request(path)
+    assert picket.transport._session is not session
+
+
+def test_picket_close():
+    with Picket("api_key") as picket:
+        picket.transport._acquire_session()
+        picket.transport._release_session()
+        assert picket.transport._session is not None
+
+    assert picket.transport._session is None
+
+
+@responses.activate
+def test_picket_validate_locally():
+    jwt = pytest.importorskip("jwt")
+    picket = Picket("api_key", verification_key=SECRET, token_algorithms=["HS256"])
+    claims = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {"contractAddress": {"0x12345": "1"}},
+        "exp": 9999999999,
+    }
+    token = jwt.encode(claims, SECRET, algorithm="HS256")
+
+    resp = picket.validate(token)
+
+    assert type(resp) == types.AuthorizedUser
+    assert resp.wallet_address == claims["walletAddress"]
+    assert resp.token_balances == claims["tokenBalances"]
+    assert len(responses.calls) == 0
+
+
+@responses.activate
+def test_picket_validate_locally_fallback():
+    jwt = pytest.importorskip("jwt")
+    picket = Picket("api_key", verification_key=SECRET, token_algorithms=["HS256"])
+    resp_data = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {},
+    }
+    responses.add(
+        responses.POST,
+        os.path.join(picket.base_url, "auth/validate"),
+        json=resp_data,
+        status=200,
+    )
+    token = jwt.encode(dict(resp_data, exp=9999999999), SECRET, algorithm="HS256")
+
+    # requirements are checked by the API
+    picket.validate(token, requirements={"contractAddress": "0xContract"})
+    assert len(responses.calls) == 1
+
+    # revalidate always calls the API
+    picket.validate(token, revalidate=True)
+    assert len(responses.calls) == 2
+
+    # invalid tokens get the API's error
+    picket.validate(jwt.encode(resp_data, "o" * 32, algorithm="HS256"))
+    assert len(responses.calls) == 3
+
+
+def validate_token(exp: int) -> str:
+    claims = base64.urlsafe_b64encode(f'{{"exp":{exp}}}'.encode("utf-8"))
+    return "xxx." + claims.decode("utf-8").rstrip("=") + ".zzz"
+
+
+@responses.activate
+def test_picket_validate_cache():
+    picket = Picket("api_key", validate_cache_ttl=60, validate_cache_size=10)
+    resp_data = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {},
+    }
+    responses.add(
+        responses.POST,
+        os.path.join(picket.base_url, "auth/validate"),
+        json=resp_data,
+        status=200,
+    )
+    token = validate_token(9999999999)
+    requirements = {"contractAddress": "0xContract", "minTokenBalance": "1"}
+
+    user = picket.validate(token, requirements=requirements)
+    # same requirements in a different order hit the cache
+    assert (
+        picket.validate(
+            token,
+            requirements={"minTokenBalance": "1", "contractAddress": "0xContract"},
+        )
+        is user
+    )
+    assert len(responses.calls) == 1
+    assert picket.validate_cache.hits == 1
+
+    # different requirements miss
+    picket.validate(token)
+    assert len(responses.calls) == 2
+
+    # revalidate skips the cache
+    picket.validate(token, requirements=requirements, revalidate=True)
+    assert len(responses.calls) == 3
+
+    picket.invalidate(token)
+    picket.validate(token, requirements=requirements)
+    assert len(responses.calls) == 4
+
+
+@responses.activate
+def test_picket_validate_cache_token_expiry():
+    picket = Picket("api_key", validate_cache_ttl=60)
+    resp_data = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {},
+    }
+    responses.add(
+        responses.POST,
+        os.path.join(picket.base_url, "auth/validate"),
+        json=resp_data,
+        status=200,
+    )
+    # expired tokens are never cached
+    token = validate_token(1)
+
+    picket.validate(token)
+    picket.validate(token)
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_picket_shared_validate_cache(tmp_path):
+    # two clients, e.g. in different worker processes, sharing one cache file
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    pickets = [Picket("api_key", validate_cache=cache) for _ in range(2)]
+    resp_data = {
+        "chain": "chain",
+        "walletAddress": "wallet_address",
+        "displayAddress": "display_address",
+        "tokenBalances": {"0xContract": {"1": "1"}},
+    }
+    responses.add(
+        responses.POST,
+        os.path.join(pickets[0].base_url, "auth/validate"),
+        json=resp_data,
+        status=200,
+    )
+    token = validate_token(9999999999)
+
+    user = pickets[0].validate(token)
+    assert pickets[1].validate(token) == user
+    assert len(responses.calls) == 1
+
+    pickets[1].invalidate(token)
+    pickets[0].validate(token)
+    assert len(responses.calls) == 2
+
+
+def token_ownership_callback(request):
+    wallet_address = request.url.split("/")[-2]
+    if wallet_address == "bad":
+        return (400, {}, '{"msg": "invalid wallet", "code": "code"}')
+    body = '{"allowed": true, "tokenBalances": {"wallet": {"%s": "1"}}}'
+    return (200, {}, body % wallet_address)
+
+
+@responses.activate
+def test_picket_token_ownership_many(picket):
+    responses.add_callback(
+        responses.POST,
+        re.compile(r".*/tokenOwnership"),
+        callback=token_ownership_callback,
+        content_type="application/json",
+    )
+    requirements = {"contractAddress": "0xContract"}
+    items = [
+        ("solana", "a", requirements),
+        ("solana", "bad", requirements),
+        ("solana", "b", requirements),
+        # duplicate of the first item
+        ("solana", "a", {"contract_address": "0xContract"}),
+    ]
+
+    results = picket.token_ownership_many(items, max_workers=2)
+
+    assert len(results) == 4
+    assert results[0].token_balances == {"wallet": {"a": "1"}}
+    assert isinstance(results[1], PicketAPIException)
+    assert results[1].msg == "invalid wallet"
+    assert results[2].token_balances == {"wallet": {"b": "1"}}
+    assert results[3] is results[0]
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_picket_token_ownership_as_completed(picket):
+    responses.add_callback(
+        responses.POST,
+        re.compile(r".*/tokenOwnership"),
+        callback=token_ownership_callback,
+        content_type="application/json",
+    )
+    items = [("solana", str(i), {}) for i in range(10)]
+
+    results = dict(picket.token_ownership_as_completed(iter(items)))
+
+    assert sorted(results) == list(range(10))
+    for idx, result in results.items():
+        assert result.token_balances == {"wallet": {str(idx): "1"}}
+
+
+def test_picket_token_ownership_as_completed_closed_early():
+    transport = FakeTransport(
+        {"tokenOwnership": {"allowed": True, "tokenBalances": {}}}, latency=0.05
+    )
+    picket = Picket("api_key", transport=transport)
+    items = (("solana", str(i), {}) for i in range(400))
+
+    results = picket.token_ownership_as_completed(items, max_workers=4)
+    start = time.perf_counter()
+    next(results)
+    results.close()
+    assert time.perf_counter() - start < 0.3
+    assert len(transport.calls) <= 8
+
+
+@responses.activate
+def test_picket_coalesce_requests():
+    picket = Picket("api_key", coalesce_requests=True)
+
+    def callback(request):
+        # hold the request open until the other callers have joined it
+        deadline = time.monotonic() + 2
+        while picket.single_flight.coalesced < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return (400, {}, '{"msg": "message", "code": "code"}')
+
+    responses.add_callback(
+        responses.POST,
+        os.path.join(picket.base_url, "auth/validate"),
+        callback=callback,
+        content_type="application/json",
+    )
+
+    errors = []
+
+    def validate():
+        try:
+            picket.validate("xxx.yyy.zzz", requirements={"contractAddress": "0x1"})
+        except PicketAPIException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=validate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses.calls) == 1
+    assert len(errors) == 4
+    assert all(e.code == "code" for e in errors)
+    assert picket.single_flight.stats() == {"calls": 4, "coalesced": 3}
+
+
+def test_picket_coalesce_requests_build():
+    user = {
+        "chain": "ethereum",
+        "walletAddress": "0x1",
+        "displayAddress": "0x1",
+        "tokenBalances": {},
+    }
+    transport = FakeTransport({"auth/validate": user}, latency=0.05)
+    picket = Picket("api_key", transport=transport, coalesce_requests=True)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        raw = executor.submit(
+            picket.post_request, "auth/validate", access_token="t", requirements={}
+        )
+        validated = executor.submit(picket.validate, "t")
+        # callers asking for different result types do not share a request
+        assert raw.result() == user
+        assert isinstance(validated.result(), types.AuthorizedUser)
+    assert len(transport.calls) == 2
+
+
+@pytest.fixture
+def retrying_picket():
+    return Picket("api_key", retry_policy=RetryPolicy(max_retries=2, backoff_base=0))
+
+
+@responses.activate
+def test_picket_retry(retrying_picket):
+    url = os.path.join(retrying_picket.base_url, "auth/nonce")
+    responses.add(responses.POST, url, json={"msg": "unavailable"}, status=503)
+    responses.add(
+        responses.POST,
+        url,
+        body=requests.ConnectionError("connection reset"),
+    )
+    responses.add(
+        responses.POST,
+        url,
+        json={"nonce": "nonce", "statement": "statement", "format": "format"},
+        status=200,
+    )
+
+    resp = retrying_picket.nonce("chain", "wallet_address")
+    assert resp.nonce == "nonce"
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_picket_retry_exhausted(retrying_picket):
+    url = os.path.join(retrying_picket.base_url, "auth/validate")
+    responses.add(
+        responses.POST, url, json={"msg": "unavailable", "code": "code"}, status=503
+    )
+
+    with pytest.raises(PicketAPIException) as e:
+        retrying_picket.validate("xxx.yyy.zzz")
+
+    assert e.value.status_code == 503
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_picket_no_retry_non_idempotent(retrying_picket):
+    url = os.path.join(retrying_picket.base_url, "authz")
+    responses.add(responses.POST, url, json={"msg": "unavailable"}, status=503)
+
+    with pytest.raises(PicketAPIException):
+        retrying_picket.authz("xxx.yyy.zzz", requirements={})
+
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_picket_timeout():
+    picket = Picket("api_key", timeout=(1, 2))
+    url = os.path.join(picket.base_url, "auth/validate")
+    responses.add(responses.POST, url, json={}, status=200)
+
+    picket.post_request("auth/validate")
+    assert responses.calls[0].request.req_kwargs["timeout"] == (1, 2)
+
+    picket.request("auth/validate", {}, timeout=(3, 4))
+    assert responses.calls[1].request.req_kwargs["timeout"] == (3, 4)
+
+    # per-attempt timeouts are clipped to the deadline
+    picket.request("auth/validate", {}, deadline=0.5)
+    connect, read = responses.calls[2].request.req_kwargs["timeout"]
+    assert connect <= 0.5 and read <= 0.5
+
+
+@responses.activate
+def test_picket_deadline():
+    picket = Picket(
+        "api_key",
+        retry_policy=RetryPolicy(backoff_base=1, jitter=False),
+        deadline=0.5,
+    )
+    url = os.path.join(picket.base_url, "auth/validate")
+    responses.add(responses.POST, url, json={"msg": "unavailable"}, status=503)
+
+    # the backoff would run past the deadline, so the request is not retried
+    with pytest.raises(PicketAPIException):
+        picket.validate("xxx.yyy.zzz")
+    assert len(responses.calls) == 1
+
+    with pytest.raises(DeadlineExceededError):
+        picket.attempt_timeout(None, time.monotonic() - 1)
+
+
+@responses.activate
+def test_picket_circuit_breaker():
+    picket = Picket(
+        "api_key",
+        retry_policy=RetryPolicy(max_retries=0),
+        circuit_breaker=CircuitBreaker(min_calls=2, recovery_timeout=60),
+    )
+    url = os.path.join(picket.base_url, "auth/validate")
+    responses.add(responses.POST, url, json={"msg": "unavailable"}, status=503)
+
+    for _ in range(2):
+        with pytest.raises(PicketAPIException):
+            picket.validate("xxx.yyy.zzz")
+
+    with pytest.raises(CircuitOpenError):
+        picket.validate("xxx.yyy.zzz")
+    assert len(responses.calls) == 2
+
+
+def test_picket_rate_limiter_shared():
+    a = Picket("test_picket_rate_limiter_shared", rate_limit=10)
+    b = Picket("test_picket_rate_limiter_shared", rate_limit=10)
+    assert a.rate_limiter is not None
+    assert a.rate_limiter is b.rate_limiter
+
+
+@responses.activate
+def test_picket_rate_limited():
+    picket = Picket(
+        "test_picket_rate_limited",
+        rate_limit=100,
+        retry_policy=RetryPolicy(backoff_base=0),
+    )
+    url = os.path.join(picket.base_url, "auth/validate")
+    responses.add(
+        responses.POST,
+        url,
+        json={"msg": "too many requests"},
+        status=429,
+        headers={"Retry-After": "0.05"},
+    )
+    responses.add(
+        responses.POST,
+        url,
+        json={
+            "chain": "chain",
+            "walletAddress": "wallet_address",
+            "displayAddress": "display_address",
+            "tokenBalances": {},
+        },
+        status=200,
+    )
+
+    start = time.monotonic()
+    picket.validate("xxx.yyy.zzz")
+
+    # the retry waited for Retry-After and the limiter slowed down
+    assert time.monotonic() - start >= 0.05
+    assert len(responses.calls) == 2
+    assert picket.rate_limiter.stats()["global"] < 100
+
+
+@responses.activate
+def test_picket_hooks():
+    events = []
+    picket = Picket("api_key", hooks=[events.append], collect_metrics=True)
+    url = os.path.join(picket.base_url, "auth/nonce")
+    responses.add(
+        responses.POST,
+        url,
+        json={"nonce": "nonce", "statement": "statement", "format": "format"},
+    )
+    responses.add(
+        responses.POST, url, json={"msg": "message", "code": "code"}, status=400
+    )
+
+    picket.nonce("chain", "wallet_address")
+    with pytest.raises(PicketAPIException):
+        picket.nonce("chain", "wallet_address")
+
+    assert len(events) == 2
+    event = events[0]
+    assert event.endpoint == "auth/nonce"
+    assert event.status_code == 200
+    assert event.attempts == 1
+    for phase in ("total", "transform", "ttfb", "body_read", "json_decode", "build"):
+        assert getattr(event, phase) >= 0
+
+    event = events[1]
+    assert event.status_code == 400
+    assert event.error_code == "code"
+    assert isinstance(event.error, PicketAPIException)
+
+    assert picket.metrics.snapshot()["auth/nonce"]["count"] == 2
+
+
+@responses.activate
+def test_picket_hook_error(picket):
+    responses.add(responses.POST, os.path.join(picket.base_url, "path"), json={})
+
+    def hook(event):
+        raise ValueError("broken hook")
+
+    picket.add_hook(hook)
+    # hook errors never break requests
+    assert picket.post_request("path") == {}
+    picket.remove_hook(hook)
+    assert picket.hooks == []
+
+
+def test_picket_connection_timings():
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    events = []
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        with Picket("api_key", base_url=base_url, hooks=[events.append]) as picket:
+            picket.post_request("path")
+            picket.post_request("path")
+    finally:
+        server.shutdown()
+
+    # the first call opens a connection, the second reuses it
+    assert events[0].acquire >= 0
+    assert events[0].connect > 0
+    assert events[1].connect is None
+    # plain HTTP has no TLS handshake
+    assert events[0].tls is None
+
+
+@responses.activate
+def test_picket_token_ownership_cache():
+    picket = Picket("api_key", token_ownership_cache_ttl=60)
+    responses.add_callback(
+        responses.POST,
+        re.compile(r".*/tokenOwnership"),
+        callback=token_ownership_callback,
+    )
+
+    resp = picket.token_ownesrhip("ethereum", "a", requirements={"collection": "c"})
+    assert (
+        picket.token_ownesrhip("ethereum", "a", requirements={"collection": "c"})
+        is resp
+    )
+    assert len(responses.calls) == 1
+
+    # different requirements or wallets miss
+    picket.token_ownesrhip("ethereum", "a")
+    picket.token_ownesrhip("ethereum", "b", requirements={"collection": "c"})
+    assert len(responses.calls) == 3
+
+    # errors are not cached
+    for _ in range(2):
+        with pytest.raises(PicketAPIException):
+            picket.token_ownesrhip("ethereum", "bad")
+    assert len(responses.calls) == 5
+
+    picket.invalidate_token_ownership("ethereum", "a")
+    picket.token_ownesrhip("ethereum", "a", requirements={"collection": "c"})
+    assert len(responses.calls) == 6
+
+
+@responses.activate
+def test_picket_local_requirement_evaluation():
+    picket = Picket("api_key", requirement_staleness=30)
+    user_data = {
+        "chain": "ethereum",
+        "walletAddress": "0x1",
+        "displayAddress": "0x1",
+        "tokenBalances": {"0xContract": {"1": "3"}},
+    }
+    responses.add(
+        responses.POST,
+        os.path.join(picket.base_url, "auth/validate"),
+        json=user_data,
+        status=200,
+    )
+    responses.add_callback(
+        responses.POST,
+        re.compile(r".*/tokenOwnership"),
+        callback=token_ownership_callback,
+    )
+    token = validate_token(9999999999)
+
+    user = picket.validate(token, requirements={"contractAddress": "0xContract"})
+    assert len(responses.calls) == 1
+
+    # a different minTokenBalance is answered from the balances above
+    requirements = {"contractAddress": "0xContract", "minTokenBalance": "2"}
+    assert picket.validate(token, requirements=requirements) == user
+    resp = picket.token_ownesrhip("ethereum", "0x1", requirements=requirements)
+    assert resp.allowed is True
+    assert resp.token_balances == {"0xContract": {"1": "3"}}
+    resp = picket.token_ownesrhip(
+        "ethereum",
+        "0x1",
+        requirements={"contractAddress": "0xContract", "minTokenBalance": "5"},
+    )
+    assert resp.allowed is False
+    assert len(responses.calls) == 1
+
+    # unmet requirements and unknown contracts ask the Picket API
+    picket.validate(
+        token, requirements={"contractAddress": "0xContract", "minTokenBalance": "5"}
+    )
+    picket.validate(token, requirements={"contractAddress": "0xOther"})
+    picket.token_ownesrhip(
+        "ethereum", "0x1", requirements={"contractAddress": "0xOther"}
+    )
+    assert len(responses.calls) == 4
+    assert picket.evaluator.stats() == {"decided": 4, "undecidable": 2}
+
+
+def test_picket_local_requirement_evaluation_balances():
+    transport = FakeTransport(
+        {
+            "auth/validate": {
+                "chain": "ethereum",
+                "walletAddress": "0x1",
+                "displayAddress": "0x1",
+                "tokenBalances": {"0xA": {"1": "1"}},
+            },
+            "tokenOwnership": {"allowed": True, "tokenBalances": {"0xB": {"2": "4"}}},
+        }
+    )
+    picket = Picket("api_key", transport=transport, requirement_staleness=30)
+    token = validate_token(9999999999)
+
+    picket.validate(token, requirements={"contractAddress": "0xA"})
+    picket.token_ownesrhip("ethereum", "0x1", requirements={"contractAddress": "0xB"})
+    assert len(transport.calls) == 2
+
+    # answered from the token ownership balances, which the user includes
+    user = picket.validate(token, requirements={"contractAddress": "0xb"})
+    assert len(transport.calls) == 2
+    assert user.token_balances == {"0xA": {"1": "1"}, "0xb": {"2": "4"}}
+
+    # balances that expire after the requirements were evaluated ask the Picket API
+    picket.evaluator.evaluate = lambda *args: True
+    picket.evaluator.balance = lambda *args: None
+    picket.validate(token, requirements={"contractAddress": "0xB"})
+    picket.token_ownesrhip("ethereum", "0x1", requirements={"contractAddress": "0xB"})
+    assert len(transport.calls) == 4
+
+
+def test_picket_local_requirement_evaluation_invalidate():
+    transport = FakeTransport(
+        {
+            "auth/validate": {
+                "chain": "ethereum",
+                "walletAddress": "0x1",
+                "displayAddress": "0x1",
+                "tokenBalances": {"0xA": {"1": "1"}},
+            },
+        }
+    )
+    picket = Picket("api_key", transport=transport, requirement_staleness=30)
+    token = validate_token(9999999999)
+
+    picket.validate(token, requirements={"contractAddress": "0xA"})
+    picket.validate(
+        token, requirements={"contractAddress": "0xA", "minTokenBalance": 1}
+    )
+    assert len(transport.calls) == 1
+
+    # a revoked token is not answered locally
+    picket.invalidate(token)
+    picket.validate(token, requirements={"contractAddress": "0xA"})
+    assert len(transport.calls) == 2
+
+
+def validate_stream_transport(latency: float = 0.0):
+    def validate(body):
+        if body["accessToken"].startswith("bad"):
+            return 401, {"msg": "invalid token", "code": "INVALID_TOKEN"}
+        return {
+            "chain": "ethereum",
+            "walletAddress": body["accessToken"],
+            "displayAddress": body["accessToken"],
+            "tokenBalances": {},
+        }
+
+    return FakeTransport({"auth/validate": validate}, latency=latency)
+
+
+def test_picket_validate_stream():
+    picket = Picket("api_key", transport=validate_stream_transport())
+    tokens = ["a", "bad", "b", "c"]
+
+    results = dict(picket.validate_stream(tokens, concurrency=2))
+    assert set(results) == set(tokens)
+    assert results["a"].wallet_address == "a"
+    assert isinstance(results["bad"], PicketAPIException)
+    assert results["bad"].code == "INVALID_TOKEN"
+
+    assert list(picket.validate_stream([])) == []
+
+
+def test_picket_validate_stream_bounded():
+    transport = validate_stream_transport(latency=0.01)
+    picket = Picket("api_key", transport=transport)
+    read = []
+
+    def tokens():
+        for idx in range(100):
+            read.append(idx)
+            yield str(idx)
+
+    stream = picket.validate_stream(tokens(), concurrency=4)
+    for consumed, _ in enumerate(stream, 1):
+        # a slow consumer
+        time.sleep(0.005)
+        # no more than concurrency tokens are read ahead of the consumer
+        assert len(read) <= consumed + 4
+        if consumed == 10:
+            break
+    stream.close()
+
+    assert len(read) <= 14
+    assert len(transport.calls) <= 14
+
+
+def nonce_transport(latency: float = 0.0):
+    nonces = itertools.count()
+
+    def auth(body):
+        if body["signature"] == "bad":
+            return 401, {"msg": "invalid signature", "code": "INVALID_SIGNATURE"}
+        user = {
+            "chain": body["chain"],
+            "walletAddress": body["walletAddress"],
+            "displayAddress": body["walletAddress"],
+            "tokenBalances": {},
+        }
+        return {"accessToken": "xxx.yyy.zzz", "user": user}
+
+    return FakeTransport(
+        {
+            "auth/nonce": lambda body: {
+                "nonce": str(next(nonces)),
+                "statement": "statement",
+                "format": "siwe",
+            },
+            "auth": auth,
+        },
+        latency=latency,
+    )
+
+
+def test_picket_nonce_cache():
+    transport = nonce_transport()
+    picket = Picket("api_key", transport=transport, nonce_cache_fraction=0.5)
+    assert picket.nonce_cache.ttl == 60
+
+    nonce = picket.nonce("ethereum", "0x1")
+    assert picket.nonce("ethereum", "0x1") is nonce
+    # locale and wallet are part of the key
+    assert picket.nonce("ethereum", "0x1", locale="fr-FR").nonce == "1"
+    assert picket.nonce("ethereum", "0x2").nonce == "2"
+    assert len(transport.calls) == 3
+
+    # successful auth uses it up
+    picket.auth("ethereum", "0x1", "signature")
+    assert picket.nonce("ethereum", "0x1").nonce == "3"
+    assert picket.nonce("ethereum", "0x1", locale="fr-FR").nonce == "4"
+    assert picket.nonce("ethereum", "0x2").nonce == "2"
+
+    # a rejected signature drops the nonce too, it may be stale
+    with pytest.raises(PicketAPIException):
+        picket.auth("ethereum", "0x1", "bad")
+    assert picket.nonce("ethereum", "0x1").nonce == "5"
+    assert picket.nonce("ethereum", "0x2").nonce == "2"
+
+    # transient failures keep it
+    transport.routes["auth"] = (429, {"msg": "too many requests"})
+    with pytest.raises(PicketAPIException):
+        picket.auth("ethereum", "0x1", "signature")
+    assert picket.nonce("ethereum", "0x1").nonce == "5"
+
+
+def test_picket_nonce_cache_coalesced():
+    transport = nonce_transport(latency=0.05)
+    picket = Picket("api_key", transport=transport, nonce_cache_fraction=0.5)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        nonces = list(
+            executor.map(lambda _: picket.nonce("ethereum", "0x1").nonce, range(8))
+        )
+
+    assert nonces == ["0"] * 8
+    assert len([url for url, _ in transport.calls if url.endswith("nonce")]) == 1
+
+
+# DictCache implements only the CacheBackend interface
+class DictCache(CacheBackend):
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+
+    def set(self, key, value, ttl=None, group=None):
+        self.entries[key] = value
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+
+def test_picket_validate_refresh_ahead_custom_backend():
+    transport = FakeTransport(
+        {
+            "auth/validate": {
+                "chain": "ethereum",
+                "walletAddress": "0x1",
+                "displayAddress": "0x1",
+                "tokenBalances": {},
+            }
+        }
+    )
+    picket = Picket(
+        "api_key", transport=transport, validate_cache=DictCache(), refresh_ahead=0.75
+    )
+
+    # entries without any expiry are not refreshed
+    user = picket.validate("xxx.yyy.zzz")
+    assert picket.validate("xxx.yyy.zzz") is user
+    assert len(picket.refresher._refresh_at) == 0
+
+    # entries expire with the access token
+    token = validate_token(9999999999)
+    picket.validate(token)
+    assert len(picket.refresher._refresh_at) == 1
+    assert len(transport.calls) == 2
+
+
+def test_picket_validate_refresh_ahead():
+    revoked = set()
+
+    def validate(body):
+        if body["accessToken"] in revoked:
+            return 401, {"msg": "invalid token", "code": "INVALID_TOKEN"}
+        return {
+            "chain": "ethereum",
+            "walletAddress": body["accessToken"],
+            "displayAddress": body["accessToken"],
+            "tokenBalances": {},
+        }
+
+    transport = FakeTransport({"auth/validate": validate})
+    picket = Picket(
+        "api_key", transport=transport, validate_cache_ttl=0.5, refresh_ahead=0.75
+    )
+
+    user = picket.validate("a")
+    assert picket.validate("a") is user
+    assert len(transport.calls) == 1
+
+    # past 3/4 of the TTL, the cached user is served and renewed in the background
+    time.sleep(0.4)
+    assert picket.validate("a") is user
+    picket.refresher.close()
+    assert len(transport.calls) == 2
+
+    # the renewed entry outlives the original TTL
+    time.sleep(0.15)
+    assert picket.validate("a") == user
+    assert len(transport.calls) == 2
+
+    # a rejected renewal drops the entry
+    revoked.add("a")
+    time.sleep(0.28)
+    assert picket.validate("a") == user
+    picket.refresher.close()
+    with pytest.raises(PicketAPIException):
+        picket.validate("a")
+    assert picket.refresher.stats()["failures"] == 1
+
+
+def test_picket_token_ownership_refresh_ahead():
+    transport = FakeTransport(
+        {"tokenOwnership": {"allowed": True, "tokenBalances": {}}}
+    )
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        token_ownership_cache_ttl=0.5,
+        refresh_ahead=0.75,
+    )
+
+    resp = picket.token_ownesrhip("ethereum", "0x1", requirements={})
+    time.sleep(0.4)
+    assert picket.token_ownesrhip("ethereum", "0x1", requirements={}) is resp
+    picket.close()
+    assert len(transport.calls) == 2
+    assert transport.calls[1][1] == {"requirements": {}}
+
+    time.sleep(0.15)
+    picket.token_ownesrhip("ethereum", "0x1", requirements={})
+    assert len(transport.calls) == 2
+
+
+def negative_cache_transport():
+    def validate(body):
+        token = body["accessToken"]
+        if token == "expired":
+            return 401, {"msg": "token expired", "code": "TOKEN_EXPIRED"}
+        if token == "forged":
+            return 400, {"msg": "invalid token", "code": "INVALID_TOKEN"}
+        if token == "limited":
+            return 429, {"msg": "rate limited", "code": "RATE_LIMITED"}
+        return {
+            "chain": "ethereum",
+            "walletAddress": token,
+            "displayAddress": token,
+            "tokenBalances": {},
+        }
+
+    return FakeTransport({"auth/validate": validate})
+
+
+def test_picket_validate_negative_cache():
+    transport = negative_cache_transport()
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        negative_cache_ttl=60,
+        negative_cache_size=10,
+        retry_policy=RetryPolicy(max_retries=0),
+    )
+
+    for _ in range(3):
+        with pytest.raises(PicketAPIException) as e:
+            picket.validate("expired")
+        assert e.value.msg == "token expired"
+        assert e.value.code == "TOKEN_EXPIRED"
+        assert e.value.status_code == 401
+    assert len(transport.calls) == 1
+
+    # requirements are part of the key
+    with pytest.raises(PicketAPIException):
+        picket.validate("expired", {"contractAddress": "0x1"})
+    assert len(transport.calls) == 2
+
+    # rate limits are not deterministic
+    for _ in range(2):
+        with pytest.raises(PicketAPIException):
+            picket.validate("limited")
+    assert len(transport.calls) == 4
+
+    # revalidate asks the Picket API
+    with pytest.raises(PicketAPIException):
+        picket.validate("expired", revalidate=True)
+    assert len(transport.calls) == 5
+
+    picket.invalidate("expired")
+    with pytest.raises(PicketAPIException):
+        picket.validate("expired")
+    assert len(transport.calls) == 6
+
+    assert picket.validate("good").wallet_address == "good"
+
+
+def test_picket_validate_negative_cache_codes(tmp_path):
+    transport = negative_cache_transport()
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        negative_cache=SQLiteCache(str(tmp_path / "negative.db"), ttl=60),
+        negative_cache_codes={"TOKEN_EXPIRED"},
+    )
+
+    for token in ("expired", "expired", "forged", "forged"):
+        with pytest.raises(PicketAPIException):
+            picket.validate(token)
+    assert [body["accessToken"] for _, body in transport.calls] == [
+        "expired",
+        "forged",
+        "forged",
+    ]
+
+    # shared with other clients using the same backend
+    other = Picket("api_key", transport=transport, negative_cache=picket.negative_cache)
+    with pytest.raises(PicketAPIException) as e:
+        other.validate("expired")
+    assert e.value.code == "TOKEN_EXPIRED"
+    assert len(transport.calls) == 3
+
+
+def test_picket_validate_negative_cache_shared_backend(tmp_path):
+    path = str(tmp_path / "cache.db")
+    transport = negative_cache_transport()
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        validate_cache=SQLiteCache(path, ttl=60),
+        negative_cache=SQLiteCache(path, ttl=60),
+    )
+
+    # a cached failure is never returned as a user
+    for _ in range(2):
+        with pytest.raises(PicketAPIException) as e:
+            picket.validate("expired")
+        assert e.value.code == "TOKEN_EXPIRED"
+    assert len(transport.calls) == 1
+
+    user = picket.validate("good")
+    assert picket.validate("good") == user
+    assert picket.cached_validation_failure("good", {}) is None
+    assert len(transport.calls) == 2
+
+
+def hedge_transport(slow: float):
+    calls = itertools.count()
+
+    def validate(body):
+        # only the first request is slow
+        if next(calls) == 0:
+            time.sleep(slow)
+            return {
+                "chain": "ethereum",
+                "walletAddress": "slow",
+                "displayAddress": "slow",
+                "tokenBalances": {},
+            }
+        return {
+            "chain": "ethereum",
+            "walletAddress": "fast",
+            "displayAddress": "fast",
+            "tokenBalances": {},
+        }
+
+    return FakeTransport({"auth/validate": validate, "auth": validate})
+
+
+def test_picket_hedged_request():
+    events = []
+    transport = hedge_transport(slow=0.5)
+    picket = Picket(
+        "api_key", transport=transport, hedge_delay=0.02, hooks=[events.append]
+    )
+
+    start = time.perf_counter()
+    user = picket.validate("xxx.yyy.zzz")
+    assert time.perf_counter() - start < 0.4
+    assert user.wallet_address == "fast"
+    assert len(transport.calls) == 2
+    assert events[0].hedged
+    assert events[0].ttfb is not None
+    assert picket.hedge_policy.stats()["hedge_wins"] == 1
+
+    # fast responses are not hedged
+    picket.validate("xxx.yyy.zzz", revalidate=True)
+    assert len(transport.calls) == 3
+    assert not events[1].hedged
+    picket.close()
+
+
+def test_picket_hedged_request_not_idempotent():
+    transport = hedge_transport(slow=0.1)
+    picket = Picket("api_key", transport=transport, hedge_delay=0.01)
+    with pytest.raises(Exception):
+        picket.auth("ethereum", "0x1", "signature")
+    assert len(transport.calls) == 1
+    assert picket.hedge_policy.stats()["requests"] == 0
+
+
+def test_picket_hedged_request_capped():
+    transport = hedge_transport(slow=0.1)
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        hedge_policy=HedgePolicy(delay=0.01, max_rate=0.1, burst=0.5),
+    )
+
+    user = picket.validate("xxx.yyy.zzz")
+    assert user.wallet_address == "slow"
+    assert len(transport.calls) == 1
+    assert picket.hedge_policy.stats()["capped"] == 1
+    picket.close()
+
+
+def test_picket_hedged_request_saturated():
+    transport = validate_stream_transport(latency=0.05)
+    picket = Picket(
+        "api_key", transport=transport, hedge_delay=0.08, hedge_max_workers=4
+    )
+
+    # requests over hedge_max_workers are sent inline rather than queued, and queueing
+    # does not count towards the hedge delay
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(picket.validate, [f"token{i}" for i in range(32)]))
+    assert time.perf_counter() - start < 0.3
+    assert len(transport.calls) == 32
+    assert picket.hedge_policy.stats()["hedges"] == 0
+    assert picket._hedge_workers_busy == 0
+    picket.close()
+
+
+def authz_token(jwt, exp: float, balances: dict) -> str:
+    claims = {
+        "chain": "ethereum",
+        "walletAddress": "0x1",
+        "displayAddress": "0x1",
+        "tokenBalances": balances,
+        "exp": int(exp),
+    }
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def authz_transport():
+    def authz(body):
+        user = {
+            "chain": "ethereum",
+            "walletAddress": "0x1",
+            "displayAddress": "0x1",
+            "tokenBalances": {},
+        }
+        return {"accessToken": "new.access.token", "user": user}
+
+    return FakeTransport({"authz": authz})
+
+
+def test_picket_authz_locally():
+    jwt = pytest.importorskip("jwt")
+    transport = authz_transport()
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        verification_key=SECRET,
+        token_algorithms=["HS256"],
+        local_authz=True,
+        authz_min_lifetime=60,
+    )
+    token = authz_token(jwt, time.time() + 3600, {"0xContract": {"1": "2"}})
+
+    resp = picket.authz(token, {"contractAddress": "0xcontract"})
+    assert resp.access_token == token
+    assert resp.user.wallet_address == "0x1"
+    resp = picket.authz(token, {"contractAddress": "0xContract", "minTokenBalance": 2})
+    assert resp.access_token == token
+    assert len(transport.calls) == 0
+
+    # unmet or undecidable requirements
+    resp = picket.authz(token, {"contractAddress": "0xContract", "minTokenBalance": 3})
+    assert resp.access_token == "new.access.token"
+    picket.authz(token, {"contractAddress": "0xOther"})
+    # revalidate always asks the Picket API
+    picket.authz(token, {"contractAddress": "0xContract"}, revalidate=True)
+    assert len(transport.calls) == 3
+    assert transport.calls[-1][1]["revalidate"] is True
+
+    # too little lifetime left
+    expiring = authz_token(jwt, time.time() + 30, {"0xContract": {"1": "2"}})
+    picket.authz(expiring, {"contractAddress": "0xContract"})
+    # signed with another key
+    forged = jwt.encode(
+        jwt.decode(token, SECRET, algorithms=["HS256"]), "o" * 32, algorithm="HS256"
+    )
+    picket.authz(forged, {"contractAddress": "0xContract"})
+    assert len(transport.calls) == 5
+
+    assert picket.authz_stats() == {"short_circuited": 2, "remote": 5}
+
+
+def test_picket_authz_locally_opt_in():
+    jwt = pytest.importorskip("jwt")
+    transport = authz_transport()
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        verification_key=SECRET,
+        token_algorithms=["HS256"],
+    )
+    token = authz_token(jwt, time.time() + 3600, {"0xContract": {"1": "2"}})
+    assert picket.authz(token, {"contractAddress": "0xContract"}).access_token != token
+    assert picket.authz_stats() == {"short_circuited": 0, "remote": 1}
+
+
+def test_picket_adaptive_concurrency():
+    def token_ownership(body):
+        if body["requirements"].get("contractAddress") == "0xBusy":
+            return 503, {"msg": "unavailable", "code": "UNAVAILABLE"}
+        return {"allowed": True, "tokenBalances": {}}
+
+    # the pool grows with the limit, or caps it when pool_maxsize is set
+    picket = Picket("api_key", adaptive_concurrency=True)
+    assert picket.concurrency_limiter.limit == 10
+    assert picket.default_concurrency() == 64
+    assert picket.transport.pool_maxsize == 64
+    picket = Picket("api_key", adaptive_concurrency=True, pool_maxsize=4)
+    assert picket.concurrency_limiter.limit == 4
+    assert picket.default_concurrency() == 4
+    assert picket.transport.pool_maxsize == 4
+
+    transport = FakeTransport({"tokenOwnership": token_ownership}, latency=0.005)
+    # only overload responses lower the limit
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=4, max_limit=16, latency_tolerance=100
+    )
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        concurrency_limiter=limiter,
+        retry_policy=RetryPolicy(max_retries=0),
+    )
+    assert picket.default_concurrency() == 16
+
+    items = [("ethereum", f"0x{idx}", {}) for idx in range(200)]
+    results = picket.token_ownership_many(items)
+    assert all(result.allowed for result in results)
+    assert limiter.limit > 4
+    assert limiter.in_flight == 0
+
+    grown = limiter.limit
+    items = [("ethereum", "0x1", {"contractAddress": "0xBusy"})]
+    with pytest.raises(PicketAPIException):
+        picket.token_ownesrhip("ethereum", "0x1", requirements=items[0][2])
+    assert limiter.limit < grown
+    assert limiter.stats()["decreases"] == 1
+    assert limiter.in_flight == 0
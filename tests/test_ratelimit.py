@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from picketapi.ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_burst():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() > 0
+
+
+def test_token_bucket_acquire():
+    bucket = TokenBucket(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        assert bucket.acquire() is True
+    # two tokens had to be refilled at 100/s
+    assert time.monotonic() - start >= 0.015
+
+
+def test_token_bucket_acquire_timeout():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire(timeout=0) is True
+    assert bucket.acquire(timeout=0.01) is False
+
+
+def test_token_bucket_acquire_async():
+    bucket = TokenBucket(rate=100, burst=1)
+
+    async def run():
+        return [await bucket.acquire_async() for _ in range(2)]
+
+    assert asyncio.run(run()) == [True, True]
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause(0.05)
+    wait = bucket.reserve()
+    assert 0 < wait <= 0.05
+
+
+def test_token_bucket_throttle():
+    bucket = TokenBucket(rate=100, min_rate=30, recovery_period=0.1)
+    bucket.throttle()
+    assert bucket.rate == 50
+    bucket.throttle()
+    assert bucket.rate == 30
+
+    # the rate recovers over the recovery period
+    time.sleep(0.1)
+    bucket.reserve()
+    assert bucket.rate == 100
+
+
+def test_rate_limiter_endpoint_buckets():
+    limiter = RateLimiter(rate=100, endpoint_rates={"tokenOwnership": 1})
+    path = "chains/solana/wallets/wallet/tokenOwnership"
+    assert limiter.acquire(path, timeout=0) is True
+    assert limiter.acquire(path, timeout=0) is False
+    # other endpoints only use the global bucket
+    assert limiter.acquire("auth/validate", timeout=0) is True
+
+
+def test_rate_limiter_rate_limited():
+    limiter = RateLimiter(rate=100, endpoint_rates={"auth/validate": 10})
+    limiter.rate_limited("auth/validate", retry_after=60)
+
+    assert limiter.stats() == {"global": 50, "auth/validate": 5}
+    assert limiter.acquire("auth/nonce", timeout=0.01) is False
+
+
+def test_rate_limiter_shared():
+    limiter = RateLimiter.shared("test_rate_limiter_shared", rate=10)
+    assert RateLimiter.shared("test_rate_limiter_shared", rate=10) is limiter
+    assert RateLimiter.shared("other_api_key", rate=10) is not limiter
+
+    # a different configuration for the same API key is an error
+    with pytest.raises(ValueError):
+        RateLimiter.shared("test_rate_limiter_shared", rate=20)
+    with pytest.raises(ValueError):
+        RateLimiter.shared(
+            "test_rate_limiter_shared", rate=10, endpoint_rates={"auth/validate": 1}
+        )
+    assert (
+        RateLimiter.shared("test_rate_limiter_shared", rate=10, endpoint_rates={})
+        is limiter
+    )
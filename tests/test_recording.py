@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+from picketapi import Picket
+from picketapi.exceptions import PicketAPIException
+from picketapi.recording import (
+    Recording,
+    RecordingTransport,
+    ReplayTransport,
+    client_sender,
+    read_recordings,
+    redact_credentials,
+    replay_requests,
+)
+from picketapi.transport import FakeTransport
+
+
+def validate(body):
+    if body["accessToken"] == "bad":
+        return 401, {"msg": "invalid token", "code": "INVALID_TOKEN"}
+    return {
+        "chain": "ethereum",
+        "walletAddress": body["accessToken"],
+        "displayAddress": body["accessToken"],
+        "tokenBalances": {},
+    }
+
+
+def hashed(access_token: str) -> str:
+    return redact_credentials({"accessToken": access_token})["accessToken"]
+
+
+def record(path, latency=0.0, **kwargs):
+    transport = RecordingTransport(
+        FakeTransport({"auth/validate": validate}, latency=latency), str(path), **kwargs
+    )
+    picket = Picket("api_key", transport=transport)
+    users = [picket.validate(token) for token in ("a", "b")]
+    with pytest.raises(PicketAPIException):
+        picket.validate("bad")
+    picket.close()
+    return users
+
+
+def test_recording_transport(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    record(path)
+
+    recordings = list(read_recordings(str(path)))
+    assert len(recordings) == 3
+    assert [r.path for r in recordings] == ["/api/v1/auth/validate"] * 3
+    assert [r.payload["accessToken"] for r in recordings] == [
+        hashed("a"),
+        hashed("b"),
+        hashed("bad"),
+    ]
+    assert [r.status_code for r in recordings] == [200, 200, 401]
+    assert recordings[0].offset <= recordings[1].offset <= recordings[2].offset
+
+    # to_dict and from_dict round trip
+    recording = recordings[2]
+    copy = Recording.from_dict(recording.to_dict())
+    assert copy.response == recording.response
+    assert copy.status_code == 401
+
+    # non-JSON responses are kept as text
+    recording.response = "Bad Gateway"
+    assert recording.to_dict()["text"] == "Bad Gateway"
+    assert Recording.from_dict(recording.to_dict()).response == "Bad Gateway"
+
+
+def test_recording_transport_redacts_credentials(tmp_path):
+    token = "xxx.yyy.zzz"
+    auth = {
+        "accessToken": token,
+        "user": validate({"accessToken": "0x1"}),
+    }
+    path = tmp_path / "calls.jsonl"
+    transport = RecordingTransport(
+        FakeTransport({"auth/validate": auth["user"], "auth": auth}), str(path)
+    )
+    picket = Picket("api_key", transport=transport)
+    picket.validate(token)
+    picket.auth("ethereum", "0x1", "secret-signature")
+    picket.close()
+
+    data = path.read_text()
+    assert token not in data and "secret-signature" not in data
+    recordings = list(read_recordings(str(path)))
+    assert recordings[1].payload["signature"].startswith("sha256:")
+    assert hashed(token) in recordings[1].response
+
+    # redacted recordings still match the original requests
+    picket = Picket("api_key", transport=ReplayTransport(recordings, speed=100))
+    assert picket.validate(token).wallet_address == "0x1"
+    assert picket.auth("ethereum", "0x1", "secret-signature").user.chain == "ethereum"
+    assert picket.transport.matched == 2
+
+    # without redaction, credentials are recorded as is
+    path = tmp_path / "raw.jsonl"
+    record(path, redact=None)
+    assert [r.payload["accessToken"] for r in read_recordings(str(path))] == [
+        "a",
+        "b",
+        "bad",
+    ]
+
+
+def test_replay_transport(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    users = record(path)
+
+    transport = ReplayTransport.from_file(str(path), speed=10)
+    picket = Picket("api_key", transport=transport)
+    assert picket.validate("a") == users[0]
+    assert picket.validate("b") == users[1]
+    with pytest.raises(PicketAPIException) as e:
+        picket.validate("bad")
+    assert e.value.status_code == 401
+
+    # unrecorded payloads fall back to the recordings of the path, in turn
+    assert picket.validate("c") == users[0]
+    assert picket.validate("c") == users[1]
+    assert transport.matched == 5
+
+    with pytest.raises(PicketAPIException) as e:
+        picket.nonce("ethereum", "0x1234567890")
+    assert e.value.status_code == 404
+    assert transport.unmatched == 1
+
+
+def test_replay_transport_speed(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    record(path, latency=0.1)
+
+    picket = Picket("api_key", transport=ReplayTransport.from_file(str(path)))
+    start = time.perf_counter()
+    picket.validate("a")
+    assert time.perf_counter() - start >= 0.1
+
+    picket = Picket("api_key", transport=ReplayTransport.from_file(str(path), speed=10))
+    start = time.perf_counter()
+    picket.validate("a")
+    assert time.perf_counter() - start < 0.05
+
+
+def test_replay_requests(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    users = record(path)
+
+    recordings = list(read_recordings(str(path)))
+    # spread the calls over 0.2 seconds
+    for idx, recording in enumerate(recordings):
+        recording.offset = idx * 0.1
+
+    transport = ReplayTransport(recordings)
+    picket = Picket("api_key", transport=transport)
+    start = time.perf_counter()
+    results = replay_requests(recordings, client_sender(picket), speed=2)
+    assert 0.1 <= time.perf_counter() - start < 0.2
+
+    assert len(results) == 3
+    assert transport.matched == 3 and transport.unmatched == 0
+    errors = {r.payload["accessToken"]: error for r, _, error in results}
+    assert errors[hashed("a")] is None and errors[hashed("b")] is None
+    assert errors[hashed("bad")].status_code == 401
+    assert picket.validate("a") == users[0]
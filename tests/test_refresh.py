@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+from picketapi.refresh import RefreshAhead
+
+
+def test_refresh_ahead_due():
+    refresher = RefreshAhead(fraction=0.5)
+    calls = []
+
+    # unknown entries are never refreshed
+    assert not refresher.refresh("key", lambda: calls.append(1))
+
+    refresher.stored("key", 0.1)
+    assert not refresher.refresh("key", lambda: calls.append(1))
+
+    time.sleep(0.06)
+    assert refresher.refresh("key", lambda: calls.append(1))
+    refresher.close()
+    assert calls == [1]
+    assert refresher.stats() == {
+        "refreshes": 1,
+        "failures": 0,
+        "skipped": 0,
+        "running": 0,
+    }
+
+    # expired entries are not refreshed
+    time.sleep(0.05)
+    assert not refresher.refresh("key", lambda: calls.append(1))
+
+
+def test_refresh_ahead_one_refresh_per_key():
+    refresher = RefreshAhead(fraction=0)
+    release = threading.Event()
+    refresher.stored("key", 60)
+
+    assert refresher.refresh("key", release.wait)
+    # already refreshing
+    assert not refresher.refresh("key", release.wait)
+    release.set()
+    refresher.close()
+    assert refresher.refreshes == 1
+
+
+def test_refresh_ahead_max_concurrency():
+    refresher = RefreshAhead(fraction=0, max_concurrency=2)
+    release = threading.Event()
+    for key in ("a", "b", "c"):
+        refresher.stored(key, 60)
+
+    assert refresher.refresh("a", release.wait)
+    assert refresher.refresh("b", release.wait)
+    assert not refresher.refresh("c", release.wait)
+    assert refresher.stats()["running"] == 2
+    assert refresher.skipped == 1
+
+    release.set()
+    refresher.close()
+    # the skipped entry is refreshed on a later read
+    assert refresher.refresh("c", lambda: None)
+    refresher.close()
+    assert refresher.refreshes == 3
+
+
+def test_refresh_ahead_failure():
+    refresher = RefreshAhead(fraction=0)
+    refresher.stored("key", 60)
+
+    def fail():
+        raise ValueError("boom")
+
+    assert refresher.refresh("key", fail)
+    refresher.close()
+    assert refresher.failures == 1
+    assert refresher.stats()["running"] == 0
+
+
+def test_refresh_ahead_async():
+    refresher = RefreshAhead(fraction=0, max_concurrency=1)
+    refresher.stored("a", 60)
+    refresher.stored("b", 60)
+    calls = []
+
+    async def refresh():
+        await asyncio.sleep(0.01)
+        calls.append(1)
+
+    async def run():
+        assert refresher.refresh_async("a", refresh)
+        assert not refresher.refresh_async("a", refresh)
+        assert not refresher.refresh_async("b", refresh)
+        await asyncio.gather(*refresher._tasks)
+
+    asyncio.run(run())
+    assert calls == [1]
+    assert refresher.stats() == {
+        "refreshes": 1,
+        "failures": 0,
+        "skipped": 1,
+        "running": 0,
+    }
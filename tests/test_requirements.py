@@ -0,0 +1,103 @@
+import time
+
+from picketapi.requirements import RequirementEvaluator, evaluate_token_balances
+from picketapi.types import AuthorizedUser
+
+BALANCES = {
+    "0xAbC": {"1": "2", "2": "1"},
+    "SolanaCollection": {"mint": "1"},
+    "0xBad": {"1": "a lot"},
+}
+
+
+def test_evaluate_min_token_balance():
+    evaluator = RequirementEvaluator(max_staleness=30)
+    evaluator.observe("ethereum", "0x1", BALANCES)
+
+    assert evaluator.evaluate("ethereum", "0x1", {"contractAddress": "0xabc"}) is True
+    assert (
+        evaluator.evaluate(
+            "ethereum", "0x1", {"contract_address": "0xABC", "min_token_balance": "3"}
+        )
+        is True
+    )
+    assert (
+        evaluator.evaluate(
+            "ethereum", "0x1", {"contractAddress": "0xABC", "minTokenBalance": 4}
+        )
+        is False
+    )
+    assert (
+        evaluator.evaluate(
+            "ethereum",
+            "0x1",
+            {"contractAddress": "0xABC", "tokenIds": ["2", "3"], "minTokenBalance": 2},
+        )
+        is False
+    )
+    assert (
+        evaluator.evaluate("solana", "0x1", {"collection": "SolanaCollection"}) is None
+    )
+    assert evaluator.stats() == {"decided": 4, "undecidable": 1}
+
+
+def test_evaluate_undecidable():
+    evaluator = RequirementEvaluator(max_staleness=30)
+    evaluator.observe("solana", "wallet", BALANCES)
+
+    assert evaluator.evaluate("solana", "wallet", {"collection": "SolanaCollection"})
+    # collections are case sensitive
+    assert (
+        evaluator.evaluate("solana", "wallet", {"collection": "solanacollection"})
+        is None
+    )
+    # never observed
+    assert (
+        evaluator.evaluate("solana", "other", {"collection": "SolanaCollection"})
+        is None
+    )
+    assert evaluator.evaluate("solana", "wallet", {"contractAddress": "0xDef"}) is None
+    # unparseable balances
+    assert evaluator.evaluate("solana", "wallet", {"contractAddress": "0xBad"}) is None
+    # requirements only the server can evaluate
+    requirements = {"collection": "SolanaCollection", "allowedWallets": ["wallet"]}
+    assert evaluator.evaluate("solana", "wallet", requirements) is None
+    assert evaluator.evaluate("solana", "wallet", {}) is None
+
+
+def test_evaluate_staleness():
+    evaluator = RequirementEvaluator(max_staleness=0.01)
+    evaluator.observe("ethereum", "0x1", BALANCES)
+    time.sleep(0.02)
+    assert evaluator.evaluate("ethereum", "0x1", {"contractAddress": "0xABC"}) is None
+
+
+def test_observe_user():
+    evaluator = RequirementEvaluator(max_staleness=30)
+    user = AuthorizedUser("ethereum", "0x1", "0x1", BALANCES)
+    evaluator.observe_user("xxx.yyy.zzz", user)
+
+    assert evaluator.user("xxx.yyy.zzz") is user
+    assert evaluator.evaluate("ethereum", "0x1", {"contractAddress": "0xABC"}) is True
+
+    evaluator.forget("ethereum", "0x1")
+    assert evaluator.evaluate("ethereum", "0x1", {"contractAddress": "0xABC"}) is None
+
+    evaluator.forget_user("xxx.yyy.zzz")
+    assert evaluator.user("xxx.yyy.zzz") is None
+
+
+def test_evaluate_token_balances():
+    balances = {"0xAbC": {"1": "2", "2": "1"}, "solCollection": {"mint": "1"}}
+
+    assert evaluate_token_balances(balances, {"contract_address": "0xabc"})
+    assert evaluate_token_balances(
+        balances, {"contractAddress": "0xABC", "minTokenBalance": "3"}
+    )
+    assert not evaluate_token_balances(
+        balances, {"contractAddress": "0xabc", "minTokenBalance": "4"}
+    )
+    assert evaluate_token_balances(balances, {"collection": "solCollection"})
+    # not in the balances
+    assert evaluate_token_balances(balances, {"contractAddress": "0xdef"}) is None
+    assert evaluate_token_balances(balances, {"allowedWallets": ["0x1"]}) is None
@@ -0,0 +1,21 @@
+from picketapi.retry import RetryPolicy
+
+
+def test_retry_policy_should_retry_status():
+    policy = RetryPolicy()
+    assert policy.should_retry_status(503) is True
+    assert policy.should_retry_status(400) is False
+    assert policy.should_retry_status(200) is False
+
+
+def test_retry_policy_backoff():
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=0.5, jitter=False)
+    assert policy.backoff(0) == 0.1
+    assert policy.backoff(1) == 0.2
+    assert policy.backoff(10) == 0.5
+
+
+def test_retry_policy_backoff_jitter():
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=0.5)
+    for attempt in range(5):
+        assert 0 <= policy.backoff(attempt) <= min(0.5, 0.1 * 2**attempt)
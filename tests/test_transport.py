@@ -0,0 +1,114 @@
+import pytest
+
+from picketapi import Picket
+from picketapi.exceptions import PicketAPIException
+from picketapi.metrics import RequestEvent
+from picketapi.retry import RetryPolicy
+from picketapi.transport import FakeTransport, HTTP2Transport, RequestsTransport
+
+
+def test_picket_default_transport():
+    picket = Picket("api_key", pool_maxsize=20, pool_idle_timeout=5)
+    assert isinstance(picket.transport, RequestsTransport)
+    assert picket.transport.pool_maxsize == 20
+    assert picket.transport.pool_idle_timeout == 5
+
+
+def test_fake_transport():
+    user = {
+        "chain": "ethereum",
+        "walletAddress": "0x1",
+        "displayAddress": "0x1",
+        "tokenBalances": {},
+    }
+    transport = FakeTransport(
+        {
+            "auth/validate": user,
+            "auth": lambda body: {"accessToken": body["signature"], "user": user},
+            "tokenOwnership": {"allowed": True, "tokenBalances": {}},
+        }
+    )
+    picket = Picket("api_key", transport=transport)
+
+    assert picket.validate("xxx.yyy.zzz").wallet_address == "0x1"
+    assert picket.auth("ethereum", "0x1", "signature").access_token == "signature"
+    assert picket.token_ownesrhip("ethereum", "0x1").allowed is True
+
+    url, body = transport.calls[0]
+    assert url == "https://picketapi.com/api/v1/auth/validate"
+    assert body == {"accessToken": "xxx.yyy.zzz", "requirements": {}}
+    assert len(transport.calls) == 3
+
+
+def test_fake_transport_errors():
+    transport = FakeTransport(
+        {"auth/validate": (401, {"msg": "invalid token", "code": "INVALID_TOKEN"})}
+    )
+    picket = Picket("api_key", transport=transport)
+
+    with pytest.raises(PicketAPIException) as e:
+        picket.validate("xxx.yyy.zzz")
+    assert e.value.status_code == 401
+    assert e.value.code == "INVALID_TOKEN"
+
+    with pytest.raises(PicketAPIException) as e:
+        picket.nonce("ethereum", "0x1")
+    assert e.value.status_code == 404
+
+
+class FlakyTransport(FakeTransport):
+    def __init__(self, failures: int, routes):
+        super().__init__(routes)
+        self.failures = failures
+
+    retryable_errors = (ConnectionError,)
+
+    def send(self, *args):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return super().send(*args)
+
+
+def test_transport_retryable_errors():
+    transport = FlakyTransport(
+        1, {"auth/nonce": {"nonce": "n", "statement": "s", "format": "f"}}
+    )
+    picket = Picket(
+        "api_key",
+        transport=transport,
+        retry_policy=RetryPolicy(max_retries=1, backoff_base=0),
+    )
+    assert picket.nonce("ethereum", "0x1").nonce == "n"
+
+    transport.failures = 1
+    with pytest.raises(ConnectionError):
+        # auth is not retried
+        picket.auth("ethereum", "0x1", "signature")
+
+
+def test_http2_transport():
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request):
+        assert request.headers["Authorization"].startswith("Basic ")
+        return httpx.Response(200, json={"allowed": True, "tokenBalances": {}})
+
+    transport = HTTP2Transport()
+    transport._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+    event = RequestEvent("tokenOwnership")
+    resp = transport.send(
+        "https://picketapi.com/api/v1/chains/ethereum/wallets/0x1/tokenOwnership",
+        {},
+        ("api_key", ""),
+        {},
+        (1, 2),
+        event,
+    )
+    assert resp.status_code == 200
+    assert event.ttfb is not None
+
+    with Picket("api_key", transport=transport) as picket:
+        assert picket.token_ownesrhip("ethereum", "0x1").allowed is True
+    assert transport._client is None
@@ -1,3 +1,7 @@
+import time
+
+import pytest
+
 from picketapi import types
 
 
@@ -112,3 +116,126 @@ def test_token_ownership_response():
     assert token_ownership_response is not None
     assert token_ownership_response.allowed == allowed
     assert token_ownership_response.token_balances == token_balances
+
+
+def test_types_are_slotted():
+    user = types.AuthorizedUser("chain", "wallet", "display", {})
+    for obj in [
+        types.NonceResponse("nonce", "statement", "format"),
+        user,
+        types.AuthResponse("access_token", user),
+        types.TokenOwnershipResponse(True, {}),
+    ]:
+        assert not hasattr(obj, "__dict__")
+
+
+def test_token_balances_view():
+    token_balances = {"0xA": {"1": "1", "2": "5"}, "0xB": {}, "0xC": {"3": "2"}}
+    user = types.AuthorizedUser("chain", "wallet", "display", token_balances)
+
+    balances = user.token_balances
+    assert balances._index is None
+    assert balances == token_balances
+    assert token_balances == balances
+    assert balances["0xA"]["2"] == "5"
+    assert balances.get("0xB") == {}
+    assert "0xD" not in balances
+    assert list(balances) == ["0xA", "0xB", "0xC"]
+    assert balances.to_dict() == token_balances
+    assert user.token_balances is balances
+
+    user.token_balances = {"0xD": {"4": "1"}}
+    assert user.token_balances == {"0xD": {"4": "1"}}
+
+
+def test_token_balances_are_interned():
+    a = types.AuthorizedUser.from_dict(
+        {
+            "chain": "chain",
+            "walletAddress": "wallet",
+            "displayAddress": "display",
+            "tokenBalances": {"".join(["0x", "A"]): {"1": "1"}},
+        }
+    )
+    b = types.TokenOwnershipResponse(True, {"".join(["0x", "A"]): {"1": "1"}})
+    assert next(iter(a.token_balances)) is next(iter(b.token_balances))
+
+
+def test_types_equality_and_repr():
+    user = types.AuthorizedUser("chain", "wallet", "display", {"0xA": {"1": "1"}})
+    same = types.AuthorizedUser("chain", "wallet", "display", {"0xA": {"1": "1"}})
+    other = types.AuthorizedUser("chain", "wallet", "display", {"0xA": {"1": "2"}})
+    assert user == same
+    assert user != other
+    assert repr(user) == (
+        "AuthorizedUser(chain='chain', wallet_address='wallet', "
+        "display_address='display', token_balances={'0xA': {'1': '1'}})"
+    )
+
+
+def test_types_to_bytes():
+    user = types.AuthorizedUser(
+        "ethereum", "wallet", "display", {"0xA": {"1": "1", "2": "1"}, "0xB": {}}
+    )
+    for obj in [
+        types.NonceResponse("nonce", "statement", "format"),
+        user,
+        types.AuthResponse("access_token", user),
+        types.TokenOwnershipResponse(False, {"0xA": {"1": "1"}}),
+        types.TokenOwnershipResponse(True, {}),
+    ]:
+        data = obj.to_bytes()
+        assert data[0] == 1
+        assert type(obj).from_bytes(data) == obj
+
+    # repeated strings are stored once
+    assert user.to_bytes().count(b"0xA") == 1
+    assert user.to_bytes().count(b"ethereum") == 0
+
+
+def test_types_to_bytes_large_token_balances():
+    token_balances = {
+        f"0x{contract:040x}": {str(token): str(token) for token in range(100)}
+        for contract in range(1000)
+    }
+    resp = types.TokenOwnershipResponse(True, token_balances)
+    data = resp.to_bytes()
+    assert types.TokenOwnershipResponse.from_bytes(data).token_balances == (
+        token_balances
+    )
+
+
+def test_types_from_bytes_interns_strings():
+    data = types.TokenOwnershipResponse(True, {"0xA": {"1": "1"}}).to_bytes()
+    a = types.TokenOwnershipResponse.from_bytes(data)
+    b = types.TokenOwnershipResponse.from_bytes(data)
+    assert next(iter(a.token_balances)) is next(iter(b.token_balances))
+
+
+def test_types_from_bytes_invalid():
+    user = types.AuthorizedUser("ethereum", "wallet", "display", {"0xA": {"1": "1"}})
+    data = user.to_bytes()
+
+    with pytest.raises(ValueError, match="expected NonceResponse"):
+        types.NonceResponse.from_bytes(data)
+    with pytest.raises(ValueError, match="version 2"):
+        types.AuthorizedUser.from_bytes(b"\x02" + data[1:])
+    for invalid in [b"", data[:10], data[:-1], data + b"\x00"]:
+        with pytest.raises(ValueError):
+            types.AuthorizedUser.from_bytes(invalid)
+
+    with pytest.raises(TypeError):
+        types.TokenOwnershipResponse(True, {"0xA": {"1": 1.5}}).to_bytes()
+
+
+def test_token_balances_large_contract():
+    tokens = {str(token): "1" for token in range(20000)}
+    user = types.AuthorizedUser("chain", "wallet", "display", {"0xA": tokens})
+
+    start = time.perf_counter()
+    assert user.token_balances.to_dict() == {"0xA": tokens}
+    balances = user.token_balances["0xA"]
+    assert all(balances[token] == "1" for token in tokens)
+    assert list(balances.values()) == ["1"] * 20000
+    assert ("19999", "1") in balances.items()
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,85 @@
+import time
+import pytest
+import responses
+
+jwt = pytest.importorskip("jwt")
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from picketapi.verify import AccessTokenVerifier
+
+JWKS_URL = "https://picketapi.com/.well-known/jwks.json"
+SECRET = "s" * 32
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def jwks(key, kid="kid"):
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+    jwk["kid"] = kid
+    return {"keys": [jwk]}
+
+
+def claims(exp_in=60):
+    return {"walletAddress": "wallet_address", "exp": int(time.time()) + exp_in}
+
+
+def test_verifier_requires_key():
+    with pytest.raises(ValueError):
+        AccessTokenVerifier()
+
+
+def test_verifier_static_key():
+    verifier = AccessTokenVerifier(key=SECRET, algorithms=["HS256"])
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+    assert verifier.verify(token)["walletAddress"] == "wallet_address"
+
+
+def test_verifier_invalid_signature():
+    verifier = AccessTokenVerifier(key=SECRET, algorithms=["HS256"])
+    token = jwt.encode(claims(), "o" * 32, algorithm="HS256")
+    assert verifier.verify(token) is None
+
+
+def test_verifier_expired():
+    verifier = AccessTokenVerifier(key=SECRET, algorithms=["HS256"])
+    token = jwt.encode(claims(exp_in=-60), SECRET, algorithm="HS256")
+    assert verifier.verify(token) is None
+
+
+def test_verifier_requires_exp():
+    verifier = AccessTokenVerifier(key=SECRET, algorithms=["HS256"])
+    token = jwt.encode({"walletAddress": "wallet_address"}, SECRET, algorithm="HS256")
+    assert verifier.verify(token) is None
+
+
+@responses.activate
+def test_verifier_jwks(rsa_key):
+    responses.add(responses.GET, JWKS_URL, json=jwks(rsa_key))
+    verifier = AccessTokenVerifier(jwks_url=JWKS_URL)
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": "kid"})
+
+    assert verifier.verify(token)["walletAddress"] == "wallet_address"
+    assert verifier.verify(token)["walletAddress"] == "wallet_address"
+    # keys are cached until the refresh interval elapses
+    assert len(responses.calls) == 1
+
+    verifier._next_refresh = time.monotonic() - 1
+    assert verifier.verify(token) is not None
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_verifier_jwks_unavailable(rsa_key):
+    responses.add(responses.GET, JWKS_URL, status=503)
+    verifier = AccessTokenVerifier(jwks_url=JWKS_URL)
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": "kid"})
+
+    assert verifier.verify(token) is None
+    # failed fetches back off instead of retrying on every call
+    assert verifier.verify(token) is None
+    assert len(responses.calls) == 1